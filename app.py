@@ -79,340 +79,144 @@ THEN Risk = Very Low
 # Data Loading
 import streamlit as st
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
+from fuzzy_diabetes import categories, evaluation, figures, profiling, sensitivity
+from fuzzy_diabetes.datasource import DEFAULT_DATA_URL, load_dataset
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.model import impute, load_or_fit, mf_params
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+
+# Timing spans (off unless FUZZY_DIABETES_PROFILE is set) cover one rerun.
+profiling.clear()
 
 # --- 1. Load Data ---
+profiling.stage('data_load')
+# The CSV is downloaded once and kept as a validated, memory-mapped snapshot
+# in the local cache; reruns (and restarts) load it without the network.
 try:
-    df = pd.read_csv('https://raw.githubusercontent.com/Duzttt/FL-Diabetes-prediction/refs/heads/main/diabetes.csv')
+    df = load_dataset(DEFAULT_DATA_URL)
     st.success("Dataset loaded successfully.")
-except FileNotFoundError:
-    st.error("Error: 'diabetes.csv' not found. Please check the file path.")
+except (OSError, ValueError) as exc:
+    st.error(f"Error: could not load the diabetes dataset ({exc}).")
     st.stop()
 
-# --- Data Preprocessing ---
-cols_with_zeros_as_missing = ['Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI']
-df[cols_with_zeros_as_missing] = df[cols_with_zeros_as_missing].replace(0, np.nan)
+# --- Define how many fuzzy sets you want for each input feature. ---
+# IMPORTANT: Adjust these values based on the FPC plots below.
+# Example: If Glucose FPC plot shows an elbow at 4, set n_clusters_glucose = 4.
+n_clusters_glucose = 4
+n_clusters_bmi = 4
+n_clusters_age = 4
+n_clusters_blood_pressure = 5
+n_clusters_pregnancies = 5
+n_clusters_dpf = 4
+n_clusters_skin_thickness = 5
+n_clusters_insulin = 5
+
+# --- Fit (or load) the FCM model ---
+profiling.stage('model_fit')
+# The FPC sweep and the chosen FCM fits run once per dataset and n_clusters
+# choice; Streamlit reruns reuse the cached model artifact.
+fcm_model = load_or_fit(df, {
+    'glucose': n_clusters_glucose,
+    'bmi': n_clusters_bmi,
+    'age': n_clusters_age,
+    'blood_pressure': n_clusters_blood_pressure,
+    'pregnancies': n_clusters_pregnancies,
+    'diabetes_pedigree_function': n_clusters_dpf,
+    'skin_thickness': n_clusters_skin_thickness,
+    'insulin': n_clusters_insulin,
+})
+fcm_mf_params = mf_params(fcm_model)
 
-for col in cols_with_zeros_as_missing:
-    median_val = df[col].median()
-    df[col].fillna(median_val, inplace=True)
+# --- Data Preprocessing ---
+profiling.stage('imputation')
+impute(df, fcm_model)
+for col, median_val in fcm_model['medians'].items():
     st.write(f"Filled missing values in '{col}' with median: {median_val}")
 
-# --- FCM Helper ---
-def get_fcm_mf_params(data_series, n_clusters, m=2, error=0.005, maxiter=1000):
-    data_reshaped = data_series.values.reshape(-1, 1)
-    cntr, u, _, _, _, _, fpc = fuzz.cluster.cmeans(
-        data_reshaped.T, n_clusters, m=m, error=error, maxiter=maxiter, init=None
-    )
-    sorted_centers = np.sort(cntr.flatten())
-    sigmas = []
-
-    if n_clusters > 1:
-        avg_dist = np.mean(np.diff(sorted_centers))
-        base_sigma = avg_dist * 0.40
-        sigmas = [base_sigma] * n_clusters
-    else:
-        sigmas.append(data_series.std() / 2)
-
-    return sorted_centers, sigmas, fpc
-
 # --- FPC Analysis ---
-fcm_mf_params = {}
-feature_columns = ['Glucose', 'BMI', 'Age', 'BloodPressure', 'Pregnancies',
-                   'DiabetesPedigreeFunction', 'SkinThickness', 'Insulin']
-n_clusters_range = range(2, 7)
+profiling.stage('fpc_report')
+n_clusters_range = fcm_model['fpc_sweep']['n_clusters']
 
 st.subheader("Fuzzy Partition Coefficient (FPC) Evaluation")
 
-for col_name in feature_columns:
+for label, col_name in INPUT_COLUMNS.items():
     st.markdown(f"**Feature: {col_name}**")
-    fpcs = []
-    data_reshaped = df[col_name].values.reshape(-1, 1).T
-
-    for n_c in n_clusters_range:
-        try:
-            _, _, _, _, _, _, fpc = fuzz.cluster.cmeans(
-                data_reshaped, n_c, m=2, error=0.005, maxiter=1000, init=None
-            )
-            fpcs.append(fpc)
+    fpcs = fcm_model['fpc_sweep'][label]
+
+    for n_c, fpc in zip(n_clusters_range, fpcs):
+        if np.isnan(fpc):
+            st.warning(f"Error running FCM for {n_c} clusters on {col_name}")
+        else:
             st.write(f"n_clusters={n_c}, FPC={fpc:.4f}")
-        except Exception as e:
-            st.warning(f"Error running FCM for {n_c} clusters on {col_name}: {e}")
-            fpcs.append(np.nan)
-
-    fig, ax = plt.subplots()
-    ax.plot(n_clusters_range, fpcs, marker='o', linestyle='-')
-    ax.set_title(f'FPC vs. Number of Clusters for {col_name}')
-    ax.set_xlabel('Number of Clusters (n_clusters)')
-    ax.set_ylabel('FPC')
-    ax.grid(True)
-    ax.set_xticks(list(n_clusters_range))
-    st.pyplot(fig)
+
+# Plots are only built while the expander is open, and cached per model.
+fpc_plots = st.expander("FPC plots", key='fpc_plots', on_change='rerun')
+if fpc_plots.open:
+    with fpc_plots:
+        for label, col_name in INPUT_COLUMNS.items():
+            st.image(figures.render((fcm_model['key'], 'fpc', label), figures.fpc_curve,
+                                    n_clusters_range, fcm_model['fpc_sweep'][label], col_name))
 
 st.info("Review the FPC plots above. Look for an 'elbow point' where the FPC levels off to choose the best number of clusters.")
 
-# --- Define how many fuzzy sets you want for each input feature. ---
-# IMPORTANT: Adjust these values based on the FPC plots you just reviewed.
-# Example: If Glucose FPC plot shows an elbow at 4, set n_clusters_glucose = 4.
-n_clusters_glucose = 4 # Defaulting to 3, adjust based on FPC plot
-n_clusters_bmi = 4     # Defaulting to 3, adjust based on FPC plot
-n_clusters_age = 4     # Defaulting to 3, adjust based on FPC plot
-n_clusters_blood_pressure = 5 # Defaulting to 3, adjust based on FPC plot
-n_clusters_pregnancies = 5 # Defaulting to 3, adjust based on FPC plot
-n_clusters_dpf = 4     # Defaulting to 3, adjust based on FPC plot
-n_clusters_skin_thickness = 5 # Defaulting to 3, adjust based on FPC plot
-n_clusters_insulin = 5 # Defaulting to 3, adjust based on FPC plot
-
-# --- Apply FCM for each input feature with the CHOSEN n_clusters ---
-# Glucose
-centers, sigmas, fpc = get_fcm_mf_params(df['Glucose'], n_clusters_glucose)
-fcm_mf_params['glucose'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"Glucose FCM FPC (chosen {n_clusters_glucose} clusters): {fpc:.4f}")
-
-# BMI
-centers, sigmas, fpc = get_fcm_mf_params(df['BMI'], n_clusters_bmi)
-fcm_mf_params['bmi'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"BMI FCM FPC (chosen {n_clusters_bmi} clusters): {fpc:.4f}")
-
-# Age
-centers, sigmas, fpc = get_fcm_mf_params(df['Age'], n_clusters_age)
-fcm_mf_params['age'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"Age FCM FPC (chosen {n_clusters_age} clusters): {fpc:.4f}")
-
-# BloodPressure
-centers, sigmas, fpc = get_fcm_mf_params(df['BloodPressure'], n_clusters_blood_pressure)
-fcm_mf_params['blood_pressure'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"BloodPressure FCM FPC (chosen {n_clusters_blood_pressure} clusters): {fpc:.4f}")
-
-# Pregnancies
-centers, sigmas, fpc = get_fcm_mf_params(df['Pregnancies'], n_clusters_pregnancies)
-fcm_mf_params['pregnancies'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"Pregnancies FCM FPC (chosen {n_clusters_pregnancies} clusters): {fpc:.4f}")
-
-# DiabetesPedigreeFunction
-centers, sigmas, fpc = get_fcm_mf_params(df['DiabetesPedigreeFunction'], n_clusters_dpf)
-fcm_mf_params['diabetes_pedigree_function'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"DPF FCM FPC (chosen {n_clusters_dpf} clusters): {fpc:.4f}")
-
-# SkinThickness
-centers, sigmas, fpc = get_fcm_mf_params(df['SkinThickness'], n_clusters_skin_thickness)
-fcm_mf_params['skin_thickness'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"SkinThickness FCM FPC (chosen {n_clusters_skin_thickness} clusters): {fpc:.4f}")
-
-# Insulin
-centers, sigmas, fpc = get_fcm_mf_params(df['Insulin'], n_clusters_insulin)
-fcm_mf_params['insulin'] = {'centers': centers, 'sigmas': sigmas, 'fpc': fpc}
-st.write(f"Insulin FCM FPC (chosen {n_clusters_insulin} clusters): {fpc:.4f}")
+with st.expander("FPC sweep runs (per FCM fit)"):
+    st.dataframe(pd.DataFrame(fcm_model['fpc_sweep']['table']))
+
+# --- FCM results for the CHOSEN n_clusters ---
+for label, variable in fcm_model['variables'].items():
+    st.write(f"{variable['column']} FCM FPC (chosen {len(variable['centers'])} clusters): "
+             f"{variable['fpc']:.4f}")
 
 """# Exploratary Data Analysis"""
 
 #cell 3
-# Exploratary Data Analysis
-
-# --- 2. Define Fuzzy Antecedents and Consequent ---
-
-# Universe of Discourse (ensure these ranges match your data AFTER preprocessing)
-# It's best to derive these from your actual data's min/max if possible,
-# or ensure they cover the full range of expected values.
-# For simplicity, using your specified ranges. Adjust if your actual data ranges differ significantly.
-
-# --- Define Universes for Antecedents and Consequent ---
-glucose_uni = np.arange(df['Glucose'].min() * 0.9, df['Glucose'].max() * 1.1 + 1, 1)
-bmi_uni = np.arange(df['BMI'].min() * 0.9, df['BMI'].max() * 1.1 + 0.1, 0.1)
-age_uni = np.arange(df['Age'].min() * 0.9, df['Age'].max() * 1.1 + 1, 1)
-bp_uni = np.arange(df['BloodPressure'].min() * 0.9, df['BloodPressure'].max() * 1.1 + 1, 1)
-preg_uni = np.arange(df['Pregnancies'].min(), df['Pregnancies'].max() + 1, 1)
-dpf_uni = np.arange(df['DiabetesPedigreeFunction'].min() * 0.9, df['DiabetesPedigreeFunction'].max() * 1.1 + 0.01, 0.01)
-skin_uni = np.arange(df['SkinThickness'].min() * 0.9, df['SkinThickness'].max() * 1.1 + 1, 1)
-insulin_uni = np.arange(df['Insulin'].min() * 0.9, df['Insulin'].max() * 1.1 + 1, 1)
-risk_uni = np.arange(0, 101, 1)
-
-# --- Define Antecedents and Consequent ---
-glucose = ctrl.Antecedent(glucose_uni, 'glucose')
-bmi = ctrl.Antecedent(bmi_uni, 'bmi')
-age = ctrl.Antecedent(age_uni, 'age')
-blood_pressure = ctrl.Antecedent(bp_uni, 'blood_pressure')
-pregnancies = ctrl.Antecedent(preg_uni, 'pregnancies')
-dpf = ctrl.Antecedent(dpf_uni, 'diabetes_pedigree_function')
-skin_thickness = ctrl.Antecedent(skin_uni, 'skin_thickness')
-insulin = ctrl.Antecedent(insulin_uni, 'insulin')
-diabetes_risk = ctrl.Consequent(risk_uni, 'diabetes_risk')
-
-# --- Define Membership Function Assignment Function ---
-def assign_fcm_mfs(antecedent_obj, mf_params, n_clusters, default_names):
-    centers = mf_params['centers']
-    sigmas = mf_params['sigmas']
-
-    if len(centers) != n_clusters:
-        st.warning(f"{antecedent_obj.label}: Number of centers ({len(centers)}) ≠ n_clusters ({n_clusters}). Using available centers.")
-
-    for i in range(n_clusters):
-        center = centers[i]
-        sigma = sigmas[i]
-        mf_name = default_names[i] if i < len(default_names) else f'fcm_cluster_{i}'
-        antecedent_obj[mf_name] = fuzz.gaussmf(antecedent_obj.universe, center, sigma)
-
-    st.success(f"{antecedent_obj.label}: Assigned {n_clusters} Gaussian MFs.")
-
-# --- Apply FCM-derived MFs to All Antecedents ---
+# --- 2. Fuzzy Antecedents, Consequent and Rules ---
+# The antecedents carry the FCM Gaussians on the universes stored with the
+# fitted model (see fuzzy_diabetes.model.UNIVERSE_SPECS for the margins and
+# step sizes); the consequent terms and the rule base
+# (fuzzy_diabetes.rules.RISK_RULES: 6 High, 6 Medium and 6 Low risk rules,
+# over the term names in fuzzy_diabetes.rules.MF_NAMES) are stored with it
+# too.  BatchRiskScorer builds the rule system straight from the model, so
+# no skfuzzy objects are built here; CompactModel.from_model(fcm_model)
+# .to_ctrl() gives the equivalent skfuzzy variables and rules when needed.
 with st.expander("Assign Membership Functions using FCM"):
-    assign_fcm_mfs(glucose, fcm_mf_params['glucose'], n_clusters_glucose,
-                   ['very_low_gl', 'low_gl', 'normal_gl', 'high_gl'])
-    assign_fcm_mfs(bmi, fcm_mf_params['bmi'], n_clusters_bmi,
-                   ['underweight_bmi', 'normal_bmi', 'overweight_bmi', 'obese_bmi'])
-    assign_fcm_mfs(age, fcm_mf_params['age'], n_clusters_age,
-                   ['young_age', 'middle_aged_age', 'senior_age', 'elderly_age'])
-    assign_fcm_mfs(blood_pressure, fcm_mf_params['blood_pressure'], n_clusters_blood_pressure,
-                   ['very_low_bp', 'low_bp', 'normal_bp', 'elevated_bp', 'high_bp'])
-    assign_fcm_mfs(pregnancies, fcm_mf_params['pregnancies'], n_clusters_pregnancies,
-                   ['zero_preg', 'low_preg', 'medium_preg', 'high_preg', 'very_high_preg'])
-    assign_fcm_mfs(dpf, fcm_mf_params['diabetes_pedigree_function'], n_clusters_dpf,
-                   ['very_low_dpf', 'low_dpf', 'medium_dpf', 'high_dpf'])
-    assign_fcm_mfs(skin_thickness, fcm_mf_params['skin_thickness'], n_clusters_skin_thickness,
-                   ['very_thin_skin', 'thin_skin', 'normal_skin', 'thick_skin', 'very_thick_skin'])
-    assign_fcm_mfs(insulin, fcm_mf_params['insulin'], n_clusters_insulin,
-                   ['very_low_insulin', 'low_insulin', 'normal_insulin', 'elevated_ins', 'very_high_ins'])
-
-
-
-# --- IMPORTANT: COMMENTED OUT MANUAL MF DEFINITIONS ---
-# The following lines were manually defining MFs, overwriting the FCM-derived ones.
-# If you want to use FCM-derived MFs, keep these lines commented out.
-# If you prefer manual MFs, uncomment them BUT then the FCM analysis in Cell 2
-# and the assign_fcm_mfs function become less relevant for your fuzzy system's inputs.
-
-# pregnancies['zero_preg'] = fuzz.trimf(pregnancies.universe, [-0.5, 0, 0.5]) # Centered at 0
-# pregnancies['low_preg'] = fuzz.trimf(pregnancies.universe, [0, 2, 4])
-# pregnancies['medium_preg'] = fuzz.trimf(pregnancies.universe, [3, 5, 7])
-# pregnancies['high_preg'] = fuzz.trapmf(pregnancies.universe, [6, 9, 17, 17])
-
-# glucose['low_gl'] = fuzz.trimf(glucose.universe, [50, 50, 75])
-# glucose['normal_gl'] = fuzz.trimf(glucose.universe, [70, 90, 110])
-# glucose['prediabetic_gl'] = fuzz.trimf(glucose.universe, [100, 120, 140])
-# glucose['high_gl'] = fuzz.trapmf(glucose.universe, [130, 160, 200, 200])
-
-# blood_pressure['low_bp'] = fuzz.trimf(blood_pressure.universe, [40, 40, 65])
-# blood_pressure['normal_bp'] = fuzz.trimf(blood_pressure.universe, [60, 75, 90])
-# blood_pressure['elevated_bp'] = fuzz.trimf(blood_pressure.universe, [85, 95, 105])
-# blood_pressure['high_bp'] = fuzz.trapmf(blood_pressure.universe, [100, 120, 180, 180])
-
-# skin_thickness['thin_skin'] = fuzz.trimf(skin_thickness.universe, [10, 10, 30])
-# skin_thickness['normal_skin'] = fuzz.trimf(skin_thickness.universe, [20, 50, 80])
-# skin_thickness['thick_skin'] = fuzz.trimf(skin_thickness.universe, [60, 100, 100]) # Or trapmf([60, 80, 100, 100])
-
-# insulin['low_normal_ins'] = fuzz.trapmf(insulin.universe, [15, 15, 60, 100])
-# insulin['high_normal_ins'] = fuzz.trimf(insulin.universe, [80, 150, 250])
-# insulin['elevated_ins'] = fuzz.trimf(insulin.universe, [200, 400, 600])
-# insulin['very_high_ins'] = fuzz.trapmf(insulin.universe, [550, 700, 850, 850])
-
-# bmi['underweight_bmi'] = fuzz.trapmf(bmi.universe, [15, 15, 17, 18.5])
-# bmi['normal_bmi'] = fuzz.trimf(bmi.universe, [18, 21.5, 25])
-# bmi['overweight_bmi'] = fuzz.trimf(bmi.universe, [24, 27.5, 30])
-# bmi['obese_bmi'] = fuzz.trimf(bmi.universe, [29, 35, 40])
-# bmi['severely_obese_bmi'] = fuzz.trapmf(bmi.universe, [38, 45, 60, 60])
-
-# dpf['low_dpf'] = fuzz.trimf(dpf.universe, [0.05, 0.05, 0.4])
-# dpf['medium_dpf'] = fuzz.trimf(dpf.universe, [0.3, 0.7, 1.1])
-# dpf['high_dpf'] = fuzz.trapmf(dpf.universe, [0.9, 1.5, 2.5, 2.5])
-
-# age['young_age'] = fuzz.trimf(age.universe, [20, 20, 35])
-# age['middle_aged_age'] = fuzz.trimf(age.universe, [30, 45, 60])
-# age['senior_age'] = fuzz.trapmf(age.universe, [55, 65, 85, 85])
-
-
-# Output variable (Consequent) membership functions remain manually defined
-# These are fine as they define the output risk levels.
-diabetes_risk['low_risk'] = fuzz.trimf(diabetes_risk.universe, [0, 25, 50])
-diabetes_risk['medium_risk'] = fuzz.trimf(diabetes_risk.universe, [25, 50, 75])
-diabetes_risk['high_risk'] = fuzz.trimf(diabetes_risk.universe, [50, 75, 100])
-
-#cell5
-# --- 4. Define Fuzzy Rules ---
-
-# IMPORTANT: These rules now assume that your FCM process
-# will generate membership functions with names like 'low_gl', 'normal_gl', 'high_gl', etc.
-# based on the `names` list provided in `assign_fcm_mfs` in Cell 4.
-# You MUST verify that the names used here match the names actually assigned
-# to your FCM-derived membership functions for the chosen n_clusters.
-# If you chose more than 3 clusters for a feature, you'll need to adapt these rules
-# to use the new names (e.g., 'very_high_gl', 'obese_bmi', etc.)
-
-# Rules for High Risk
-# Aim for 6 rules focusing on strong indicators and critical combinations
-rule_high_1 = ctrl.Rule(glucose['high_gl'], diabetes_risk['high_risk'], label='High Glucose -> High Risk')
-rule_high_2 = ctrl.Rule(bmi['obese_bmi'], diabetes_risk['high_risk'], label='Obese BMI -> High Risk')
-rule_high_3 = ctrl.Rule(insulin['very_high_ins'], diabetes_risk['high_risk'], label='Very High Insulin -> High Risk')
-rule_high_4 = ctrl.Rule(dpf['high_dpf'] & (glucose['high_gl'] | insulin['elevated_ins']), diabetes_risk['high_risk'], label='High DPF & (High Glucose OR Elevated Insulin) -> High Risk')
-rule_high_5 = ctrl.Rule(age['elderly_age'] & (glucose['high_gl'] | bmi['obese_bmi']), diabetes_risk['high_risk'], label='Elderly Age & (High Glucose OR Obese BMI) -> High Risk')
-rule_high_6 = ctrl.Rule(pregnancies['very_high_preg'] & glucose['high_gl'], diabetes_risk['high_risk'], label='Very High Pregnancies & High Glucose -> High Risk')
-
-# Rules for Medium Risk
-# Aim for 6 rules focusing on borderline or moderate risk
-rule_medium_1 = ctrl.Rule(glucose['normal_gl'] & insulin['elevated_ins'], diabetes_risk['medium_risk'], label='Normal Glucose & Elevated Insulin -> Medium Risk')
-rule_medium_2 = ctrl.Rule(bmi['overweight_bmi'] & (age['middle_aged_age'] | age['senior_age']), diabetes_risk['medium_risk'], label='Overweight BMI & Middle/Senior Age -> Medium Risk')
-rule_medium_3 = ctrl.Rule(blood_pressure['elevated_bp'] & glucose['normal_gl'], diabetes_risk['medium_risk'], label='Elevated BP & Normal Glucose -> Medium Risk')
-rule_medium_4 = ctrl.Rule(dpf['medium_dpf'] & (age['middle_aged_age'] | age['senior_age']), diabetes_risk['medium_risk'], label='Medium DPF & Middle/Senior Age -> Medium Risk')
-rule_medium_5 = ctrl.Rule(pregnancies['high_preg'] & bmi['overweight_bmi'], diabetes_risk['medium_risk'], label='High Pregnancies & Overweight BMI -> Medium Risk')
-rule_medium_6 = ctrl.Rule(glucose['normal_gl'] & bmi['obese_bmi'], diabetes_risk['medium_risk'], label='Normal Glucose & Obese BMI -> Medium Risk')
-
-# Rules for Low Risk
-# Aim for 6 rules focusing on combinations indicating low risk
-rule_low_1 = ctrl.Rule(glucose['normal_gl'] & bmi['normal_bmi'] & age['young_age'], diabetes_risk['low_risk'], label='Normal Glucose & Normal BMI & Young Age -> Low Risk')
-rule_low_2 = ctrl.Rule(glucose['low_gl'], diabetes_risk['low_risk'], label='Low Glucose -> Low Risk')
-rule_low_3 = ctrl.Rule(bmi['normal_bmi'] & blood_pressure['normal_bp'], diabetes_risk['low_risk'], label='Normal BMI & Normal BP -> Low Risk')
-rule_low_4 = ctrl.Rule(dpf['very_low_dpf'] & (age['young_age'] | age['middle_aged_age']), diabetes_risk['low_risk'], label='Very Low DPF & Young/Middle Age -> Low Risk')
-rule_low_5 = ctrl.Rule(pregnancies['zero_preg'] & glucose['normal_gl'] & bmi['normal_bmi'], diabetes_risk['low_risk'], label='Zero Pregnancies & Normal Glucose & Normal BMI -> Low Risk')
-rule_low_6 = ctrl.Rule(insulin['normal_insulin'] & skin_thickness['normal_skin'], diabetes_risk['low_risk'], label='Normal Insulin & Normal Skin -> Low Risk')
-
-
-# Collect all rules
-all_rules = [
-    rule_high_1, rule_high_2, rule_high_3, rule_high_4, rule_high_5, rule_high_6,
-    rule_medium_1, rule_medium_2, rule_medium_3, rule_medium_4, rule_medium_5, rule_medium_6,
-    rule_low_1, rule_low_2, rule_low_3, rule_low_4, rule_low_5, rule_low_6
-]
-
-#cell6
-# --- 5. Create Control System and Simulation ---
-risk_ctrl_system = ctrl.ControlSystem(all_rules)
-risk_simulation = ctrl.ControlSystemSimulation(risk_ctrl_system)
+    for label, variable in fcm_model['variables'].items():
+        st.success(f"{label}: Assigned {len(variable['centers'])} Gaussian MFs "
+                   f"({', '.join(variable['terms'])}).")
 
 #cell7
-# --- 6. Simulate for a New Patient (Example) ---
-# This cell is for a single example. The full DataFrame processing is in Cell 8.
-# You can uncomment and test individual cases here if needed.
-# For now, keeping it minimal as the full processing is handled below.
-# results = []
-# for i in range(len(df)):
-#     try:
-#         risk_simulation.input['glucose'] = df['Glucose'].iloc[i]
-#         risk_simulation.input['bmi'] = df['BMI'].iloc[i]
-#         risk_simulation.input['age'] = df['Age'].iloc[i]
-#         risk_simulation.input['blood_pressure'] = df['BloodPressure'].iloc[i]
-#         risk_simulation.input['pregnancies'] = df['Pregnancies'].iloc[i]
-#         risk_simulation.input['diabetes_pedigree_function'] = df['DiabetesPedigreeFunction'].iloc[i]
-#         risk_simulation.input['skin_thickness'] = df['SkinThickness'].iloc[i]
-#         risk_simulation.input['insulin'] = df['Insulin'].iloc[i]
-#         risk_simulation.compute()
-#         results.append(risk_simulation.output['diabetes_risk'])
-#     except Exception as e:
-#         print(f"Error processing row {i} (after preprocessing): {e}")
-#         results.append(np.nan)
-
-# df['predicted_fuzzy_risk'] = results
+# --- 6. Score the Dataset ---
+profiling.stage('scoring')
+# Vectorised equivalent of one skfuzzy ControlSystemSimulation.compute() per
+# row; see fuzzy_diabetes.inference for the tolerance against it.
+risk_scorer = BatchRiskScorer.from_model(fcm_model)
+df['predicted_fuzzy_risk'] = risk_scorer.predict_frame(df)
 
 #cell 8
 # --- Classification Metrics (Streamlit Version) ---
-# Calculate optimal threshold from F1-score
-f1_scores = 2 * (precision * recall) / (precision + recall)
-f1_scores[np.isnan(f1_scores)] = 0  # Handle division by zero if it occurs
-optimal_f1_idx = np.argmax(f1_scores)
-optimal_threshold = thresholds[optimal_f1_idx]
-optimal_threshold = round(optimal_threshold, 2)
-st.subheader(f"📊 Classification Metrics (Optimal Threshold = {optimal_threshold}%)")
+profiling.stage('metrics')
+# Rows on which no rule fires have no risk score and are left out.
+df_eval = df.dropna(subset=['predicted_fuzzy_risk'])
+y_true = df_eval['Outcome'].to_numpy()
+y_scores = df_eval['predicted_fuzzy_risk'].to_numpy()
+# One sort of the scores yields the PR/ROC curves, the AUC and every
+# threshold metric below (see fuzzy_diabetes.evaluation).
+score_curve = evaluation.ScoreCurve(y_true, y_scores)
+
+# The F1-optimal threshold was learned when the model was fitted and is stored
+# with it (fuzzy_diabetes.model.learn_thresholds).  Every metric uses it
+# exactly; it is rounded for display only.
+optimal_threshold = fcm_model['thresholds']['f1_optimal']
+display_threshold = round(optimal_threshold, 2)
+st.subheader(f"📊 Classification Metrics (Optimal Threshold = {display_threshold}%)")
+
+cm = score_curve.confusion_matrix(optimal_threshold)
+threshold_metrics = score_curve.metrics(optimal_threshold)
+accuracy, precision, recall, f1 = (threshold_metrics[name] for name in evaluation.METRICS)
+fpr, tpr, _ = score_curve.roc_curve()
+optimal_idx = score_curve.roc_index(optimal_threshold)
 
 # Display numerical metrics
 col1, col2, col3, col4 = st.columns(4)
@@ -422,57 +226,56 @@ col3.metric("Recall", f"{recall:.4f}")
 col4.metric("F1-Score", f"{f1:.4f}")
 
 # Display the optimal threshold
-st.info(f"**Optimal Threshold selected by maximizing F1-Score for Outcome=1:** `{optimal_threshold:.2f}`")
-
-# Confusion Matrix Visualization
-st.subheader("🧮 Confusion Matrix")
-fig, ax = plt.subplots()
-sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', cbar=False, ax=ax)
-ax.set_xlabel('Predicted')
-ax.set_ylabel('Actual')
-ax.set_title('Confusion Matrix')
-st.pyplot(fig)
-
-# Interpretation of Confusion Matrix:
-# [[TN, FP],
-#  [FN, TP]]
-# TN: True Negatives (Actual 0, Predicted 0) - Correctly identified as non-diabetic
-# FP: False Positives (Actual 0, Predicted 1) - Incorrectly identified as diabetic (Type I error)
-# FN: False Negatives (Actual 1, Predicted 0) - Incorrectly identified as non-diabetic (Type II error)
-# TP: True Positives (Actual 1, Predicted 1) - Correctly identified as diabetic
+st.info(f"**Optimal Threshold selected by maximizing F1-Score for Outcome=1:** `{display_threshold:.2f}`")
 
 # Classification Report (provides all the above in a neat format)
 st.subheader("📄 Classification Report")
-report = classification_report(y_true, y_pred, target_names=['No Diabetes (0)', 'Diabetes (1)'])
+report = evaluation.classification_report(cm, target_names=['No Diabetes (0)', 'Diabetes (1)'])
 st.text(report)
 
 # ROC AUC Score
 # ROC AUC uses the probability scores, not the binary predictions
 # Higher is better, 0.5 is random, 1.0 is perfect
-roc_auc = roc_auc_score(y_true, y_scores)
+roc_auc = score_curve.auc()
 st.metric("ROC AUC Score", f"{roc_auc:.4f}")
 
+# Poisson-bootstrap 95% intervals, all replicates drawn in one vectorised pass
+intervals = score_curve.bootstrap(optimal_threshold, seed=0)
+st.caption("95% bootstrap intervals: " + ", ".join(
+    f"{name} [{intervals[name][0]:.3f}, {intervals[name][1]:.3f}]"
+    for name in ('accuracy', 'f1', 'auc')))
+
+# --- Evaluation plots ---
+profiling.stage('evaluation_plots')
+# Every metric above is on screen before any figure is built: each tab renders
+# only while it is selected, and the PNG is cached under the model key.
+cm_tab, roc_tab, dist_tab = st.tabs(
+    ["🧮 Confusion Matrix", "📈 ROC Curve", "🔍 Predicted Fuzzy Risk Distribution"],
+    key='evaluation_plots', on_change='rerun')
+
+# Interpretation of Confusion Matrix:
+# [[TN, FP],
+#  [FN, TP]]
+# TN: True Negatives (Actual 0, Predicted 0) - Correctly identified as non-diabetic
+# FP: False Positives (Actual 0, Predicted 1) - Incorrectly identified as diabetic (Type I error)
+# FN: False Negatives (Actual 1, Predicted 0) - Incorrectly identified as non-diabetic (Type II error)
+# TP: True Positives (Actual 1, Predicted 1) - Correctly identified as diabetic
+if cm_tab.open:
+    cm_tab.image(figures.render((fcm_model['key'], 'confusion_matrix', optimal_threshold),
+                                figures.confusion_matrix, cm))
+
 # --- 8. Visualize ROC Curve ---
-st.subheader("📈 ROC Curve")
-fig_roc, ax_roc = plt.subplots(figsize=(8, 6))
-ax_roc.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (AUC = {roc_auc:.2f})')
-ax_roc.plot([0, 1], [0, 1], color='navy', lw=2, linestyle='--', label='Random (AUC = 0.5)')
-ax_roc.scatter(fpr[optimal_f1_idx], tpr[optimal_f1_idx], color='red', s=100, label=f'Optimal Threshold ({optimal_threshold})')
-ax_roc.set(xlabel='False Positive Rate', ylabel='True Positive Rate', title='ROC Curve')
-ax_roc.legend(loc='lower right')
-ax_roc.grid(True)
-st.pyplot(fig_roc)
+if roc_tab.open:
+    roc_tab.image(figures.render((fcm_model['key'], 'roc', optimal_threshold), figures.roc_curve,
+                                 fpr, tpr, roc_auc, optimal_idx, display_threshold))
 
 # --- Optional: Visualize Predicted Risk Distribution ---
-st.subheader("🔍 Predicted Fuzzy Risk Distribution")
-fig_dist, ax_dist = plt.subplots(figsize=(10, 6))
-sns.histplot(df_eval[df_eval['Outcome'] == 0]['predicted_fuzzy_risk'], color='blue', label='No Diabetes', kde=True, stat='density', alpha=0.6, bins=30, ax=ax_dist)
-sns.histplot(df_eval[df_eval['Outcome'] == 1]['predicted_fuzzy_risk'], color='red', label='Diabetes', kde=True, stat='density', alpha=0.6, bins=30, ax=ax_dist)
-ax_dist.axvline(optimal_threshold, color='green', linestyle='--', label=f'Optimal Threshold ({optimal_threshold})')
-ax_dist.set(xlabel='Predicted Risk (%)', ylabel='Density', title='Fuzzy Risk Distribution by Outcome')
-ax_dist.legend()
-ax_dist.grid(axis='y', alpha=0.75)
-st.pyplot(fig_dist)
+if dist_tab.open:
+    dist_tab.image(figures.render(
+        (fcm_model['key'], 'risk_distribution', optimal_threshold), figures.risk_distribution,
+        df_eval['predicted_fuzzy_risk'], df_eval['Outcome'],
+        [(optimal_threshold, 'green', '--', f'Optimal Threshold ({display_threshold})')],
+        'Fuzzy Risk Distribution by Outcome', figsize=(10, 6)))
 
 #cell10
 # --- 8. Visualize FCM-derived Membership Functions (NEW SECTION) ---
@@ -481,25 +284,16 @@ st.pyplot(fig_dist)
 
 # --- FCM-Derived Membership Function Visualization ---
 st.subheader("📊 FCM-Derived Membership Functions")
+profiling.stage('membership_plots')
 
-# List of your antecedent objects
-antecedents_to_view = [
-    glucose,
-    bmi,
-    age,
-    blood_pressure,
-    pregnancies,
-    dpf,
-    skin_thickness,
-    insulin
-]
-
-# Iterate through each antecedent and display its membership functions
-for antecedent in antecedents_to_view:
-    st.markdown(f"**{antecedent.label}**")
-    fig, ax = plt.subplots()
-    antecedent.view(ax=ax)
-    st.pyplot(fig)
+# One plot per antecedent, built from the fitted model only when expanded.
+mf_plots = st.expander("Membership function plots", key='mf_plots', on_change='rerun')
+if mf_plots.open:
+    with mf_plots:
+        for label, variable in fcm_model['variables'].items():
+            st.markdown(f"**{label}**")
+            st.image(figures.render((fcm_model['key'], 'membership', label),
+                                    figures.membership_functions, variable, label))
 
 # --- FCM Parameters Review ---
 st.subheader("🔧 FCM Parameters Summary")
@@ -508,130 +302,115 @@ for key, params in fcm_mf_params.items():
     st.text(f"Centers: {np.array2string(params['centers'], precision=2, floatmode='fixed')}")
     st.text(f"Sigmas:  {np.array2string(np.array(params['sigmas']), precision=2, floatmode='fixed')}")
 
-# --- Risk Categorization using K-Means ---
-st.subheader("📉 K-Means Risk Categorization")
-
-st.markdown(f"""
+# --- Risk Categorization ---
+# The 3-class split minimising the within-class sum of squares (the K-means
+# objective), solved exactly by dynamic programming, so it is deterministic.
+# It is learned at fit time and stored with the model.
+profiling.stage('risk_categories')
+st.subheader("📉 Optimal Risk Categorization")
+
+risk_thresholds = fcm_model['thresholds']
+if 'medium_high' not in risk_thresholds:
+    # fit_model leaves the breaks out when the scored rows take fewer distinct
+    # values than there are categories (a tiny or degenerate upload).
+    st.warning("Too few distinct risk scores to split the patients into "
+               f"{len(categories.RISK_CATEGORIES)} risk categories.")
+else:
+    low_medium_threshold, medium_high_threshold = (
+        round(risk_thresholds[name], 2) for name in ('low_medium', 'medium_high'))
+    risk_order = list(categories.RISK_CATEGORIES) + ['All']
+    df_eval = df_eval.assign(risk_category=categories.category_labels(
+        df_eval['predicted_fuzzy_risk'], (low_medium_threshold, medium_high_threshold)))
+
+    st.markdown(f"""
 **Learned Thresholds:**  
 - Low Risk: < {low_medium_threshold}%  
 - Medium Risk: {low_medium_threshold}% - {medium_high_threshold}%  
 - High Risk: ≥ {medium_high_threshold}%
 """)
 
-# Patient count
-risk_category_counts = df_eval['risk_category'].value_counts().reindex(risk_order[:-1])
-st.markdown("**Patient Counts by Risk Category:**")
-st.dataframe(risk_category_counts.rename("Count"))
-
-# Percentage per category
-total_patients = len(df_eval)
-st.markdown("**Percentage of Patients per Category:**")
-for category in risk_order[:-1]:
-    count = risk_category_counts.get(category, 0)
-    pct = (count / total_patients) * 100 if total_patients > 0 else 0
-    st.markdown(f"- {category}: {pct:.2f}%")
-
-# Outcome Distribution
-st.markdown("**Outcome Distribution by Risk Category:**")
-risk_outcome_crosstab = pd.crosstab(df_eval['risk_category'], df_eval['Outcome'], margins=True)
-risk_outcome_crosstab = risk_outcome_crosstab.reindex(risk_order)
-risk_outcome_crosstab.columns = ['Actual No Diabetes', 'Actual Diabetes', 'Total']
-st.dataframe(risk_outcome_crosstab)
-
-# Accuracy/Purity by Category
-st.markdown("**Category Purity (Accuracy within each Risk Group):**")
-for category in risk_order[:-1]:
-    row = risk_outcome_crosstab.loc[category]
-    total_in_cat = row['Total']
-    if total_in_cat > 0:
-        pct_no_diabetes = (row['Actual No Diabetes'] / total_in_cat) * 100
-        pct_diabetes = (row['Actual Diabetes'] / total_in_cat) * 100
-        st.markdown(f"- **{category}**")
-        st.markdown(f"  - Actual No Diabetes: {pct_no_diabetes:.2f}%")
-        st.markdown(f"  - Actual Diabetes: {pct_diabetes:.2f}%")
-    else:
-        st.markdown(f"- **{category}**: No patients in this category.")
-
-# Visualize the three risk categories on the distribution plot
-st.subheader("📈 Distribution of Predicted Fuzzy Risk")
-
-# Create figure
-fig, ax = plt.subplots(figsize=(12, 7))
-
-# Plot histograms for each class (0 = No Diabetes, 1 = Diabetes)
-sns.histplot(df_eval[df_eval['Outcome'] == 0]['predicted_fuzzy_risk'],
-             color='blue', label='_nolegend_', kde=True, stat='density', alpha=0.6, bins=30, ax=ax)
-
-sns.histplot(df_eval[df_eval['Outcome'] == 1]['predicted_fuzzy_risk'],
-             color='red', label='_nolegend_', kde=True, stat='density', alpha=0.6, bins=30, ax=ax)
-
-# Plot threshold lines
-ax.axvline(low_medium_threshold, color='green', linestyle='--',
-           label=f'Low/Medium Threshold ({low_medium_threshold}%)')
-
-ax.axvline(medium_high_threshold, color='purple', linestyle=':',
-           label=f'Medium/High Threshold ({medium_high_threshold}%)')
-
-# Title and labels
-ax.set_title('Distribution of Predicted Fuzzy Risk by Actual Outcome')
-ax.set_xlabel('Predicted Fuzzy Risk (%)')
-ax.set_ylabel('Density')
-ax.grid(axis='y', alpha=0.75)
-
-# Custom legend
-legend_handles = [
-    Patch(facecolor='blue', edgecolor='black', alpha=0.6, label='Actual No Diabetes'),
-    Patch(facecolor='red', edgecolor='black', alpha=0.6, label='Actual Diabetes'),
-    plt.Line2D([0], [0], color='green', linestyle='--', lw=2, label=f'Low/Medium Threshold ({low_medium_threshold}%)'),
-    plt.Line2D([0], [0], color='purple', linestyle=':', lw=2, label=f'Medium/High Threshold ({medium_high_threshold}%)')
-]
-ax.legend(handles=legend_handles, loc='upper right')
-
-st.pyplot(fig)
-
-# Display thresholds
-st.markdown(f"""
-### 🧪 K-Means Risk Thresholds
+    # Patient count
+    risk_category_counts = df_eval['risk_category'].value_counts().reindex(risk_order[:-1])
+    st.markdown("**Patient Counts by Risk Category:**")
+    st.dataframe(risk_category_counts.rename("Count"))
+
+    # Percentage per category
+    total_patients = len(df_eval)
+    st.markdown("**Percentage of Patients per Category:**")
+    for category in risk_order[:-1]:
+        count = risk_category_counts.get(category, 0)
+        pct = (count / total_patients) * 100 if total_patients > 0 else 0
+        st.markdown(f"- {category}: {pct:.2f}%")
+
+    # Outcome Distribution
+    st.markdown("**Outcome Distribution by Risk Category:**")
+    risk_outcome_crosstab = pd.crosstab(df_eval['risk_category'], df_eval['Outcome'], margins=True)
+    risk_outcome_crosstab = risk_outcome_crosstab.reindex(risk_order)
+    risk_outcome_crosstab.columns = ['Actual No Diabetes', 'Actual Diabetes', 'Total']
+    st.dataframe(risk_outcome_crosstab)
+
+    # Accuracy/Purity by Category
+    st.markdown("**Category Purity (Accuracy within each Risk Group):**")
+    for category in risk_order[:-1]:
+        row = risk_outcome_crosstab.loc[category]
+        total_in_cat = row['Total']
+        if total_in_cat > 0:
+            pct_no_diabetes = (row['Actual No Diabetes'] / total_in_cat) * 100
+            pct_diabetes = (row['Actual Diabetes'] / total_in_cat) * 100
+            st.markdown(f"- **{category}**")
+            st.markdown(f"  - Actual No Diabetes: {pct_no_diabetes:.2f}%")
+            st.markdown(f"  - Actual Diabetes: {pct_diabetes:.2f}%")
+        else:
+            st.markdown(f"- **{category}**: No patients in this category.")
+
+    # Display thresholds
+    st.markdown(f"""
+### 🧪 Risk Category Thresholds
 - **Low Risk**: < {low_medium_threshold}%
 - **Medium Risk**: {low_medium_threshold}% – {medium_high_threshold}%
 - **High Risk**: ≥ {medium_high_threshold}%
 """)
 
-# Visualize the three risk categories on the distribution plot
-st.subheader("📊 Distribution of Predicted Fuzzy Risk by Actual Outcome")
-
-# Create the figure
-fig, ax = plt.subplots(figsize=(12, 7))
-
-# Plot histograms by outcome
-sns.histplot(df_eval[df_eval['Outcome'] == 0]['predicted_fuzzy_risk'],
-             color='blue', label='_nolegend_', kde=True, stat='density', alpha=0.6, bins=30, ax=ax)
-
-sns.histplot(df_eval[df_eval['Outcome'] == 1]['predicted_fuzzy_risk'],
-             color='red', label='_nolegend_', kde=True, stat='density', alpha=0.6, bins=30, ax=ax)
-
-# Add vertical threshold lines
-ax.axvline(low_medium_threshold, color='green', linestyle='--',
-           label=f'Low/Medium Risk Threshold ({low_medium_threshold}%)')
-
-ax.axvline(medium_high_threshold, color='purple', linestyle=':',
-           label=f'Medium/High Risk Threshold ({medium_high_threshold}%)')
-
-# Add title and labels
-ax.set_title('Distribution of Predicted Fuzzy Risk (by Actual Outcome and Risk Categories)')
-ax.set_xlabel('Predicted Fuzzy Risk (%)')
-ax.set_ylabel('Density')
-ax.grid(axis='y', alpha=0.75)
-
-# Custom legend
-custom_legend_handles = [
-    Patch(facecolor='blue', edgecolor='black', alpha=0.6, label='Actual No Diabetes'),
-    Patch(facecolor='red', edgecolor='black', alpha=0.6, label='Actual Diabetes'),
-    plt.Line2D([0], [0], color='green', linestyle='--', lw=2, label=f'Low/Medium Risk Threshold ({low_medium_threshold}%)'),
-    plt.Line2D([0], [0], color='purple', linestyle=':', lw=2, label=f'Medium/High Risk Threshold ({medium_high_threshold}%)')
-]
-
-ax.legend(handles=custom_legend_handles, loc='upper right')
-
-# Render the figure in Streamlit
-st.pyplot(fig)
+    # Visualize the three risk categories on the distribution plot.  This used to
+    # be drawn twice with near-identical styling; it is now one cached figure.
+    category_plot = st.expander("📈 Distribution of Predicted Fuzzy Risk by Actual Outcome",
+                                key='category_plot', on_change='rerun')
+    if category_plot.open:
+        category_plot.image(figures.render(
+            (fcm_model['key'], 'risk_categories', low_medium_threshold, medium_high_threshold),
+            figures.risk_distribution,
+            df_eval['predicted_fuzzy_risk'], df_eval['Outcome'],
+            [(low_medium_threshold, 'green', '--', f'Low/Medium Threshold ({low_medium_threshold}%)'),
+             (medium_high_threshold, 'purple', ':', f'Medium/High Threshold ({medium_high_threshold}%)')],
+            'Distribution of Predicted Fuzzy Risk by Actual Outcome'))
+
+# --- What-if Analysis ---
+# How one patient's risk moves as one or two features sweep their universes,
+# next to the partial dependence over all patients.  Each chart is a single
+# batched evaluation, cached per model version (see fuzzy_diabetes.sensitivity).
+profiling.stage('what_if')
+st.subheader("🔍 What-if Risk Analysis")
+what_if = st.expander("Risk surface for one patient", key='what_if', on_change='rerun')
+if what_if.open:
+    with what_if:
+        patient_row = st.number_input("Patient row", min_value=0, max_value=len(df) - 1, value=0)
+        swept = st.multiselect("Features to sweep (one or two)", list(INPUT_COLUMNS),
+                               default=['glucose'], max_selections=2)
+        if swept:
+            patient = df.iloc[int(patient_row)]
+            base = {label: float(patient[col]) for label, col in INPUT_COLUMNS.items()}
+            surface = sensitivity.risk_surface(fcm_model, base, swept, frame=df)
+            st.metric("Patient risk", f"{surface.base_risk:.1f}%")
+            st.image(figures.render(
+                (fcm_model['key'], 'what_if', tuple(swept), tuple(base.values())),
+                figures.risk_sensitivity, surface, base, sensitivity.REFERENCE_BANDS))
+profiling.stage(None)
+
+# --- Performance panel (only while profiling is enabled) ---
+if profiling.enabled():
+    with st.expander("⏱️ Performance"):
+        st.dataframe(pd.DataFrame([
+            dict(row, **row.pop('counters')) for row in profiling.summary()
+        ]))
+    if os.environ.get(profiling.EXPORT_ENV_VAR):
+        profiling.export(os.environ[profiling.EXPORT_ENV_VAR])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Core library behind the fuzzy diabetes risk dashboard.
+
+Data preparation (`preprocess`, `datasource`), FCM fitting (`fcm`), model
+building (`model`, `rules`) and scoring (`inference`, `compact`,
+`stream`) depend on NumPy only; pandas and scikit-fuzzy are used when they
+are installed and passed in, never imported up front.  matplotlib and
+seaborn are imported by `figures` on first render, Streamlit only by the
+``app.py`` dashboard.
+
+The names below are exported lazily: ``import fuzzy_diabetes`` imports no
+submodule, and the first access to, say, ``fuzzy_diabetes.BatchRiskScorer``
+imports just the modules it needs.  Scoring one patient therefore costs the
+NumPy import plus a few milliseconds::
+
+    python -X importtime -m fuzzy_diabetes.inference model.npz --glucose 148 ...
+"""
+
+import importlib
+
+# Exported name -> submodule defining it.
+_EXPORTS = {
+    'CompactModel': 'compact',
+    'BatchRiskScorer': 'inference',
+    'InputVariable': 'inference',
+    'RuleSpec': 'inference',
+    'rules_from_ctrl': 'inference',
+    'fit_model': 'model',
+    'load_model': 'model',
+    'load_or_fit': 'model',
+    'mf_params': 'model',
+    'save_model': 'model',
+    'MF_NAMES': 'rules',
+    'RISK_RULES': 'rules',
+    'build_ctrl_rules': 'rules',
+    'INPUT_COLUMNS': 'schema',
+    'OUTPUT_LABEL': 'schema',
+    'TARGET_COLUMN': 'schema',
+    'score_csv': 'stream',
+    'streaming_medians': 'stream',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value  # later lookups skip this hook
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""Reproducible benchmarks for fitting, inference and dashboard rendering.
+
+Every pipeline stage is timed on its own, on the Pima file and on
+synthetic Pima-like data of any size (``--sizes 1e3 1e5 1e7``).  The Pima
+file is fetched once into the local snapshot cache (`fuzzy_diabetes.datasource`)
+and its SHA-256 is recorded with the results:
+
+* ``fcm_mf_params`` -- `get_fcm_mf_params` for every antecedent,
+* ``fpc_sweep`` -- the FPC sweep over ``N_CLUSTERS_RANGE``,
+* ``control_system`` -- skfuzzy Antecedents with the FCM Gaussians
+  (``assign_fcm_mfs``), the rules and ``ctrl.ControlSystem``,
+* ``inference_per_row`` -- the old ``ControlSystemSimulation`` loop, on at
+  most ``PER_ROW_LIMIT`` rows (``per_row_s`` extrapolates),
+* ``inference_batch[<defuzzify>]`` -- `BatchRiskScorer.predict`,
+* ``kmeans_thresholds`` -- 3-cluster K-means on the risk scores,
+* ``risk_breaks`` -- the optimal 3-class breakpoints that replace it in the
+  dashboard (`categories.risk_breaks`),
+* ``figures`` -- the membership and risk-distribution figures, rendered to
+  PNG with the Agg backend.
+
+Stages whose optional dependency is missing are reported as skipped.
+Results are written as JSON; with ``--baseline`` each timing is compared
+with the stored one and the exit status is 1 when any stage is slower by
+more than ``--tolerance`` (the CI workflow runs exactly this)::
+
+    python -m fuzzy_diabetes.bench --sizes 1e3 1e4 --output bench.json \\
+        --baseline fuzzy_diabetes/data/bench_baseline.json
+
+Baseline timings are scaled by how fast each machine runs a fixed NumPy
+workload (`calibrate`), so a baseline recorded elsewhere stays usable.
+Stages are only compared on the same data (same Pima checksum) and with
+the same number of worker processes.
+"""
+
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from . import categories, fcm
+from .datasource import DEFAULT_DATA_URL
+from .inference import BatchRiskScorer
+from .model import DEFAULT_N_CLUSTERS, FCM_OPTIONS, N_CLUSTERS_RANGE, fit_model, impute
+from .schema import INPUT_COLUMNS, TARGET_COLUMN
+
+FORMAT_VERSION = 1
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BASELINE_PATH = os.path.join(DATA_DIR, 'bench_baseline.json')
+# Where the Pima file comes from (a URL or a path); see `load_pima`.
+PIMA_SOURCE = os.environ.get('FUZZY_DIABETES_PIMA', DEFAULT_DATA_URL)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+# Rows pushed through ControlSystemSimulation one at a time.
+PER_ROW_LIMIT = 200
+# Relative slowdown against the baseline reported as a regression, and the
+# absolute slowdown below which timings are treated as noise.
+REGRESSION_TOLERANCE = 0.25
+NOISE_FLOOR_S = 0.005
+
+# --- Synthetic data ---
+# Marginals follow the published Pima summary statistics; zeros mark
+# missing measurements with roughly the Pima missing rates.
+_MISSING_RATES = {'Glucose': 0.007, 'BloodPressure': 0.046, 'SkinThickness': 0.296,
+                  'Insulin': 0.487, 'BMI': 0.014}
+
+
+def synthetic_pima(n, seed=0):
+    """``n`` Pima-like rows as a dict of float64 columns (values rounded as in the CSV)."""
+    rng = np.random.default_rng(seed)
+    outcome = rng.random(n) < 0.349
+    data = {
+        'Pregnancies': np.minimum(rng.poisson(3.8, n), 17).astype(np.float64),
+        'Glucose': np.clip(np.round(rng.normal(110.0 + 31.0 * outcome, 28.0)), 44, 199),
+        'BloodPressure': np.clip(np.round(rng.normal(72.0, 12.0, n)), 24, 122),
+        'SkinThickness': np.clip(np.round(rng.normal(29.0, 10.0, n)), 7, 99),
+        'Insulin': np.clip(np.round(rng.lognormal(4.8, 0.6, n)), 14, 846),
+        'BMI': np.clip(np.round(rng.normal(30.9 + 4.3 * outcome, 6.5), 1), 18.2, 67.1),
+        'DiabetesPedigreeFunction': np.clip(np.round(rng.lognormal(-0.9, 0.6, n), 3),
+                                            0.078, 2.42),
+        'Age': np.clip(np.round(21.0 + rng.gamma(1.6, 8.0, n)), 21, 81),
+        TARGET_COLUMN: outcome.astype(np.float64),
+    }
+    for col, rate in _MISSING_RATES.items():
+        data[col][rng.random(n) < rate] = 0.0
+    return data
+
+
+def _display_source(source):
+    """URLs as they are, local paths relative to the repository."""
+    source = str(source)
+    return source if '://' in source else os.path.relpath(os.path.abspath(source), REPO_ROOT)
+
+
+def load_pima(source=PIMA_SOURCE):
+    """The Pima data as float64 columns and its provenance.
+
+    The first call fetches and validates ``source`` into the snapshot
+    cache; later calls read the snapshot.  Returns ``(None, info)`` when the
+    source cannot be read.
+    """
+    from .datasource import load_columns
+
+    info = {'source': _display_source(source)}
+    try:
+        columns, meta = load_columns(source)
+    except (OSError, ValueError) as exc:
+        reason = getattr(exc, 'reason', None) or getattr(exc, 'strerror', None) or exc
+        return None, dict(info, skipped=f"{type(exc).__name__}: {reason}")
+    data = {col: np.asarray(values, dtype=np.float64) for col, values in columns.items()}
+    return data, dict(info, sha256=meta['content_sha256'], rows=meta['n_rows'])
+
+
+def calibrate(repeat=5):
+    """Best-of-``repeat`` seconds of a fixed NumPy workload (sort, exp, matmul)."""
+    rng = np.random.default_rng(0)
+    x = rng.random(1 << 20)
+    a = rng.random((256, 256))
+
+    def work():
+        np.sort(x)
+        np.exp(x).sum()
+        a @ a
+
+    return min(_time(work, repeat)[1])
+
+
+# --- Stages ---
+def _time(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def _control_system(model):
+    from skfuzzy import control as ctrl
+    from skfuzzy import gaussmf
+
+    from .rules import build_ctrl_rules, trimf
+
+    variables = {}
+    for label, v in model['variables'].items():
+        antecedent = ctrl.Antecedent(v['universe'], label)
+        for name, center, sigma in zip(v['terms'], v['centers'], v['sigmas']):
+            antecedent[name] = gaussmf(antecedent.universe, center, sigma)
+        variables[label] = antecedent
+    output = model['output']
+    consequent = ctrl.Consequent(output['universe'], output['label'])
+    for name, abc in output['terms'].items():
+        consequent[name] = trimf(consequent.universe, abc)
+    variables[output['label']] = consequent
+    return ctrl.ControlSystem(build_ctrl_rules(model['rules'], variables))
+
+
+def _per_row(system, model, inputs, n_rows):
+    from skfuzzy import control as ctrl
+
+    simulation = ctrl.ControlSystemSimulation(system)
+    out = np.empty(n_rows)
+    for i in range(n_rows):
+        for label in model['variables']:
+            simulation.input[label] = inputs[label][i]
+        simulation.compute()
+        out[i] = simulation.output[model['output']['label']]
+    return out
+
+
+def _kmeans_thresholds(scores, seed):
+    from sklearn.cluster import KMeans
+
+    scores = scores[~np.isnan(scores)].reshape(-1, 1)
+    centers = np.sort(KMeans(n_clusters=3, n_init=10, random_state=seed)
+                      .fit(scores).cluster_centers_.ravel())
+    return (centers[:-1] + centers[1:]) / 2
+
+
+def _pyplot():
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _figures(model, scores, outcome, thresholds):
+    from .rules import trimf
+
+    plt = _pyplot()
+    figures = []
+    for v in model['variables'].values():
+        fig, ax = plt.subplots()
+        x = v['universe']
+        for name, center, sigma in zip(v['terms'], v['centers'], v['sigmas']):
+            ax.plot(x, np.exp(-0.5 * ((x - center) / sigma) ** 2), label=name)
+        ax.legend()
+        figures.append(fig)
+    fig, ax = plt.subplots(figsize=(12, 7))
+    for value, color in ((0, 'blue'), (1, 'red')):
+        ax.hist(scores[outcome == value], bins=30, density=True, alpha=0.6, color=color)
+    for threshold in thresholds:
+        ax.axvline(threshold, linestyle='--')
+    universe = model['output']['universe']
+    for abc in model['output']['terms'].values():
+        ax.plot(universe, trimf(universe, abc) * 0.05, color='gray')
+    figures.append(fig)
+
+    size = 0
+    for fig in figures:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        size += buffer.tell()
+        plt.close(fig)
+    return size
+
+
+def _warm_up():
+    """Pay import and first-call costs (e.g. BLAS thread pools) before timing."""
+    for warm in (lambda: __import__('skfuzzy.control'),
+                 lambda: _kmeans_thresholds(np.arange(10.0), 0),
+                 _pyplot):
+        try:
+            warm()
+        except ImportError:
+            pass
+
+
+def _missing_dependency(exc):
+    return {'skipped': f"missing dependency: {exc.name}"}
+
+
+def run_dataset(name, data, repeat=3, seed=0, n_jobs=None,
+                defuzzify_modes=('sampled', 'analytic', 'table')):
+    """Time every stage on one dataset; returns a list of result dicts."""
+    n = len(data[INPUT_COLUMNS['glucose']])
+    results = []
+
+    def record(stage, times, rows=n, **extra):
+        results.append(dict({'dataset': name, 'rows': n, 'stage': stage, 'evaluated_rows': rows,
+                             'repeat': len(times), 'min_s': min(times),
+                             'median_s': float(np.median(times))}, **extra))
+
+    def skip(stage, info):
+        results.append(dict({'dataset': name, 'rows': n, 'stage': stage}, **info))
+
+    # Imputation, the FCM fits and the sweep see the same data as fit_model.
+    model = fit_model(data, seed=seed, n_jobs=n_jobs)
+    imputed = impute({col: np.array(values) for col, values in data.items()}, model)
+    columns = {label: imputed[col] for label, col in INPUT_COLUMNS.items()}
+
+    _, times = _time(lambda: [fcm.get_fcm_mf_params(columns[label], DEFAULT_N_CLUSTERS[label],
+                                                    seed=seed, **FCM_OPTIONS)
+                              for label in columns], repeat)
+    record('fcm_mf_params', times)
+    _, times = _time(lambda: fcm.run_fpc_sweep(columns, N_CLUSTERS_RANGE, n_jobs=n_jobs,
+                                               seed=seed, **FCM_OPTIONS), repeat)
+    record('fpc_sweep', times, workers=n_jobs or os.cpu_count() or 1)
+
+    try:
+        system, times = _time(lambda: _control_system(model), repeat)
+        record('control_system', times)
+        n_rows = min(n, PER_ROW_LIMIT)
+        _, times = _time(lambda: _per_row(system, model, columns, n_rows), 1)
+        record('inference_per_row', times, rows=n_rows, per_row_s=min(times) / n_rows)
+    except ImportError as exc:
+        skip('control_system', _missing_dependency(exc))
+        skip('inference_per_row', _missing_dependency(exc))
+
+    scores = None
+    for mode in defuzzify_modes:
+        scorer = BatchRiskScorer.from_model(model, defuzzify=mode)
+        out, times = _time(lambda: scorer.predict(columns), repeat)
+        record(f'inference_batch[{mode}]', times, per_row_s=min(times) / n)
+        if scores is None:
+            scores = out
+
+    thresholds = ()
+    try:
+        thresholds, times = _time(lambda: _kmeans_thresholds(scores, seed), repeat)
+        record('kmeans_thresholds', times, thresholds=[float(t) for t in thresholds])
+    except ImportError as exc:
+        skip('kmeans_thresholds', _missing_dependency(exc))
+    breaks, times = _time(lambda: categories.risk_breaks(scores), repeat)
+    record('risk_breaks', times, thresholds=[float(t) for t in breaks.thresholds])
+    thresholds = breaks.thresholds
+
+    try:
+        outcome = data.get(TARGET_COLUMN, np.zeros(n))
+        png_bytes, times = _time(lambda: _figures(model, scores, outcome, thresholds), repeat)
+        record('figures', times, png_bytes=png_bytes)
+    except ImportError as exc:
+        skip('figures', _missing_dependency(exc))
+    return results
+
+
+def _meta():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(sizes=DEFAULT_SIZES, pima=True, repeat=3, seed=0, n_jobs=None, log=None,
+        pima_source=PIMA_SOURCE):
+    """Run the suite; returns the JSON-serialisable report."""
+    datasets = []
+    meta = _meta()
+    if pima:
+        data, meta['pima'] = load_pima(pima_source)
+        if data is not None:
+            datasets.append(('pima', data))
+    datasets += [(f'synthetic_{n}', synthetic_pima(n, seed)) for n in sizes]
+
+    _warm_up()
+    meta['calibration_s'] = calibrate()
+    results = []
+    for name, data in datasets:
+        if log:
+            log(f"{name} ...")
+        results += run_dataset(name, data, repeat, seed, n_jobs)
+    return {'format_version': FORMAT_VERSION, 'meta': meta, 'results': results}
+
+
+def _pima_sha256(report):
+    info = report['meta'].get('pima')
+    return info.get('sha256') if isinstance(info, dict) else None
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE, noise_floor=NOISE_FLOOR_S):
+    """Best-of-repeat timings of ``report`` against ``baseline``, per (dataset, stage).
+
+    ``baseline_s`` is the stored timing scaled to this machine by the ratio
+    of the two calibration timings.  Rows timed on different Pima data or
+    with a different number of workers are listed with a ``skipped`` reason
+    and never count as regressions.
+    """
+    previous = {(r['dataset'], r['stage']): r for r in baseline['results'] if 'min_s' in r}
+    current_cal = report['meta'].get('calibration_s')
+    baseline_cal = baseline['meta'].get('calibration_s')
+    speed = current_cal / baseline_cal if current_cal and baseline_cal else 1.0
+    same_pima = _pima_sha256(report) == _pima_sha256(baseline)
+    rows = []
+    for r in report['results']:
+        old = previous.get((r['dataset'], r['stage']))
+        if old is None or 'min_s' not in r:
+            continue
+        row = {'dataset': r['dataset'], 'stage': r['stage'],
+               'baseline_s': old['min_s'] * speed, 'current_s': r['min_s']}
+        if r['dataset'] == 'pima' and not same_pima:
+            rows.append(dict(row, ratio=None, regression=False, skipped="different Pima file"))
+            continue
+        if r.get('workers') != old.get('workers'):
+            rows.append(dict(row, ratio=None, regression=False,
+                             skipped=f"{old.get('workers')} -> {r.get('workers')} workers"))
+            continue
+        expected = row['baseline_s']
+        ratio = r['min_s'] / expected if expected > 0 else np.inf
+        slower = ratio > 1 + tolerance and r['min_s'] - expected > noise_floor
+        rows.append(dict(row, ratio=ratio, regression=bool(slower)))
+    return rows
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the fuzzy diabetes pipeline.")
+    parser.add_argument('--sizes', type=float, nargs='*', default=list(DEFAULT_SIZES),
+                        help="Synthetic dataset sizes (e.g. 1e3 1e5 1e7)")
+    parser.add_argument('--no-pima', action='store_true', help="Skip the Pima file")
+    parser.add_argument('--pima', default=PIMA_SOURCE,
+                        help="Pima CSV to fetch into the cache (URL or path)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Worker processes for the FPC sweep")
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', help="Stored report to compare against")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run([int(n) for n in args.sizes], not args.no_pima, args.repeat, args.seed,
+                 args.jobs, log=lambda msg: print(msg, file=sys.stderr), pima_source=args.pima)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['comparison'] = compare(report, json.load(f), args.tolerance)
+        regressions = [r for r in report['comparison'] if r['regression']]
+        for r in report['comparison']:
+            verdict = (f"skipped ({r['skipped']})" if 'skipped' in r
+                       else f"x{r['ratio']:.2f}{'  REGRESSION' if r['regression'] else ''}")
+            print(f"{r['dataset']:>18} {r['stage']:<28} {r['baseline_s']:10.4f}s "
+                  f"-> {r['current_s']:10.4f}s  {verdict}", file=sys.stderr)
+
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
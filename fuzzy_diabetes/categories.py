@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Globally optimal 1-D risk-category breakpoints (Jenks / Ckmeans).
+
+`risk_breaks` splits the risk scores into ``k`` contiguous classes with the
+smallest total within-class sum of squares, the objective K-means
+minimises, but solved exactly and deterministically by dynamic programming
+over the sorted values instead of by seeded Lloyd iterations:
+
+    D[m, j] = min_i D[m - 1, i] + SSE(points i..j-1)
+
+with each SSE read off prefix sums of weight, value and squared value.  The
+optimal split ``i`` never decreases with ``j`` (as Ckmeans uses), so every
+layer is solved by divide and conquer, here one recursion level at a time
+for all midpoints at once; that costs O(k N log N) array operations on
+``N`` distinct values.
+
+For large inputs the scores are first counted into ``bins`` equal cells
+with their sum and sum of squares (``bins='auto'`` does this above
+`EXACT_LIMIT` scores).  The SSE of whole cells is still exact, so the
+result is the optimal partition among those breaking at cell edges, and
+the cost no longer depends on the number of scores beyond one pass to
+count them.
+
+Thresholds sit halfway across the gap between neighbouring classes; a score
+belongs to the higher class when ``score >= threshold`` (`categorize`).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+RISK_CATEGORIES = ('Low Risk', 'Medium Risk', 'High Risk')
+DEFAULT_BINS = 16384
+# Scores clustered exactly (over their distinct values) by ``bins='auto'``.
+EXACT_LIMIT = 200_000
+# Scores counted per pass in histogram mode; bounds the work arrays.
+HISTOGRAM_CHUNK = 1 << 18
+
+Breaks = namedtuple('Breaks', 'thresholds centers counts sse')
+
+
+def _segment_argmin(values, starts):
+    """First position of the minimum of each ``values[starts[s]:starts[s + 1]]``."""
+    lowest = np.minimum.reduceat(values, starts)
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(values)]))
+    hits = np.flatnonzero(values == lowest[segment])
+    first = np.r_[True, segment[hits][1:] != segment[hits][:-1]]
+    return hits[first]
+
+
+def _layer(prev, cost, m, n):
+    """``D[m, j]`` and its argmin for ``j = m..n`` given ``prev = D[m - 1, :]``."""
+    best = np.full(n + 1, np.inf)
+    split = np.zeros(n + 1, dtype=np.intp)
+    # Pending segments: targets j in [jlo, jhi], splits searched in [olo, ohi].
+    jlo, jhi = np.array([m]), np.array([n])
+    olo, ohi = np.array([m - 1]), np.array([n - 1])
+    while len(jlo):
+        mid = (jlo + jhi) // 2
+        hi = np.minimum(ohi, mid - 1)
+        length = hi - olo + 1
+        starts = np.r_[0, np.cumsum(length)[:-1]]
+        i = np.arange(length.sum()) - np.repeat(starts - olo, length)
+        j = np.repeat(mid, length)
+        total = prev[i] + cost(i, j)
+        pick = i[_segment_argmin(total, starts)]
+        best[mid] = total[starts + pick - olo]
+        split[mid] = pick
+        left = jlo < mid
+        right = mid < jhi
+        jlo, jhi, olo, ohi = (np.r_[jlo[left], mid[right] + 1], np.r_[mid[left] - 1, jhi[right]],
+                              np.r_[olo[left], pick[right]], np.r_[pick[left], ohi[right]])
+    return best, split
+
+
+def optimal_partition(values, weights, k):
+    """Optimal ``k``-class split of sorted distinct ``values`` with ``weights``.
+
+    Returns the start index of every class but the first and the total SSE.
+    """
+    n = len(values)
+    if not 1 <= k <= n:
+        raise ValueError(f"Need 1 <= k <= {n} distinct values, got k={k}")
+    # Centring keeps S2 - S1^2 / W from cancelling badly on large inputs.
+    shift = np.sum(values * weights) / np.sum(weights)
+    x = values - shift
+    w_sum = np.r_[0.0, np.cumsum(weights)]
+    s1 = np.r_[0.0, np.cumsum(weights * x)]
+    s2 = np.r_[0.0, np.cumsum(weights * x * x)]
+
+    def cost(i, j):
+        first = s1[j] - s1[i]
+        return np.maximum(s2[j] - s2[i] - first * first / (w_sum[j] - w_sum[i]), 0.0)
+
+    layer = np.r_[np.inf, cost(np.zeros(n, dtype=np.intp), np.arange(1, n + 1))]
+    splits = []
+    for m in range(2, k + 1):
+        layer, split = _layer(layer, cost, m, n)
+        splits.append(split)
+    starts = []
+    j = n
+    for split in reversed(splits):
+        j = int(split[j])
+        starts.append(j)
+    return np.array(starts[::-1], dtype=np.intp), float(layer[n])
+
+
+def _histogram(scores, bins):
+    """Edges and per-cell count, sum and sum of squares, counted in chunks."""
+    lo, hi = scores.min(), scores.max()
+    has_nan = np.isnan(lo)  # min/max propagate NaN, so this checks every score
+    if has_nan:
+        lo, hi = np.nanmin(scores), np.nanmax(scores)
+    lo, hi = float(lo), float(hi)
+    scale = bins / (hi - lo) if hi > lo else 0.0
+    counts, sums, squares = np.zeros(bins), np.zeros(bins), np.zeros(bins)
+    cells = np.empty(HISTOGRAM_CHUNK, dtype=np.intp)
+    work = np.empty(HISTOGRAM_CHUNK)
+    for start in range(0, len(scores), HISTOGRAM_CHUNK):
+        part = scores[start:start + HISTOGRAM_CHUNK]
+        if has_nan:
+            part = part[~np.isnan(part)]
+        c, t = cells[:len(part)], work[:len(part)]
+        np.subtract(part, lo, out=t)
+        t *= scale
+        c[...] = t
+        np.minimum(c, bins - 1, out=c)
+        counts += np.bincount(c, minlength=bins)
+        sums += np.bincount(c, weights=part, minlength=bins)
+        np.multiply(part, part, out=t)
+        squares += np.bincount(c, weights=t, minlength=bins)
+    return np.linspace(lo, hi, bins + 1), counts, sums, squares
+
+
+def risk_breaks(scores, k=len(RISK_CATEGORIES), bins='auto'):
+    """Optimal ``k``-class breakpoints of ``scores`` (NaNs are ignored).
+
+    Parameters
+    ----------
+    scores : 1d array
+    k : int, optional
+    bins : int, 'auto' or None, optional
+        Cells for the histogram mode; None clusters the exact distinct
+        values, ``'auto'`` does so up to `EXACT_LIMIT` scores and uses
+        `DEFAULT_BINS` cells beyond.
+
+    Returns
+    -------
+    Breaks
+        ``thresholds`` (``k - 1``, ascending), class ``centers`` (means),
+        class ``counts`` and the total within-class ``sse``.
+    """
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    if bins == 'auto':
+        bins = DEFAULT_BINS if len(scores) > EXACT_LIMIT else None
+    if bins is None:
+        values, counts = np.unique(scores[~np.isnan(scores)], return_counts=True)
+        counts = counts.astype(np.float64)
+        starts, _ = optimal_partition(values, counts, k)
+        thresholds = (values[starts - 1] + values[starts]) / 2
+        sums = values * counts
+        squares = values * sums
+    else:
+        edges, counts, sums, squares = _histogram(scores, int(bins))
+        used = np.flatnonzero(counts)
+        counts, sums, squares = counts[used], sums[used], squares[used]
+        starts, _ = optimal_partition(sums / counts, counts, k)
+        # Halfway between the last used cell below and the first one above.
+        thresholds = (edges[used[starts - 1] + 1] + edges[used[starts]]) / 2
+    bounds = np.r_[0, starts, len(counts)]
+    class_counts = np.add.reduceat(counts, bounds[:-1])
+    class_sums = np.add.reduceat(sums, bounds[:-1])
+    sse = float(np.sum(np.add.reduceat(squares, bounds[:-1]) - class_sums ** 2 / class_counts))
+    return Breaks(thresholds, class_sums / class_counts, class_counts.astype(np.int64),
+                  max(sse, 0.0))
+
+
+def categorize(scores, thresholds):
+    """Class index (int8) per score, ``-1`` for NaN."""
+    scores = np.asarray(scores, dtype=np.float64)
+    # One comparison pass per threshold beats a binary search per score.
+    codes = np.zeros(scores.shape, dtype=np.int8)
+    for threshold in thresholds:
+        codes += scores >= threshold
+    codes[np.isnan(scores)] = -1
+    return codes
+
+
+def category_labels(scores, thresholds, names=RISK_CATEGORIES):
+    """``pandas.Categorical`` of ``names`` per score (NaN for missing scores)."""
+    import pandas as pd
+
+    return pd.Categorical.from_codes(categorize(scores, thresholds), list(names))
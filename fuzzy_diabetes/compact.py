@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""Array-backed fitted model for holding many model variants in memory.
+
+A model dict (see `fuzzy_diabetes.model`) keeps a float64 universe grid per
+antecedent, small arrays per variable, the FPC sweep table and, once turned
+into skfuzzy objects, a float64 membership array per term.  `CompactModel`
+keeps only what scoring needs, packed into a few contiguous arrays:
+
+* ``centers``/``sigmas`` of every term of every variable back to back
+  (float32 by default), sliced per variable by ``term_offsets``,
+* ``grids``: ``(start, step, size)`` per universe, from which the grid is
+  rebuilt exactly (``start + arange(size) * step`` is how ``np.arange``
+  fills it),
+* ``medians`` in column order (NaN where a column is not imputed) and the
+  consequent triangles as one ``(n_terms, 3)`` array.
+
+Term names are interned so variants share them, and the object uses
+``__slots__`` and pickles as a flat tuple.  It converts both ways with
+model dicts (`from_model`/`to_model`; the FPC sweep is diagnostics only and
+is not kept) and with skfuzzy objects (`from_ctrl`, which recovers each
+Gaussian from its sampled ``gaussmf``, and `to_ctrl`), and builds a
+`BatchRiskScorer` directly (`scorer`).
+
+With float32 parameters the scores move by well under 0.01 risk points.
+"""
+
+import sys
+
+import numpy as np
+
+from .inference import BatchRiskScorer, InputVariable, RuleSpec, rules_from_ctrl
+from .schema import INPUT_COLUMNS
+
+DEFAULT_DTYPE = np.float32
+
+# Samples below this membership are ignored when fitting a Gaussian to them.
+GAUSS_FIT_FLOOR = 1e-3
+
+
+def _grid(universe):
+    universe = np.asarray(universe, dtype=np.float64)
+    step = universe[1] - universe[0] if len(universe) > 1 else 0.0
+    return (universe[0], step, len(universe))
+
+
+def _universe(grid):
+    start, step, size = grid
+    return start + np.arange(int(size)) * step
+
+
+def gauss_from_samples(universe, mf, atol=1e-6):
+    """Recover ``(center, sigma)`` from a ``gaussmf`` sampled on ``universe``.
+
+    Fits ``log(mf)``, a parabola for a Gaussian, by least squares over the
+    samples above `GAUSS_FIT_FLOOR`.  Raises ValueError unless the fit
+    reproduces ``mf`` to within ``atol``.
+    """
+    x = np.asarray(universe, dtype=np.float64)
+    y = np.asarray(mf, dtype=np.float64)
+    keep = y > GAUSS_FIT_FLOOR
+    if np.count_nonzero(keep) >= 3:
+        a, b, _ = np.polyfit(x[keep], np.log(y[keep]), 2, w=y[keep])
+        if a < 0:
+            center, sigma = -b / (2 * a), np.sqrt(-1 / (2 * a))
+            if np.allclose(np.exp(-((x - center) ** 2) / (2 * sigma ** 2)), y,
+                           rtol=0, atol=atol):
+                return float(center), float(sigma)
+    raise ValueError("Membership function is not a sampled gaussmf")
+
+
+class CompactModel(object):
+    """Scoring part of a fitted model in a few contiguous arrays.
+
+    Parameters
+    ----------
+    labels, columns : sequence of str
+        Antecedent labels and their CSV columns, in input order.
+    term_names : sequence of str
+        Every variable's term names back to back.
+    term_offsets : 1d int array
+        ``len(labels) + 1`` offsets; variable ``i`` owns terms
+        ``term_offsets[i]:term_offsets[i + 1]``.
+    centers, sigmas : 1d arrays
+        Gaussian parameters per term, stored as ``dtype``.
+    fpc : 1d array
+        FPC of each variable's fit.
+    grids : (n_variables, 3) array
+        ``(start, step, size)`` of each universe.
+    medians : 1d array
+        Imputation median per column, NaN where none applies.
+    output_label : str
+    output_grid : sequence
+        ``(start, step, size)`` of the consequent universe.
+    output_names : sequence of str
+    output_abc : (n_output_terms, 3) array
+        ``trimf`` ``(a, b, c)`` of each consequent term.
+    rules : sequence of RuleSpec
+    key, dataset_hash : str, optional
+    hyperparams, thresholds : dict, optional
+    dtype : numpy dtype, optional
+        Precision of ``centers``/``sigmas`` (float32 by default).
+    """
+
+    __slots__ = ('labels', 'columns', 'term_names', 'term_offsets', 'centers', 'sigmas',
+                 'fpc', 'grids', 'medians', 'output_label', 'output_grid', 'output_names',
+                 'output_abc', 'rules', 'key', 'dataset_hash', 'hyperparams', 'thresholds')
+
+    def __init__(self, labels, columns, term_names, term_offsets, centers, sigmas, fpc, grids,
+                 medians, output_label, output_grid, output_names, output_abc, rules,
+                 key=None, dataset_hash=None, hyperparams=None, thresholds=None,
+                 dtype=DEFAULT_DTYPE):
+        self.labels = tuple(sys.intern(str(label)) for label in labels)
+        self.columns = tuple(sys.intern(str(col)) for col in columns)
+        self.term_names = tuple(sys.intern(str(name)) for name in term_names)
+        self.term_offsets = np.asarray(term_offsets, dtype=np.int32)
+        self.centers = np.ascontiguousarray(centers, dtype=dtype)
+        self.sigmas = np.ascontiguousarray(sigmas, dtype=dtype)
+        self.fpc = np.asarray(fpc, dtype=np.float32)
+        self.grids = np.asarray(grids, dtype=np.float64).reshape(len(self.labels), 3)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.output_label = sys.intern(str(output_label))
+        self.output_grid = tuple(float(g) for g in output_grid)
+        self.output_names = tuple(sys.intern(str(name)) for name in output_names)
+        self.output_abc = np.asarray(output_abc, dtype=np.float64).reshape(-1, 3)
+        self.rules = tuple(rules)
+        self.key = key
+        self.dataset_hash = dataset_hash
+        self.hyperparams = hyperparams
+        self.thresholds = dict(thresholds or {})
+        if len(self.term_offsets) != len(self.labels) + 1:
+            raise ValueError("term_offsets needs one entry per variable plus one")
+        if not (len(self.centers) == len(self.sigmas) == len(self.term_names)
+                == self.term_offsets[-1]):
+            raise ValueError("centers, sigmas and term_names must cover term_offsets")
+
+    # --- Pickling: a flat tuple instead of per-slot names ---
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        key = self.key[:16] if self.key else None
+        return (f"CompactModel(key={key!r}, variables={len(self.labels)}, "
+                f"terms={len(self.term_names)}, rules={len(self.rules)}, "
+                f"dtype={self.centers.dtype})")
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays."""
+        return sum(getattr(self, name).nbytes for name in
+                   ('term_offsets', 'centers', 'sigmas', 'fpc', 'grids', 'medians',
+                    'output_abc'))
+
+    def astype(self, dtype):
+        """Copy with ``centers``/``sigmas`` stored as ``dtype``."""
+        return CompactModel(self.labels, self.columns, self.term_names, self.term_offsets,
+                            self.centers, self.sigmas, self.fpc, self.grids, self.medians,
+                            self.output_label, self.output_grid, self.output_names,
+                            self.output_abc, self.rules, self.key, self.dataset_hash,
+                            self.hyperparams, self.thresholds, dtype=dtype)
+
+    # --- Per-variable views ---
+    def terms(self, i):
+        """Term names of variable ``i``."""
+        return self.term_names[self.term_offsets[i]:self.term_offsets[i + 1]]
+
+    def universe(self, i):
+        return _universe(self.grids[i])
+
+    def output_universe(self):
+        return _universe(self.output_grid)
+
+    def variables(self):
+        """`InputVariable` tuples (float64 parameters) for `BatchRiskScorer`."""
+        out = []
+        for i, label in enumerate(self.labels):
+            start, step, size = self.grids[i]
+            part = slice(self.term_offsets[i], self.term_offsets[i + 1])
+            out.append(InputVariable(label, start, start + (size - 1) * step, self.terms(i),
+                                     self.centers[part].astype(np.float64),
+                                     self.sigmas[part].astype(np.float64),
+                                     step if size > 1 else None))
+        return out
+
+    def mf_params(self):
+        """``fcm_mf_params``-style view: label -> {'centers', 'sigmas', 'fpc'}."""
+        return {v.label: {'centers': v.centers, 'sigmas': list(v.sigmas),
+                          'fpc': float(self.fpc[i])}
+                for i, v in enumerate(self.variables())}
+
+    def scorer(self, **kwargs):
+        """`BatchRiskScorer` for this model (keyword arguments are passed on)."""
+        from .rules import trimf
+
+        universe = self.output_universe()
+        params = {name: tuple(abc) for name, abc in zip(self.output_names,
+                                                        self.output_abc.tolist())}
+        kwargs.setdefault('output_params', params)
+        return BatchRiskScorer(self.variables(), self.rules, universe,
+                               {name: trimf(universe, abc) for name, abc in params.items()},
+                               **kwargs)
+
+    # --- Model dicts ---
+    @classmethod
+    def from_model(cls, model, dtype=DEFAULT_DTYPE):
+        """Pack a fitted model dict (see `fuzzy_diabetes.model`)."""
+        variables = model['variables']
+        labels = list(variables)
+        columns = [variables[label]['column'] for label in labels]
+        names = [name for label in labels for name in variables[label]['terms']]
+        counts = [len(variables[label]['terms']) for label in labels]
+        output = model['output']
+        return cls(
+            labels, columns, names, np.r_[0, np.cumsum(counts)],
+            np.concatenate([variables[label]['centers'] for label in labels]),
+            np.concatenate([variables[label]['sigmas'] for label in labels]),
+            [variables[label]['fpc'] for label in labels],
+            [_grid(variables[label]['universe']) for label in labels],
+            [model['medians'].get(col, np.nan) for col in columns],
+            output['label'], _grid(output['universe']), list(output['terms']),
+            list(output['terms'].values()), model['rules'], model.get('key'),
+            model.get('dataset_hash'), model.get('hyperparams'), model.get('thresholds'),
+            dtype=dtype)
+
+    def to_model(self):
+        """Model dict with float64 arrays and an empty ``fpc_sweep``."""
+        from .model import FORMAT_VERSION
+
+        variables = {}
+        for i, v in enumerate(self.variables()):
+            variables[v.label] = {
+                'column': self.columns[i],
+                'universe': self.universe(i),
+                'terms': list(v.terms),
+                'centers': v.centers,
+                'sigmas': v.sigmas,
+                'fpc': float(self.fpc[i]),
+            }
+        return {
+            'format_version': FORMAT_VERSION,
+            'key': self.key,
+            'dataset_hash': self.dataset_hash,
+            'hyperparams': self.hyperparams,
+            'medians': {col: float(m) for col, m in zip(self.columns, self.medians)
+                        if not np.isnan(m)},
+            'variables': variables,
+            'fpc_sweep': {},
+            'output': {'label': self.output_label, 'universe': self.output_universe(),
+                       'terms': {name: abc for name, abc in zip(self.output_names,
+                                                                self.output_abc.tolist())}},
+            'rules': list(self.rules),
+            'thresholds': dict(self.thresholds),
+        }
+
+    # --- skfuzzy objects ---
+    @classmethod
+    def from_ctrl(cls, rules, medians=None, fpc=None, dtype=DEFAULT_DTYPE):
+        """Pack the skfuzzy objects behind ``all_rules``.
+
+        Antecedent terms must be sampled ``gaussmf`` curves and consequent
+        terms ``trimf`` triangles (see `gauss_from_samples` and
+        `defuzz.triangle_from_samples`); ``medians`` maps columns to
+        imputation medians and ``fpc`` labels to FPC values.
+        """
+        from .defuzz import triangle_from_samples
+
+        antecedents = {}
+        consequent = None
+        for rule in rules:
+            for term in rule.antecedent_terms:
+                antecedents.setdefault(term.parent.label, term.parent)
+            for weighted in rule.consequent:
+                consequent = weighted.term.parent
+        order = {label: i for i, label in enumerate(INPUT_COLUMNS)}
+        labels = sorted(antecedents, key=lambda label: order.get(label, len(order)))
+
+        names, counts, centers, sigmas = [], [], [], []
+        for label in labels:
+            antecedent = antecedents[label]
+            counts.append(len(antecedent.terms))
+            for name, term in antecedent.terms.items():
+                try:
+                    center, sigma = gauss_from_samples(antecedent.universe, term.mf)
+                except ValueError:
+                    raise ValueError(f"Term '{label}/{name}' is not a gaussmf") from None
+                names.append(name)
+                centers.append(center)
+                sigmas.append(sigma)
+        columns = [INPUT_COLUMNS.get(label, label) for label in labels]
+
+        abc = []
+        for name, term in consequent.terms.items():
+            triangle = triangle_from_samples(consequent.universe, term.mf)
+            if triangle is None:
+                raise ValueError(f"Output term '{name}' is not a trimf")
+            abc.append(triangle)
+
+        medians = medians or {}
+        fpc = fpc or {}
+        return cls(labels, columns, names, np.r_[0, np.cumsum(counts)], centers, sigmas,
+                   [fpc.get(label, np.nan) for label in labels],
+                   [_grid(antecedents[label].universe) for label in labels],
+                   [medians.get(col, np.nan) for col in columns],
+                   consequent.label, _grid(consequent.universe), list(consequent.terms), abc,
+                   rules_from_ctrl(rules), dtype=dtype)
+
+    def to_ctrl(self):
+        """``(variables, rules)``: label -> skfuzzy Antecedent/Consequent, and ``ctrl.Rule``s."""
+        from skfuzzy import control as ctrl
+        from skfuzzy import gaussmf
+
+        from .rules import build_ctrl_rules, trimf
+
+        variables = {}
+        for i, v in enumerate(self.variables()):
+            antecedent = ctrl.Antecedent(self.universe(i), v.label)
+            for name, center, sigma in zip(v.terms, v.centers, v.sigmas):
+                antecedent[name] = gaussmf(antecedent.universe, center, sigma)
+            variables[v.label] = antecedent
+        consequent = ctrl.Consequent(self.output_universe(), self.output_label)
+        for name, abc in zip(self.output_names, self.output_abc.tolist()):
+            consequent[name] = trimf(consequent.universe, abc)
+        variables[self.output_label] = consequent
+        return variables, build_ctrl_rules(self.rules, variables)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Compile a rule base into a flat plan with shared sub-expressions.
+
+Rule antecedents are normalised (AND/OR chains flattened into n-ary
+``min``/``max`` nodes with sorted, de-duplicated children), common pairs of
+operands are factored out of larger nodes, and identical nodes are merged.
+The result is a topologically ordered `RulePlan` in which every distinct
+term and sub-expression is evaluated exactly once per batch, followed by the
+per-consequent ``max`` accumulation of weighted rule strengths.
+
+For the 18 dashboard rules, ``age['middle_aged_age'] | age['senior_age']``
+and ``glucose['normal_gl'] & bmi['normal_bmi']`` become shared nodes and
+each term (e.g. ``glucose['high_gl']``) is fetched once instead of once per
+rule; `RulePlan.stats` reports the counts before and after.
+"""
+
+from collections import Counter, namedtuple
+from itertools import combinations
+
+import numpy as np
+
+# op is 'term' (args = (variable, term)), 'not' (args = (child,)) or
+# 'min'/'max' (args = child node ids).
+PlanNode = namedtuple('PlanNode', 'op args')
+
+_OPS = {'and': 'min', 'or': 'max'}
+
+
+def _normalize(expr):
+    kind = expr[0]
+    if kind == 'term':
+        return expr
+    if kind == 'not':
+        return ('not', _normalize(expr[1]))
+    op = _OPS[kind]
+    children = set()
+    for child in expr[1:]:
+        child = _normalize(child)
+        if child[0] == op:
+            children.update(child[1])
+        else:
+            children.add(child)
+    children = tuple(sorted(children, key=repr))
+    return children[0] if len(children) == 1 else (op, children)
+
+
+def _nary_nodes(expr, found):
+    if expr[0] in ('min', 'max'):
+        found.add(expr)
+        for child in expr[1]:
+            _nary_nodes(child, found)
+    elif expr[0] == 'not':
+        _nary_nodes(expr[1], found)
+    return found
+
+
+def _replace_pair(expr, op, pair):
+    kind = expr[0]
+    if kind == 'term':
+        return expr
+    if kind == 'not':
+        return ('not', _replace_pair(expr[1], op, pair))
+    children = [_replace_pair(child, op, pair) for child in expr[1]]
+    if kind == op and len(children) > 2 and pair[0] in children and pair[1] in children:
+        children = [c for c in children if c not in pair] + [(op, pair)]
+    return (kind, tuple(sorted(children, key=repr)))
+
+
+def _factor(exprs):
+    """Greedily pull operand pairs shared by several n-ary nodes into their own node."""
+    while True:
+        nodes = set()
+        for expr in exprs:
+            _nary_nodes(expr, nodes)
+        counts = Counter()
+        wide = set()
+        for op, children in nodes:
+            for pair in combinations(children, 2):
+                counts[(op, pair)] += 1
+                if len(children) > 2:
+                    wide.add((op, pair))
+        shared = [key for key in wide if counts[key] > 1]
+        if not shared:
+            return exprs
+        op, pair = max(shared, key=lambda key: (counts[key], repr(key)))
+        exprs = [_replace_pair(expr, op, pair) for expr in exprs]
+
+
+def _count_naive(expr):
+    """(term fetches, binary operations) of evaluating ``expr`` as written."""
+    if expr[0] == 'term':
+        return 1, 0
+    if expr[0] == 'not':
+        terms, ops = _count_naive(expr[1])
+        return terms, ops + 1
+    left, right = _count_naive(expr[1]), _count_naive(expr[2])
+    return left[0] + right[0], left[1] + right[1] + 1
+
+
+class RulePlan(object):
+    """Flat evaluation plan for a rule base (see `compile_rules`).
+
+    Attributes
+    ----------
+    nodes : list of PlanNode
+        In evaluation order; children always precede their parents.
+    rule_nodes : list of int
+        Node holding each rule's firing strength.
+    rule_labels : list of str
+    outputs : list of (str, int array)
+        Consequent term name and the rules accumulated into it.
+    weights : 1d array
+        Rule weights applied before accumulation.
+    """
+
+    def __init__(self, nodes, rule_nodes, rule_labels, outputs, weights, naive):
+        self.nodes = nodes
+        self.rule_nodes = rule_nodes
+        self.rule_labels = rule_labels
+        self.outputs = outputs
+        self.weights = weights
+        self._naive = naive
+
+    def stats(self):
+        terms = sum(1 for node in self.nodes if node.op == 'term')
+        ops = sum(1 if node.op == 'not' else len(node.args) - 1
+                  for node in self.nodes if node.op != 'term')
+        return {
+            'rules': len(self.rule_nodes),
+            'term_fetches': terms,
+            'operations': ops,
+            'naive_term_fetches': self._naive[0],
+            'naive_operations': self._naive[1],
+        }
+
+    def describe(self):
+        """Human-readable listing of the plan."""
+        lines = []
+        for i, node in enumerate(self.nodes):
+            if node.op == 'term':
+                body = f"{node.args[0]}[{node.args[1]!r}]"
+            else:
+                body = f"{node.op}({', '.join(f'%{a}' for a in node.args)})"
+            lines.append(f"%{i} = {body}")
+        for label, nid in zip(self.rule_labels, self.rule_nodes):
+            lines.append(f"rule {label!r} <- %{nid}")
+        for name, rules in self.outputs:
+            lines.append(f"{name} = max({', '.join(f'rule {r}' for r in rules)})")
+        return '\n'.join(lines)
+
+    def fire(self, memberships, term_index):
+        """Rule firing strengths, rule-major with shape (n_rules, n).
+
+        ``memberships`` is the per-variable list from ``fuzzify`` and
+        ``term_index`` maps ``(variable, term)`` to ``(var_idx, term_idx)``.
+        Rows are contiguous so each node and rule is one streaming pass.
+        """
+        values = [None] * len(self.nodes)
+        for i, node in enumerate(self.nodes):
+            if node.op == 'term':
+                vi, ti = term_index[node.args]
+                values[i] = memberships[vi][:, ti]
+            elif node.op == 'not':
+                values[i] = 1.0 - values[node.args[0]]
+            else:
+                func = np.fmin if node.op == 'min' else np.fmax
+                acc = func(values[node.args[0]], values[node.args[1]])
+                for child in node.args[2:]:
+                    func(acc, values[child], out=acc)
+                values[i] = acc
+        n = len(memberships[0])
+        strengths = np.empty((len(self.rule_nodes), n), dtype=np.float64)
+        for r, nid in enumerate(self.rule_nodes):
+            strengths[r] = values[nid]
+        return strengths
+
+    def activate(self, strengths):
+        """Accumulated activation per consequent term, (n_out, n) from (n_rules, n)."""
+        cuts = np.zeros((len(self.outputs), strengths.shape[1]), dtype=np.float64)
+        for oi, (_, rules) in enumerate(self.outputs):
+            for r in rules:
+                if self.weights[r] == 1:
+                    np.fmax(cuts[oi], strengths[r], out=cuts[oi])
+                else:
+                    np.fmax(cuts[oi], strengths[r] * self.weights[r], out=cuts[oi])
+        return cuts
+
+
+def compile_rules(rules, output_names=None):
+    """Compile ``ctrl.Rule`` objects or `RuleSpec` tuples into a `RulePlan`.
+
+    ``output_names`` fixes the order of consequent terms in ``outputs``;
+    by default they appear in first-use order.
+    """
+    rules = list(rules)
+    if rules and not isinstance(rules[0], tuple):
+        from .inference import rules_from_ctrl
+
+        rules = rules_from_ctrl(rules)
+    if output_names is None:
+        output_names = list(dict.fromkeys(rule.consequent for rule in rules))
+
+    naive = [0, 0]
+    for rule in rules:
+        terms, ops = _count_naive(rule.antecedent)
+        naive[0] += terms
+        naive[1] += ops
+
+    exprs = _factor([_normalize(rule.antecedent) for rule in rules])
+
+    nodes = []
+    ids = {}
+
+    def emit(expr):
+        if expr in ids:
+            return ids[expr]
+        if expr[0] == 'term':
+            node = PlanNode('term', (expr[1], expr[2]))
+        elif expr[0] == 'not':
+            node = PlanNode('not', (emit(expr[1]),))
+        else:
+            node = PlanNode(expr[0], tuple(emit(child) for child in expr[1]))
+        ids[expr] = len(nodes)
+        nodes.append(node)
+        return ids[expr]
+
+    rule_nodes = [emit(expr) for expr in exprs]
+    outputs = [(name, np.array([i for i, rule in enumerate(rules) if rule.consequent == name],
+                               dtype=np.intp))
+               for name in output_names]
+    weights = np.array([rule.weight for rule in rules], dtype=np.float64)
+    return RulePlan(nodes, rule_nodes, [rule.label for rule in rules], outputs, weights,
+                    tuple(naive))
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Offline-capable dataset loading through a local columnar snapshot.
+
+`load_dataset` accepts a local path or a URL.  The first load reads the CSV,
+validates it against `schema.COLUMN_DTYPES` and writes a snapshot under the
+cache: an immutable directory of one ``.npy`` per column, named by the
+source and its SHA-256 content hash, and a small JSON pointer file with the
+source, the hash, the column types and the directory name.  Every later
+load memory-maps those ``.npy`` files (zero-copy, read-only) without
+touching the network:
+
+* URL sources are only fetched again with ``refresh=True``,
+* local sources are re-read when their size or mtime changes; if the file
+  has since disappeared the snapshot is still served.
+
+A new snapshot is complete on disk before the pointer is swapped to it with
+one ``os.replace``, so a concurrent loader sees either the old snapshot or
+the new one, and a crash at any point leaves the last complete snapshot in
+place.  Superseded directories are deleted after the swap.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from . import profiling
+from .paths import DEFAULT_CACHE_DIR
+from .schema import COLUMN_DTYPES, TARGET_COLUMN
+
+SNAPSHOT_VERSION = 2
+
+DEFAULT_DATA_URL = ('https://raw.githubusercontent.com/Duzttt/FL-Diabetes-prediction/'
+                    'refs/heads/main/diabetes.csv')
+DATA_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'data')
+
+
+class DatasetError(ValueError):
+    """The source does not match the expected Pima schema."""
+
+
+def _is_url(source):
+    return '://' in str(source)
+
+
+def _normalize(source):
+    return str(source) if _is_url(source) else os.path.abspath(os.fspath(source))
+
+
+def _snapshot_key(source):
+    return hashlib.sha256(_normalize(source).encode('utf-8')).hexdigest()[:16]
+
+
+def snapshot_pointer(source, cache_dir=DATA_CACHE_DIR):
+    """Path of the file naming the current snapshot of ``source``."""
+    return os.path.join(cache_dir, f'{_snapshot_key(source)}.json')
+
+
+def snapshot_dir(source, cache_dir=DATA_CACHE_DIR):
+    """Directory holding the current snapshot of ``source``, or None."""
+    meta = read_snapshot_meta(source, cache_dir)
+    return None if meta is None else os.path.join(cache_dir, meta['directory'])
+
+
+def _read_source(source, timeout=30):
+    if _is_url(source):
+        from urllib.request import urlopen
+
+        with urlopen(source, timeout=timeout) as response:
+            return response.read()
+    with open(source, 'rb') as fh:
+        return fh.read()
+
+
+def validate(frame):
+    """Typed, checked columns of a parsed Pima CSV; raises `DatasetError`."""
+    missing = [col for col in COLUMN_DTYPES if col not in frame]
+    if missing:
+        raise DatasetError(f"Missing columns: {', '.join(missing)}")
+    columns = {}
+    problems = []
+    for col, dtype in COLUMN_DTYPES.items():
+        try:
+            values = np.asarray(frame[col], dtype=np.float64)
+        except (TypeError, ValueError):
+            problems.append(f"{col}: non-numeric values")
+            continue
+        if np.isnan(values).any():
+            problems.append(f"{col}: {int(np.isnan(values).sum())} empty values")
+            continue
+        if (values < 0).any():
+            problems.append(f"{col}: negative values")
+            continue
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'i':
+            if (values != np.round(values)).any():
+                problems.append(f"{col}: non-integer values")
+                continue
+            if values.max(initial=0) > np.iinfo(dtype).max:
+                problems.append(f"{col}: values above {np.iinfo(dtype).max}")
+                continue
+        columns[col] = values.astype(dtype)
+    if TARGET_COLUMN in columns and not np.isin(columns[TARGET_COLUMN], (0, 1)).all():
+        problems.append(f"{TARGET_COLUMN}: values other than 0/1")
+    if problems:
+        raise DatasetError("Invalid dataset: " + '; '.join(problems))
+    return columns
+
+
+def write_snapshot(source, cache_dir=DATA_CACHE_DIR):
+    """Fetch, validate and snapshot ``source``; returns the snapshot metadata."""
+    import io
+
+    import pandas as pd
+
+    raw = _read_source(source)
+    columns = validate(pd.read_csv(io.BytesIO(raw)))
+    meta = {
+        'format_version': SNAPSHOT_VERSION,
+        'source': _normalize(source),
+        'content_sha256': hashlib.sha256(raw).hexdigest(),
+        'n_rows': len(columns[TARGET_COLUMN]),
+        'columns': {col: values.dtype.str for col, values in columns.items()},
+    }
+    if not _is_url(source):
+        stat = os.stat(source)
+        meta['source_stat'] = [stat.st_size, stat.st_mtime_ns]
+
+    key = _snapshot_key(source)
+    name = f"{key}-{meta['content_sha256'][:16]}"
+    directory = os.path.join(cache_dir, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    if not os.path.isdir(directory):
+        # Same name, same content: an existing directory is reused as is.
+        tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.snapshot-')
+        try:
+            for i, values in enumerate(columns.values()):
+                np.save(os.path.join(tmp, f'{i}.npy'), values, allow_pickle=False)
+            try:
+                os.rename(tmp, directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+                shutil.rmtree(tmp, ignore_errors=True)  # a concurrent writer won
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    meta['directory'] = name
+    meta['files'] = {col: f'{i}.npy' for i, col in enumerate(columns)}
+
+    # The only step readers can observe: swap the pointer to the new directory.
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix='.pointer-')
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(meta, fh, indent=1)
+        os.replace(tmp, snapshot_pointer(source, cache_dir))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    for entry in os.listdir(cache_dir):
+        # Superseded snapshots, and the pre-pointer layout (a directory named by key).
+        if entry != name and (entry == key or entry.startswith(f'{key}-')):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    return meta
+
+
+def read_snapshot_meta(source, cache_dir=DATA_CACHE_DIR):
+    """Metadata of the current snapshot of ``source``, or None."""
+    try:
+        with open(snapshot_pointer(source, cache_dir)) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format_version') == SNAPSHOT_VERSION else None
+
+
+def _stale(source, meta):
+    if _is_url(source):
+        return False
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return False
+    return meta.get('source_stat') != [stat.st_size, stat.st_mtime_ns]
+
+
+def load_columns(source=DEFAULT_DATA_URL, cache_dir=DATA_CACHE_DIR, refresh=False):
+    """Column name -> read-only memory-mapped array, plus the snapshot metadata."""
+    meta = None if refresh else read_snapshot_meta(source, cache_dir)
+    if meta is None or _stale(source, meta):
+        with profiling.span('data_download'):
+            meta = write_snapshot(source, cache_dir)
+    try:
+        return _map_columns(meta, cache_dir), meta
+    except FileNotFoundError:
+        # A concurrent load swapped in a newer snapshot and deleted this one.
+        meta = read_snapshot_meta(source, cache_dir)
+        if meta is None:
+            raise
+        return _map_columns(meta, cache_dir), meta
+
+
+def _map_columns(meta, cache_dir):
+    directory = os.path.join(cache_dir, meta['directory'])
+    return {col: np.load(os.path.join(directory, name), mmap_mode='r', allow_pickle=False)
+            for col, name in meta['files'].items()}
+
+
+def load_dataset(source=DEFAULT_DATA_URL, cache_dir=DATA_CACHE_DIR, refresh=False):
+    """The dataset as a DataFrame backed (without copying) by the snapshot."""
+    import pandas as pd
+
+    columns, _ = load_columns(source, cache_dir, refresh)
+    return pd.DataFrame(columns, copy=False)
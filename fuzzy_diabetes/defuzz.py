@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Closed-form centroid defuzzification for triangular consequents.
+
+The ``diabetes_risk`` terms are ``trimf`` triangles and each is clipped at
+its accumulated rule activation, so the aggregated output is
+``max_k min(cut_k, tri_k(x))``.  When the triangles form a chain in which
+only neighbours overlap (falling edge of one against the rising edge of the
+next), inclusion-exclusion reduces the area and first moment of that union
+to closed forms:
+
+    integral(max_k g_k) = sum_k integral(g_k) - sum_k integral(min(g_k, g_k+1))
+
+``g_k`` is a clipped triangle and ``min(g_k, g_k+1)`` is the overlap
+triangle clipped at ``min(cut_k, cut_k+1)``; a triangle of apex height ``H``
+clipped at ``h`` is the full triangle minus a similar top triangle scaled by
+``1 - h/H``.  `TriangularCentroid` therefore costs a few dozen arithmetic
+operations per row, independent of the output universe step, and gives the
+exact continuous centroid (skfuzzy's sampled centroid converges to it as the
+step shrinks).
+
+`CentroidTable` tabulates area and moment from `TriangularCentroid` on a
+grid of cut values and answers by multilinear interpolation.  The grid is
+uniform in ``sqrt(cut)``: rows where every rule fires weakly have a tiny
+total area, so their centroid is the most sensitive to interpolation error
+and gets the finest cells.
+"""
+
+import numpy as np
+
+# Grid points per cut axis of a `CentroidTable`.
+DEFAULT_RESOLUTION = 64
+
+
+def triangle_from_samples(universe, mf, atol=1e-9):
+    """Recover ``(a, b, c)`` from a ``trimf`` sampled on ``universe``.
+
+    Returns None unless ``trimf(universe, (a, b, c))`` reproduces ``mf``.
+    """
+    from .rules import trimf
+
+    x = np.asarray(universe, dtype=np.float64)
+    y = np.asarray(mf, dtype=np.float64)
+    peak = int(np.argmax(y))
+    if y[peak] != 1:
+        return None
+    zeros = np.flatnonzero(y[:peak] == 0)
+    a = x[zeros[-1]] if len(zeros) else x[peak]
+    zeros = np.flatnonzero(y[peak:] == 0)
+    c = x[peak + zeros[0]] if len(zeros) else x[peak]
+    abc = (float(a), float(x[peak]), float(c))
+    return abc if np.allclose(trimf(x, abc), y, rtol=0, atol=atol) else None
+
+
+def _clipped_triangle(a, b, c, height, h):
+    """Area and first moment under ``min(h, triangle)`` for arrays ``h``."""
+    full = 0.5 * height * (c - a)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rest = 1.0 - np.clip(h / height, 0.0, 1.0)
+    rest2 = rest * rest
+    area = full * (1.0 - rest2)
+    # Top triangle above h: vertices a + t(b-a), b, c - t(c-b) with t = 1 - rest.
+    top = (a + b + c + (1.0 - rest) * (2 * b - a - c)) / 3.0
+    moment = full * ((a + b + c) / 3.0 - rest2 * top)
+    return area, moment
+
+
+class TriangularCentroid(object):
+    """Exact centroid of max-aggregated clipped triangles.
+
+    Parameters
+    ----------
+    terms : list of (a, b, c)
+        Triangles in the order of the ``cuts`` columns.
+    bounds : (float, float), optional
+        Output universe; every triangle must lie inside it, as terms that
+        spill over would be truncated by the sampled defuzzifier.
+    """
+
+    def __init__(self, terms, bounds=None):
+        self.terms = [tuple(float(p) for p in abc) for abc in terms]
+        for a, b, c in self.terms:
+            if not a <= b <= c or a == c:
+                raise ValueError(f"Not a triangle: {(a, b, c)}")
+            if bounds is not None and (a < bounds[0] or c > bounds[1]):
+                raise ValueError(f"Triangle {(a, b, c)} extends beyond the universe {bounds}")
+        self.order = sorted(range(len(self.terms)), key=lambda i: self.terms[i][1])
+        self.overlaps = []
+        for pos, (j, k) in enumerate(zip(self.order, self.order[1:])):
+            (_, bj, cj), (ak, bk, _) = self.terms[j], self.terms[k]
+            if pos + 2 < len(self.order) and cj > self.terms[self.order[pos + 2]][0]:
+                raise ValueError("Only neighbouring triangles may overlap.")
+            if ak >= cj:
+                continue
+            if bj > ak or cj > bk:
+                raise ValueError("Overlapping triangles must meet falling edge to rising edge.")
+            # Falling edge of j meets the rising edge of k at the overlap apex.
+            fall, rise = cj - bj, bk - ak
+            apex = (cj * rise + ak * fall) / (rise + fall)
+            self.overlaps.append((j, k, (ak, apex, cj, (apex - ak) / rise)))
+
+    def moments(self, cuts):
+        """Area and first moment of the aggregated output per row of ``cuts``."""
+        area = np.zeros(cuts.shape[0])
+        moment = np.zeros(cuts.shape[0])
+        for k, (a, b, c) in enumerate(self.terms):
+            ak, mk = _clipped_triangle(a, b, c, 1.0, cuts[:, k])
+            area += ak
+            moment += mk
+        for j, k, (a, b, c, height) in self.overlaps:
+            ak, mk = _clipped_triangle(a, b, c, height, np.fmin(cuts[:, j], cuts[:, k]))
+            area -= ak
+            moment -= mk
+        return area, moment
+
+    def centroid(self, cuts):
+        """Crisp output per row; NaN where no term is activated."""
+        area, moment = self.moments(cuts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(area > 0, moment / area, np.nan)
+
+
+class CentroidTable(object):
+    """`TriangularCentroid` precomputed on a grid of cut values.
+
+    Area and moment are stored (not their ratio, which is undefined at zero
+    activation) for ``resolution`` cuts per axis in [0, 1], spaced uniformly
+    in ``sqrt(cut)``, so the table has ``resolution ** n_terms`` rows; a
+    lookup is ``2 ** n_terms`` gathers.
+    """
+
+    def __init__(self, analytic, resolution=DEFAULT_RESOLUTION, dtype=np.float32):
+        self.resolution = int(resolution)
+        if self.resolution < 2:
+            raise ValueError("resolution must be at least 2")
+        self.dtype = np.dtype(dtype)
+        self.n_terms = len(analytic.terms)
+        axis = np.linspace(0.0, 1.0, self.resolution) ** 2
+        grid = np.stack(np.meshgrid(*[axis] * self.n_terms, indexing='ij'), axis=-1)
+        area, moment = analytic.moments(grid.reshape(-1, self.n_terms))
+        self.table = np.ascontiguousarray(np.stack([area, moment], axis=1), dtype=self.dtype)
+        self.strides = self.resolution ** np.arange(self.n_terms - 1, -1, -1)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def moments(self, cuts):
+        n_cells = self.resolution - 1
+        pos = np.sqrt(np.clip(np.asarray(cuts, dtype=np.float64), 0.0, 1.0)) * n_cells
+        with np.errstate(invalid='ignore'):
+            cell = np.minimum(pos.astype(np.intp), n_cells - 1)
+        frac = pos - cell
+        base = cell @ self.strides
+        out = np.zeros((len(base), 2))
+        for corner in range(1 << self.n_terms):
+            weight = np.ones(len(base))
+            offset = 0
+            for k in range(self.n_terms):
+                if corner >> k & 1:
+                    weight *= frac[:, k]
+                    offset += self.strides[k]
+                else:
+                    weight *= 1.0 - frac[:, k]
+            # mode='clip' keeps NaN cuts (undefined cell index) from raising.
+            out += weight[:, None] * np.take(self.table, base + offset, axis=0, mode='clip')
+        return out[:, 0], out[:, 1]
+
+    def centroid(self, cuts):
+        area, moment = self.moments(cuts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(area > 0, moment / area, np.nan)
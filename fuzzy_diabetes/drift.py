@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""Input drift monitoring against the data the FCM model was fitted on.
+
+Each input column is summarised by a fixed-size `FeatureSketch`:
+
+* a histogram of ``DEFAULT_BINS`` equal cells over the model's universe,
+  plus counts below and above it,
+* the number of missing values (NaN, or zero for `ZERO_AS_MISSING`
+  columns),
+* the membership mass of every fitted term (sum of Gaussian memberships of
+  the present values, clipped to the universe as in inference).
+
+`DriftMonitor` keeps a reference sketch built from the training rows and a
+live sketch of the current window.  A window closes after ``window_rows``
+rows or ``window_seconds`` seconds; it is then compared with the reference
+(PSI on reference-decile groups of cells, KS on the cell edges, shift of
+the term-mass shares, off-universe and missing rates), the report is
+appended to a bounded history and the window starts again.  Memory is
+O(columns x bins) whatever the length of the stream.
+
+The CLI streams a live CSV against a fitted model and its training CSV::
+
+    python -m fuzzy_diabetes.drift train.csv model.npz live.csv --window-rows 10000
+"""
+
+import copy
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from .preprocess import ZERO_AS_MISSING
+from .schema import INPUT_COLUMNS
+
+DEFAULT_BINS = 200
+PSI_GROUPS = 10
+# Rows per membership block; bounds the (terms x rows) work array.
+DEFAULT_CHUNK_SIZE = 65536
+
+DEFAULT_WINDOW_ROWS = 10_000
+DEFAULT_HISTORY = 100
+
+# --- Alert thresholds ---
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+KS_ALPHA_COEFF = 1.628    # two-sample KS critical value coefficient at alpha = 0.01
+OFF_UNIVERSE_LIMIT = 0.01  # share of present values outside the universe
+TERM_SHIFT_LIMIT = 0.05    # largest change in a term's share of the membership mass
+MISSING_SHIFT_LIMIT = 0.05
+
+# Smoothing for empty PSI groups.
+_EPS = 1e-4
+
+
+class FeatureSketch(object):
+    """Bounded-memory summary of one input column (see module docstring).
+
+    Parameters
+    ----------
+    variable : dict
+        Fitted variable of a model (``universe``, ``centers``, ``sigmas``).
+    zero_as_missing : bool, optional
+        Count zeros as missing values.
+    bins : int, optional
+        Histogram cells over the universe.
+    """
+
+    def __init__(self, variable, zero_as_missing=False, bins=DEFAULT_BINS):
+        universe = np.asarray(variable['universe'], dtype=np.float64)
+        self.lo, self.hi = float(universe.min()), float(universe.max())
+        self.centers = np.asarray(variable['centers'], dtype=np.float64)
+        self.sigmas = np.asarray(variable['sigmas'], dtype=np.float64)
+        self.zero_as_missing = zero_as_missing
+        self.bins = int(bins)
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+        self.missing = 0
+        self.term_mass = np.zeros(len(self.centers))
+
+    @property
+    def n(self):
+        """Rows seen, missing included."""
+        return int(self.counts.sum()) + self.below + self.above + self.missing
+
+    @property
+    def present(self):
+        return self.n - self.missing
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        missing = np.isnan(values)
+        if self.zero_as_missing:
+            missing |= values == 0
+        self.missing += int(missing.sum())
+        values = values[~missing]
+        below = values < self.lo
+        above = values > self.hi
+        self.below += int(below.sum())
+        self.above += int(above.sum())
+        inside = values[~(below | above)]
+        cells = ((inside - self.lo) * (self.bins / (self.hi - self.lo))).astype(np.intp)
+        self.counts += np.bincount(np.minimum(cells, self.bins - 1), minlength=self.bins)
+        for start in range(0, len(values), DEFAULT_CHUNK_SIZE):
+            x = np.clip(values[start:start + DEFAULT_CHUNK_SIZE], self.lo, self.hi)
+            z = (x - self.centers[:, None]) / self.sigmas[:, None]
+            self.term_mass += np.exp(-0.5 * z * z).sum(axis=1)
+
+    def copy(self):
+        clone = copy.copy(self)
+        clone.counts = self.counts.copy()
+        clone.term_mass = self.term_mass.copy()
+        return clone
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        self.missing += other.missing
+        self.term_mass += other.term_mass
+
+    def distribution(self):
+        """Counts of [below, cell_0 .. cell_bins-1, above] (present values only)."""
+        return np.r_[self.below, self.counts, self.above]
+
+    def term_shares(self):
+        total = self.term_mass.sum()
+        return self.term_mass / total if total > 0 else np.zeros_like(self.term_mass)
+
+
+def psi(reference, live, groups=PSI_GROUPS):
+    """Population stability index of two count vectors over the same cells.
+
+    Cells are merged into about ``groups`` groups of equal reference mass
+    (reference deciles by default), then
+    ``sum((live% - ref%) * ln(live% / ref%))``.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    live = np.asarray(live, dtype=np.float64)
+    if reference.sum() == 0 or live.sum() == 0:
+        return np.nan
+    cum = np.cumsum(reference) / reference.sum()
+    # Group index of each cell; cells beyond a decile edge open a new group.
+    group = np.minimum((cum * groups - 1e-9).astype(np.intp), groups - 1)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ref = np.add.reduceat(reference, starts) / reference.sum()
+    cur = np.add.reduceat(live, starts) / live.sum()
+    ref = np.maximum(ref, _EPS)
+    cur = np.maximum(cur, _EPS)
+    return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+
+def ks(reference, live):
+    """Two-sample KS statistic on the cell edges (a lower bound of the exact one)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    live = np.asarray(live, dtype=np.float64)
+    if reference.sum() == 0 or live.sum() == 0:
+        return np.nan
+    return float(np.max(np.abs(np.cumsum(reference) / reference.sum()
+                               - np.cumsum(live) / live.sum())))
+
+
+def ks_critical(n_reference, n_live, coeff=KS_ALPHA_COEFF):
+    if n_reference == 0 or n_live == 0:
+        return np.inf
+    return coeff * math.sqrt((n_reference + n_live) / (n_reference * n_live))
+
+
+def compare(reference, live):
+    """Drift report of one column: a dict of statistics and ``flags``."""
+    ref_dist, live_dist = reference.distribution(), live.distribution()
+    psi_value = psi(ref_dist, live_dist)
+    ks_value = ks(ref_dist, live_dist)
+    ks_limit = ks_critical(reference.present, live.present)
+    off_universe = (live.below + live.above) / live.present if live.present else 0.0
+    missing_rate = live.missing / live.n if live.n else 0.0
+    ref_missing = reference.missing / reference.n if reference.n else 0.0
+    term_shift = (float(np.max(np.abs(live.term_shares() - reference.term_shares())))
+                  if live.present else 0.0)
+
+    flags = []
+    if psi_value >= PSI_ALERT:
+        flags.append('psi_alert')
+    elif psi_value >= PSI_WARN:
+        flags.append('psi_warn')
+    if ks_value > ks_limit:
+        flags.append('ks')
+    if off_universe > OFF_UNIVERSE_LIMIT:
+        flags.append('off_universe')
+    if term_shift > TERM_SHIFT_LIMIT:
+        flags.append('term_mass')
+    if abs(missing_rate - ref_missing) > MISSING_SHIFT_LIMIT:
+        flags.append('missing')
+    return {
+        'n': live.n,
+        'psi': psi_value,
+        'ks': ks_value,
+        'ks_critical': ks_limit,
+        'below_universe': live.below,
+        'above_universe': live.above,
+        'off_universe_rate': off_universe,
+        'missing_rate': missing_rate,
+        'reference_missing_rate': ref_missing,
+        'term_shares': live.term_shares(),
+        'term_shift': term_shift,
+        'flags': flags,
+    }
+
+
+class DriftMonitor(object):
+    """Windowed drift reports of live inputs against the training data.
+
+    Parameters
+    ----------
+    model : dict
+        Fitted model (universes and membership functions per variable).
+    reference : DataFrame or dict of arrays
+        Raw training rows with the Pima column names.
+    window_rows : int, optional
+        Rows per window; a report is produced when a window fills.
+    window_seconds : float, optional
+        Also close a non-empty window once it is this old (checked on `update`).
+    history : int, optional
+        Reports kept in ``self.reports``.
+    bins : int, optional
+        Histogram cells per universe.
+    """
+
+    def __init__(self, model, reference, window_rows=DEFAULT_WINDOW_ROWS,
+                 window_seconds=None, history=DEFAULT_HISTORY, bins=DEFAULT_BINS):
+        self.window_rows = int(window_rows)
+        self.window_seconds = window_seconds
+        self.columns = {}
+        self.reference = {}
+        self.live = {}
+        self.total = {}
+        for label, variable in model['variables'].items():
+            col = variable.get('column', INPUT_COLUMNS[label])
+            self.columns[label] = col
+            zero_as_missing = col in ZERO_AS_MISSING
+            self.reference[label] = FeatureSketch(variable, zero_as_missing, bins)
+            self.reference[label].update(reference[col])
+            self.live[label] = FeatureSketch(variable, zero_as_missing, bins)
+            self.total[label] = FeatureSketch(variable, zero_as_missing, bins)
+        self.reports = deque(maxlen=history)
+        self.rows_seen = 0
+        self._window_n = 0
+        self._window_start = time.monotonic()
+
+    def update(self, batch):
+        """Feed raw rows; returns the reports of the windows closed by this batch."""
+        n = len(np.asarray(batch[next(iter(self.columns.values()))]))
+        closed = []
+        start = 0
+        while start < n:
+            stop = min(n, start + self.window_rows - self._window_n)
+            for label, col in self.columns.items():
+                self.live[label].update(np.asarray(batch[col])[start:stop])
+            self._window_n += stop - start
+            self.rows_seen += stop - start
+            start = stop
+            if self._window_n >= self.window_rows:
+                closed.append(self.close_window())
+        if (self.window_seconds is not None and self._window_n
+                and time.monotonic() - self._window_start >= self.window_seconds):
+            closed.append(self.close_window())
+        return closed
+
+    def report(self, sketches=None):
+        """Drift report of ``sketches`` (default: the current window) per variable."""
+        sketches = self.live if sketches is None else sketches
+        features = {label: compare(self.reference[label], sketch)
+                    for label, sketch in sketches.items()}
+        return {
+            'rows': next(iter(sketches.values())).n,
+            'time': time.time(),
+            'features': features,
+            'flagged': {label: f['flags'] for label, f in features.items() if f['flags']},
+        }
+
+    def cumulative_report(self):
+        """Report of every row seen so far (closed windows and the current one)."""
+        merged = {}
+        for label, sketch in self.total.items():
+            merged[label] = sketch.copy()
+            merged[label].merge(self.live[label])
+        return self.report(merged)
+
+    def close_window(self):
+        report = self.report()
+        self.reports.append(report)
+        for label, sketch in self.live.items():
+            self.total[label].merge(sketch)
+            sketch.reset()
+        self._window_n = 0
+        self._window_start = time.monotonic()
+        return report
+
+
+def format_report(report):
+    lines = [f"{report['rows']} rows"]
+    for label, f in report['features'].items():
+        flags = ','.join(f['flags']) or 'ok'
+        lines.append(f"  {label:28s} PSI {f['psi']:6.3f}  KS {f['ks']:.3f}"
+                     f" (crit {f['ks_critical']:.3f})  off-universe {f['off_universe_rate']:6.2%}"
+                     f"  missing {f['missing_rate']:6.2%}  term shift {f['term_shift']:.3f}"
+                     f"  [{flags}]")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    import pandas as pd
+
+    from .model import load_model
+    from .stream import DEFAULT_CHUNKSIZE, iter_csv_chunks
+
+    parser = argparse.ArgumentParser(description="Report input drift of a live CSV.")
+    parser.add_argument('reference', help="Training CSV the model was fitted on")
+    parser.add_argument('model', help="Fitted model .npz")
+    parser.add_argument('live', help="Live CSV to monitor (read in chunks)")
+    parser.add_argument('--window-rows', type=int, default=DEFAULT_WINDOW_ROWS)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    monitor = DriftMonitor(load_model(args.model), pd.read_csv(args.reference),
+                           window_rows=args.window_rows)
+    for chunk in iter_csv_chunks(args.live, args.chunksize):
+        for report in monitor.update(chunk):
+            print(format_report(report))
+    print("cumulative: " + format_report(monitor.cumulative_report()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""Threshold metrics, ROC/PR curves and bootstrap intervals from one sort.
+
+`ScoreCurve` sorts the risk scores once (O(N log N)) and keeps, for every
+distinct score, how many positives and negatives have it.  Everything else
+is read off those counts with cumulative sums:
+
+* `precision_recall_curve` and `roc_curve` follow the
+  ``sklearn.metrics`` conventions (so existing plotting code applies),
+* `auc` is the exact ROC AUC with ties counted as half,
+* `f1_optimal`, `confusion_matrix` and `metrics` answer any threshold with
+  a binary search,
+* `bootstrap` draws all replicates at once as Poisson counts per distinct
+  score (the Poisson bootstrap, which approximates resampling rows with
+  replacement), after merging scores into at most ``max_bins`` groups, so
+  its cost does not grow with the number of rows.
+
+A row is predicted positive when ``score >= threshold``.
+"""
+
+import numpy as np
+
+DEFAULT_BOOTSTRAP = 1000
+BOOTSTRAP_BINS = 4096
+# Replicates drawn per block, bounding bootstrap memory to block x bins.
+BOOTSTRAP_BLOCK = 256
+
+METRICS = ('accuracy', 'precision', 'recall', 'f1')
+
+
+def _ratio(num, den):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), 0.0)
+
+
+class ScoreCurve(object):
+    """Binary classification curves of ``scores`` against ``y_true``.
+
+    Parameters
+    ----------
+    y_true : 1d array
+        Outcome, 0/1 (or boolean).
+    scores : 1d array
+        Risk scores; NaNs are rejected (drop or fill unscored rows first).
+    """
+
+    def __init__(self, y_true, scores):
+        y_true = np.asarray(y_true).ravel()
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        if len(y_true) != len(scores):
+            raise ValueError("y_true and scores must have the same length.")
+        if np.isnan(scores).any():
+            raise ValueError("scores contain NaN; drop or fill unscored rows first.")
+        if not np.isin(y_true, (0, 1)).all():
+            raise ValueError("y_true must be 0/1.")
+        order = np.argsort(scores, kind='stable')
+        ordered = scores[order]
+        positive = y_true[order].astype(bool)
+        last = np.flatnonzero(np.r_[ordered[1:] != ordered[:-1], True])
+        # Ascending distinct scores and the positives/negatives holding each.
+        self.values = ordered[last]
+        pos_le = np.cumsum(positive)[last]
+        self.pos = np.diff(pos_le, prepend=0)
+        self.neg = np.diff(last + 1, prepend=0) - self.pos
+        self.n_pos = int(self.pos.sum())
+        self.n_neg = int(self.neg.sum())
+
+    def __len__(self):
+        return self.n_pos + self.n_neg
+
+    def _above(self):
+        """Positives/negatives scoring at or above each distinct value."""
+        tp = np.cumsum(self.pos[::-1])[::-1]
+        fp = np.cumsum(self.neg[::-1])[::-1]
+        return tp, fp
+
+    def _index(self, threshold):
+        """Index of the first distinct value >= threshold."""
+        return int(np.searchsorted(self.values, threshold, side='left'))
+
+    # --- Curves ---
+    def precision_recall_curve(self):
+        """``(precision, recall, thresholds)`` as ``sklearn.metrics.precision_recall_curve``.
+
+        ``thresholds`` are the distinct scores ascending; precision/recall
+        have one more entry, the ``(1, 0)`` end point.
+        """
+        tp, fp = self._above()
+        precision = np.r_[_ratio(tp, tp + fp), 1.0]
+        recall = np.r_[_ratio(tp, np.full(len(tp), self.n_pos)), 0.0]
+        return precision, recall, self.values.copy()
+
+    def roc_curve(self):
+        """``(fpr, tpr, thresholds)`` as ``sklearn.metrics.roc_curve(drop_intermediate=False)``."""
+        tp, fp = self._above()
+        fpr = np.r_[0.0, _ratio(fp[::-1], np.full(len(fp), self.n_neg))]
+        tpr = np.r_[0.0, _ratio(tp[::-1], np.full(len(tp), self.n_pos))]
+        return fpr, tpr, np.r_[np.inf, self.values[::-1]]
+
+    def roc_index(self, threshold):
+        """Index of ``threshold``'s operating point in `roc_curve`."""
+        return len(self.values) - self._index(threshold)
+
+    def auc(self):
+        """ROC AUC (Mann-Whitney, ties count half); NaN without both classes."""
+        if self.n_pos == 0 or self.n_neg == 0:
+            return np.nan
+        tp, _ = self._above()
+        strictly_above = tp - self.pos
+        return float(np.sum(self.neg * (strictly_above + 0.5 * self.pos))
+                     / (self.n_pos * self.n_neg))
+
+    # --- Thresholds ---
+    def f1_optimal(self):
+        """``(threshold, f1)`` maximising F1 of the positive class over the distinct scores."""
+        tp, fp = self._above()
+        f1 = _ratio(2 * tp, tp + fp + self.n_pos)
+        best = int(np.argmax(f1))
+        return float(self.values[best]), float(f1[best])
+
+    def confusion_matrix(self, threshold):
+        """``[[TN, FP], [FN, TP]]`` at ``threshold``."""
+        k = self._index(threshold)
+        tp = int(self.pos[k:].sum())
+        fp = int(self.neg[k:].sum())
+        return np.array([[self.n_neg - fp, fp], [self.n_pos - tp, tp]], dtype=np.int64)
+
+    def metrics(self, threshold):
+        """Accuracy, precision, recall and F1 of the positive class at ``threshold``."""
+        return _metrics(self.confusion_matrix(threshold))
+
+    # --- Bootstrap ---
+    def _groups(self, threshold, max_bins):
+        """Merge distinct scores into <= max_bins groups, one starting at ``threshold``."""
+        k = len(self.values)
+        if k <= max_bins:
+            return np.arange(k)
+        counts = np.cumsum(self.pos + self.neg)
+        cuts = np.searchsorted(counts, np.linspace(0, counts[-1], max_bins, endpoint=False),
+                               side='right')
+        return np.unique(np.r_[0, cuts[cuts < k], min(self._index(threshold), k - 1)])
+
+    def bootstrap(self, threshold, n_boot=DEFAULT_BOOTSTRAP, confidence=0.95, seed=None,
+                  max_bins=BOOTSTRAP_BINS):
+        """Percentile confidence intervals of the metrics at ``threshold`` and the AUC.
+
+        Returns a dict metric -> ``(low, high)`` for `METRICS`, ``'auc'`` and
+        ``'f1_optimal'`` (the best F1 over thresholds, per replicate).
+        """
+        rng = np.random.default_rng(seed)
+        starts = self._groups(threshold, max_bins)
+        pos = np.add.reduceat(self.pos, starts).astype(np.float64)
+        neg = np.add.reduceat(self.neg, starts).astype(np.float64)
+        # First group predicted positive at ``threshold``.
+        k = int(np.searchsorted(self.values[starts], threshold, side='left'))
+
+        samples = {name: [] for name in METRICS + ('auc', 'f1_optimal')}
+        for start in range(0, n_boot, BOOTSTRAP_BLOCK):
+            b = min(BOOTSTRAP_BLOCK, n_boot - start)
+            p = rng.poisson(pos, size=(b, len(pos))).astype(np.float64)
+            n = rng.poisson(neg, size=(b, len(neg))).astype(np.float64)
+            tp = np.cumsum(p[:, ::-1], axis=1)[:, ::-1]
+            fp = np.cumsum(n[:, ::-1], axis=1)[:, ::-1]
+            n_pos, n_neg = tp[:, 0], fp[:, 0]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                samples['auc'].append(np.sum(n * (tp - 0.5 * p), axis=1) / (n_pos * n_neg))
+            samples['f1_optimal'].append(np.max(_ratio(2 * tp, tp + fp + n_pos[:, None]),
+                                                axis=1))
+            tp_k = tp[:, k] if k < len(pos) else np.zeros(b)
+            fp_k = fp[:, k] if k < len(pos) else np.zeros(b)
+            cm = np.array([[n_neg - fp_k, fp_k], [n_pos - tp_k, tp_k]])
+            for name, values in _metrics(cm).items():
+                samples[name].append(values)
+
+        tail = (1 - confidence) / 2 * 100
+        intervals = {}
+        for name, chunks in samples.items():
+            low, high = np.nanpercentile(np.concatenate(chunks), [tail, 100 - tail])
+            intervals[name] = (float(low), float(high))
+        return intervals
+
+
+def _metrics(cm):
+    """Metrics of a confusion matrix (or of a stack along the trailing axis)."""
+    (tn, fp), (fn, tp) = cm
+    total = tn + fp + fn + tp
+    precision = _ratio(tp, tp + fp)
+    recall = _ratio(tp, tp + fn)
+    metrics = {
+        'accuracy': _ratio(tp + tn, total),
+        'precision': precision,
+        'recall': recall,
+        'f1': _ratio(2 * tp, 2 * tp + fp + fn),
+    }
+    if np.ndim(tp) == 0:
+        metrics = {name: float(value) for name, value in metrics.items()}
+    return metrics
+
+
+def classification_report(cm, target_names=('0', '1'), digits=2):
+    """Text report like ``sklearn.metrics.classification_report``, from ``cm``."""
+    cm = np.asarray(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    correct = np.diag(cm)
+    precision = _ratio(correct, predicted)
+    recall = _ratio(correct, support)
+    f1 = _ratio(2 * precision * recall, precision + recall)
+    total = support.sum()
+
+    width = max(len('weighted avg'), *(len(name) for name in target_names))
+    head = f"{'':>{width}}  {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}"
+    row = f"{{:>{width}}}  {{:>9.{digits}f}} {{:>9.{digits}f}} {{:>9.{digits}f}} {{:>9}}"
+    lines = [head, '']
+    for name, values in zip(target_names, zip(precision, recall, f1, support)):
+        lines.append(row.format(name, *values))
+    lines.append('')
+    accuracy = correct.sum() / total if total else 0.0
+    lines.append(f"{'accuracy':>{width}}  {'':>9} {'':>9} {accuracy:>9.{digits}f} {total:>9}")
+    weights = _ratio(support, np.full(len(support), total))
+    for name, average in (('macro avg', np.full(len(support), 1 / len(support))),
+                          ('weighted avg', weights)):
+        lines.append(row.format(name, precision @ average, recall @ average, f1 @ average,
+                                total))
+    return '\n'.join(lines) + '\n'
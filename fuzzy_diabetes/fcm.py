@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy c-means fitting of one-dimensional membership functions."""
+
+import os
+import time
+
+import numpy as np
+
+from . import profiling
+
+# Ratio of Gaussian sigma to the mean gap between neighbouring FCM centers.
+SIGMA_RATIO = 0.40
+
+
+def _as_row(data):
+    return np.asarray(data, dtype=np.float64).reshape(1, -1)
+
+
+def sigmas_from_centers(sorted_centers, data, weights=None):
+    """Shared Gaussian width derived from the spacing of the centers.
+
+    ``weights`` (counts of each ``data`` value) only matter for one cluster,
+    whose width comes from the spread of the data.
+    """
+    n_clusters = len(sorted_centers)
+    if n_clusters > 1:
+        avg_dist = np.mean(np.diff(sorted_centers))
+        return [avg_dist * SIGMA_RATIO] * n_clusters
+    data = np.asarray(data, dtype=np.float64)
+    if weights is None:
+        return [np.std(data, ddof=1) / 2]
+    mean = np.average(data, weights=weights)
+    var = np.sum(weights * (data - mean) ** 2) / (np.sum(weights) - 1)
+    return [np.sqrt(var) / 2]
+
+
+# --- Native 1-D fuzzy c-means ---
+def _weighted_quantiles(values, weights, q):
+    cum = np.cumsum(weights)
+    return np.interp(q * cum[-1], cum - 0.5 * weights, values)
+
+
+def _compress(data, binned):
+    """Sorted unique values with counts when binning pays off, else the raw data."""
+    data = np.asarray(data, dtype=np.float64).ravel()
+    if binned:
+        values, counts = np.unique(data, return_counts=True)
+        if binned is True or 4 * len(values) <= len(data):
+            return values, counts.astype(np.float64)
+    return data, None
+
+
+def cmeans_1d(data, c, m=2, error=0.005, maxiter=1000, init='quantile', seed=None,
+              binned='auto', weights=None):
+    """Fuzzy c-means on one-dimensional data.
+
+    Same objective, update equations and stopping rule as
+    ``skfuzzy.cluster.cmeans`` (stop when the Frobenius norm of the change in
+    the membership matrix drops below ``error``), specialised for 1-D:
+
+    * ``init='quantile'`` seeds the centers at the ``(i + 0.5) / c``
+      quantiles, so repeated fits give the same result; ``init='random'``
+      draws ``c`` distinct data points with ``seed``.
+    * The ``c x N`` distance/membership buffers are allocated once and
+      updated in place.
+    * ``binned=True`` clusters the sorted unique values weighted by their
+      counts, which is exact and much faster for low-cardinality features
+      such as Age or Pregnancies; ``'auto'`` does so when there are at most a
+      quarter as many unique values as rows.
+    * ``weights`` gives the count of each ``data`` value directly (data that
+      is already binned); ``init`` can be previous centers to warm-start.
+
+    Returns
+    -------
+    centers : 1d array, length c
+    u : 2d array, (c, len(values))
+        Final memberships of ``values``.
+    values : 1d array
+        The points ``u`` refers to (the data, or its unique values if binned).
+    fpc : float
+    iterations : int
+    """
+    if weights is None:
+        values, weights = _compress(data, binned)
+    else:
+        values = np.asarray(data, dtype=np.float64).ravel()
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+    n = len(values)
+    if weights is None:
+        w = np.ones(n)
+    else:
+        w = weights
+    if isinstance(init, str) and init == 'quantile':
+        order = np.argsort(values, kind='stable')
+        centers = _weighted_quantiles(values[order], w[order], (np.arange(c) + 0.5) / c)
+    elif isinstance(init, str) and init == 'random':
+        rng = np.random.default_rng(seed)
+        pool = np.unique(values)
+        centers = np.sort(rng.choice(pool, size=c, replace=len(pool) < c))
+    else:
+        centers = np.asarray(init, dtype=np.float64).ravel()
+    centers = np.array(centers, dtype=np.float64)
+
+    exponent = -2.0 / (m - 1)
+    dist = np.empty((c, n))
+    u = np.empty((c, n))
+    u_prev = np.empty((c, n))
+    um = np.empty((c, n))
+    eps = np.finfo(np.float64).eps
+
+    def update_memberships(out):
+        np.subtract(values[None, :], centers[:, None], out=dist)
+        np.abs(dist, out=dist)
+        np.maximum(dist, eps, out=dist)
+        if m == 2:
+            np.square(dist, out=out)
+            np.reciprocal(out, out=out)
+        else:
+            np.power(dist, exponent, out=out)
+        out /= out.sum(axis=0)
+
+    update_memberships(u)
+    iterations = 0
+    while iterations < maxiter:
+        iterations += 1
+        u, u_prev = u_prev, u
+        if m == 2:
+            np.square(u_prev, out=um)
+        else:
+            np.power(u_prev, m, out=um)
+        um *= w
+        centers[:] = (um @ values) / um.sum(axis=1)
+        update_memberships(u)
+        np.subtract(u, u_prev, out=dist)
+        np.square(dist, out=dist)
+        if np.sqrt(dist.sum(axis=0) @ w) < error:
+            break
+
+    fpc = float((u * u).sum(axis=0) @ w / w.sum())
+    return centers, u, values, fpc, iterations
+
+
+def get_fcm_mf_params(data_series, n_clusters, m=2, error=0.005, maxiter=1000, seed=None,
+                      method='native'):
+    """Fit FCM to one feature; return ``(sorted_centers, sigmas, fpc)``.
+
+    ``method='native'`` uses the deterministic `cmeans_1d`; ``'skfuzzy'``
+    calls ``fuzz.cluster.cmeans`` with a random init.
+    """
+    if method == 'native':
+        cntr, _, _, fpc, iterations = cmeans_1d(data_series, n_clusters, m=m, error=error,
+                                                maxiter=maxiter)
+    else:
+        import skfuzzy as fuzz
+
+        cntr, u, _, _, _, iterations, fpc = fuzz.cluster.cmeans(
+            _as_row(data_series), n_clusters, m=m, error=error, maxiter=maxiter,
+            init=None, seed=seed
+        )
+    profiling.add('cmeans_calls')
+    profiling.add('cmeans_iterations', int(iterations))
+    sorted_centers = np.sort(cntr.flatten())
+    return sorted_centers, sigmas_from_centers(sorted_centers, data_series), fpc
+
+
+# --- FPC sweep ---
+SWEEP_DTYPE = np.dtype([
+    ('feature', 'U32'), ('n_clusters', np.int64), ('restart', np.int64),
+    ('fpc', np.float64), ('iterations', np.int64), ('seconds', np.float64),
+])
+
+_worker_columns = None
+
+
+def _init_worker(columns):
+    global _worker_columns
+    _worker_columns = columns
+
+
+def _sweep_cell(task):
+    feature, n_clusters, restart, seed, options = task
+    options = dict(options)
+    method = options.pop('method')
+
+    start = time.perf_counter()
+    try:
+        if method == 'native':
+            # Restart 0 is the deterministic quantile seeding, later ones random.
+            init = 'quantile' if restart == 0 else 'random'
+            _, _, _, fpc, iterations = cmeans_1d(_worker_columns[feature], n_clusters,
+                                                 init=init, seed=seed, **options)
+        else:
+            import skfuzzy as fuzz
+
+            out = fuzz.cluster.cmeans(_as_row(_worker_columns[feature]), n_clusters,
+                                      init=None, seed=seed, **options)
+            fpc, iterations = out[6], out[5]
+    except Exception:
+        fpc, iterations = np.nan, -1
+    return feature, n_clusters, restart, fpc, iterations, time.perf_counter() - start
+
+
+def run_fpc_sweep(columns, n_clusters_range, restarts=1, n_jobs=None, seed=None,
+                  m=2, error=0.005, maxiter=1000, method='native'):
+    """FCM fit for every feature x cluster count x restart, fanned out over a pool.
+
+    Parameters
+    ----------
+    columns : mapping
+        Feature name -> 1-D data.
+    n_clusters_range : iterable of int
+        Cluster counts to evaluate.
+    restarts : int, optional
+        Independently seeded fits per (feature, n_clusters) cell.
+    n_jobs : int, optional
+        Worker processes; None uses every CPU, 1 runs in-process.
+    seed : int, optional
+        Root seed; each fit gets its own stream spawned from it.
+    method : {'native', 'skfuzzy'}, optional
+        FCM implementation (see `get_fcm_mf_params`).
+
+    Returns
+    -------
+    table : structured array with `SWEEP_DTYPE` fields
+        One row per fit; ``fpc`` is NaN (``iterations`` -1) where it failed.
+    """
+    columns = {name: np.asarray(data, dtype=np.float64) for name, data in columns.items()}
+    cells = [(feature, int(n_c), r) for feature in columns
+             for n_c in n_clusters_range for r in range(restarts)]
+    seeds = [int(s.generate_state(1)[0])
+             for s in np.random.SeedSequence(seed).spawn(len(cells))]
+    options = {'m': m, 'error': error, 'maxiter': maxiter, 'method': method}
+    tasks = [cell + (s, options) for cell, s in zip(cells, seeds)]
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, len(tasks)))
+    if n_jobs == 1:
+        _init_worker(columns)
+        rows = [_sweep_cell(task) for task in tasks]
+    else:
+        # Only the parallel sweep pays for importing multiprocessing.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(columns,)) as pool:
+            chunksize = max(1, len(tasks) // (4 * n_jobs))
+            rows = list(pool.map(_sweep_cell, tasks, chunksize=chunksize))
+    table = np.array(rows, dtype=SWEEP_DTYPE)
+    # Counted here so fits in worker processes are included.
+    profiling.add('cmeans_calls', len(table))
+    profiling.add('cmeans_iterations', int(table['iterations'][table['iterations'] > 0].sum()))
+    return table
+
+
+def best_fpc(table, feature, n_clusters_range):
+    """Best FPC over restarts for each cluster count of one feature."""
+    rows = table[table['feature'] == feature]
+    fpcs = []
+    for n_c in n_clusters_range:
+        cell = rows['fpc'][rows['n_clusters'] == n_c]
+        fpcs.append(np.nanmax(cell) if np.isfinite(cell).any() else np.nan)
+    return np.array(fpcs, dtype=np.float64)
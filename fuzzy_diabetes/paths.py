@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""Filesystem locations shared by the model and dataset caches.
+
+A leaf module (standard library only), so that the dataset loader can find
+the cache without importing the model, FCM and inference modules.
+"""
+
+import os
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'FUZZY_DIABETES_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'fuzzy_diabetes'))
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Quantized LRU cache of risk predictions for repeated patient queries.
+
+Single-patient queries repeat a lot: the same patient is re-entered, and
+Age, Pregnancies and BloodPressure are integers while glucose is read to
+1 mg/dL.  `PredictionCache` keys every row by its inputs rounded to each
+antecedent's universe step (multiples of the step from zero, so integer
+inputs on a step-1 grid stay exact; a value inside its universe is kept
+inside), scores only rows it has not seen, at their rounded values, and
+remembers the result.  Inputs are validated before rounding, so clamped,
+rejected and missing rows are counted and treated exactly as by `predict`.  A given key therefore
+always gets the same answer, whichever raw value produced it first.
+
+That answer is the score of the rounded row, not of the submitted one: a
+cached score equals `BatchRiskScorer.predict` on inputs moved by at most
+half a step each (``stats()['tolerance']`` lists the bound per variable),
+so the cache is an opt-in trade of exactness for speed.  Inputs already on
+the grid (integers on a step-1 universe) score exactly.
+
+The cache is bounded by an estimate of its memory use in bytes and evicts
+the least recently used rows.  It counts hits, misses, evictions and
+invalidations.  Every call names the model version (the model key); when
+it differs from the cached one, the cache is emptied first, so a refit or
+reload can never serve stale scores.  All bookkeeping is under one lock
+and scoring happens outside it, so one cache can be shared by the threads
+of a server or a long-lived Streamlit process::
+
+    cache = PredictionCache()
+    risk = cache.predict(scorer, model['key'], {'glucose': [148], ...})
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .validation import validate_columns
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# Per-entry bookkeeping of the OrderedDict beyond the key and value objects.
+ENTRY_OVERHEAD = 100
+# Key component for missing inputs (they score NaN whatever their value).
+_NOT_FINITE = np.iinfo(np.int64).min
+
+
+class PredictionCache(object):
+    """Thread-safe LRU cache in front of `BatchRiskScorer.predict`.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Bound on the estimated size of the cached entries.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._steps = None
+        self._bounds = None
+        self._tolerance = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                # Largest difference between a scored and a submitted input.
+                'tolerance': dict(self._tolerance),
+            }
+
+    def _bind(self, scorer, version):
+        """Empty the cache if ``version`` changed; returns steps and universe bounds."""
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.nbytes = 0
+                self.version = version
+                # A variable without a grid step is keyed on its exact value.
+                self._steps = np.array([v.step or 0.0 for v in scorer.variables])
+                self._bounds = (np.array([v.lo for v in scorer.variables]),
+                                np.array([v.hi for v in scorer.variables]))
+                self._tolerance = {v.label: round((v.step or 0.0) / 2, 12)
+                                   for v in scorer.variables}
+            return self._steps, self._bounds
+
+    def predict(self, scorer, version, inputs, report=None):
+        """Risk per row, from the cache where possible.
+
+        ``scorer`` is the `BatchRiskScorer` of model ``version`` and
+        ``inputs`` anything its `predict` accepts.  The submitted values are
+        validated once, exactly as `predict` would (``report`` receives the
+        counts of every row, cached or not); rounding happens afterwards and
+        never moves an in-universe value out of its universe, so the cache
+        cannot change which rows are clamped or rejected.
+        """
+        steps, (lo, hi) = self._bind(scorer, version)
+        cols, rejected = validate_columns(scorer.columns(inputs), scorer.variables,
+                                          scorer.out_of_range, report)
+        x = np.column_stack(cols)
+        with np.errstate(invalid='ignore'):
+            inside = (x >= lo) & (x <= hi)
+            stepped = np.where(steps > 0, steps, 1.0)
+            quantized = np.where(steps > 0, np.round(x / stepped) * stepped, x)
+        quantized = np.where(inside, np.clip(quantized, lo, hi), quantized)
+        # Keyed on the value that is scored, so one key always means one score.
+        keys = quantized.view(np.int64).copy()
+        keys[np.isnan(quantized)] = _NOT_FINITE
+        rows = keys.view(np.dtype((np.void, keys.itemsize * keys.shape[1]))).ravel()
+
+        out = np.full(len(x), np.nan)
+        todo = np.arange(len(x)) if rejected is None else np.flatnonzero(~rejected)
+        pending = {}
+        with self._lock:
+            for i in todo:
+                key = rows[i].tobytes()
+                risk = self._entries.get(key)
+                if risk is None:
+                    pending.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    out[i] = risk
+            missed = sum(map(len, pending.values()))
+            self.hits += len(todo) - missed
+            self.misses += missed
+        if not pending:
+            return out
+
+        risks = scorer.predict(quantized[[indices[0] for indices in pending.values()]])
+        for indices, risk in zip(pending.values(), risks):
+            out[indices] = risk
+
+        with self._lock:
+            if version != self.version:
+                return out  # the model moved on while scoring; do not store
+            for key, risk in zip(pending, risks):
+                if key in self._entries:
+                    continue
+                self._entries[key] = float(risk)
+                self.nbytes += sys.getsizeof(key) + sys.getsizeof(1.0) + ENTRY_OVERHEAD
+            while self.nbytes > self.max_bytes and self._entries:
+                key, _ = self._entries.popitem(last=False)
+                self.nbytes -= sys.getsizeof(key) + sys.getsizeof(1.0) + ENTRY_OVERHEAD
+                self.evictions += 1
+        return out
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Zero-as-missing handling and median imputation for the Pima columns."""
+
+import numpy as np
+
+# In the Pima data a 0 in these columns means "not measured".
+ZERO_AS_MISSING = ['Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI']
+
+
+def zeros_to_nan(values):
+    values = np.array(values, dtype=np.float64)
+    values[values == 0] = np.nan
+    return values
+
+
+def imputation_medians(frame, columns=ZERO_AS_MISSING):
+    """Median of each column, ignoring zeros (missing) and NaNs."""
+    return {col: float(np.nanmedian(zeros_to_nan(frame[col]))) for col in columns}
+
+
+def apply_imputation(frame, medians):
+    """Replace zeros/NaNs in ``frame`` with ``medians``; returns ``frame``.
+
+    ``frame`` can be a DataFrame or a dict of arrays; columns are reassigned
+    rather than filled in place so pandas copy-on-write cannot drop the update.
+    """
+    for col, median_val in medians.items():
+        values = zeros_to_nan(frame[col])
+        values[np.isnan(values)] = median_val
+        frame[col] = values
+    return frame
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Named timing spans for the dashboard pipeline.
+
+Wrap a stage in ``with profiling.span('scoring'):`` (or, in a top-to-bottom
+script, call ``profiling.stage('scoring')``, which closes the previous
+stage) and attach counts with ``profiling.add('cmeans_iterations', n)``.
+Each closed span records its wall and CPU time, its counters and, when
+memory tracking is on, the peak traced memory while it was open; spans
+nest per thread.
+
+Profiling is off unless `enable` is called or the
+``FUZZY_DIABETES_PROFILE`` environment variable is set (``1``, or
+``memory`` to also start ``tracemalloc``).  While off, `span` returns a
+shared no-op context manager and `add`/`stage` return at once, so the
+instrumentation costs one flag check per call.  Memory tracking slows
+allocation-heavy code noticeably and is best used for one-off runs; with
+several threads profiling at once its peaks are process-wide.
+
+Records are kept in a bounded buffer and can be exported as JSON lines
+(`write_log`) or Prometheus text (`to_prometheus`, `export` to a
+``.prom`` file for a node-exporter textfile collector); the dashboard
+exports to ``FUZZY_DIABETES_PROFILE_EXPORT`` after every rerun.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+
+ENV_VAR = 'FUZZY_DIABETES_PROFILE'
+# Where the dashboard exports each rerun's spans (see `export`).
+EXPORT_ENV_VAR = 'FUZZY_DIABETES_PROFILE_EXPORT'
+MAX_RECORDS = 10_000
+METRIC_PREFIX = 'fuzzy_diabetes'
+
+_enabled = False
+_memory = False
+_records = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'labels', 'parent', 'counters', 'peak', '_wall', '_cpu', '_start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.parent = None
+        self.counters = {}
+        self.peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        if _memory and tracemalloc.is_tracing():
+            if self.parent is not None:
+                # Bank the parent's peak so far before restarting the peak.
+                self.parent.peak = max(self.parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self._start = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        if _memory and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        record = {
+            'name': self.name,
+            'labels': self.labels,
+            'parent': self.parent.name if self.parent is not None else None,
+            'start': self._start,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_bytes': self.peak if _memory else None,
+            'counters': self.counters,
+        }
+        with _lock:
+            _records.append(record)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+# --- Switches ---
+def enable(memory=False):
+    global _enabled, _memory
+    _enabled = True
+    _memory = bool(memory)
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled, _memory
+    _enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+
+def enabled():
+    return _enabled
+
+
+# --- Instrumentation ---
+def span(name, **labels):
+    """Context manager timing one named span (a no-op while disabled)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, labels)
+
+
+def stage(name=None, **labels):
+    """Close the current `stage` of this thread and, unless ``name`` is None, open the next."""
+    if not _enabled:
+        return
+    current = getattr(_local, 'stage', None)
+    if current is not None:
+        current.__exit__(None, None, None)
+        _local.stage = None
+    if name is not None:
+        _local.stage = _Span(name, labels).__enter__()
+
+
+def add(counter, value=1):
+    """Add ``value`` to ``counter`` on the innermost open span of this thread."""
+    if not _enabled:
+        return
+    stack = _stack()
+    if stack:
+        counters = stack[-1].counters
+        counters[counter] = counters.get(counter, 0) + value
+
+
+# --- Reports ---
+def records():
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def summary():
+    """Per span name: calls, total wall/CPU seconds, max peak bytes, summed counters."""
+    rows = OrderedDict()
+    for record in records():
+        row = rows.setdefault(record['name'], {'span': record['name'], 'calls': 0,
+                                               'wall_s': 0.0, 'cpu_s': 0.0,
+                                               'peak_bytes': None, 'counters': {}})
+        row['calls'] += 1
+        row['wall_s'] += record['wall_s']
+        row['cpu_s'] += record['cpu_s']
+        if record['peak_bytes'] is not None:
+            row['peak_bytes'] = max(row['peak_bytes'] or 0, record['peak_bytes'])
+        for key, value in record['counters'].items():
+            row['counters'][key] = row['counters'].get(key, 0) + value
+    return list(rows.values())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(prefix=METRIC_PREFIX):
+    """Prometheus text exposition of `summary`."""
+    rows = summary()
+    metrics = [
+        ('span_seconds_total', 'counter', 'Wall-clock seconds spent in the span.', 'wall_s'),
+        ('span_cpu_seconds_total', 'counter', 'Process CPU seconds spent in the span.', 'cpu_s'),
+        ('span_calls_total', 'counter', 'Times the span was entered.', 'calls'),
+        ('span_peak_bytes', 'gauge', 'Peak traced memory while the span was open.',
+         'peak_bytes'),
+    ]
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        values = [(row['span'], row[field]) for row in rows if row[field] is not None]
+        if not values:
+            continue
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, value in values:
+            lines.append(f'{prefix}_{metric}{{span="{_escape(name)}"}} {value}')
+    counters = [(row['span'], key, value) for row in rows
+                for key, value in row['counters'].items()]
+    if counters:
+        lines.append(f"# HELP {prefix}_span_counter_total Counts attached to spans.")
+        lines.append(f"# TYPE {prefix}_span_counter_total counter")
+        for name, key, value in counters:
+            lines.append(f'{prefix}_span_counter_total{{span="{_escape(name)}",'
+                         f'counter="{_escape(key)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_log(path):
+    """Append every record as one JSON line."""
+    with open(path, 'a') as fh:
+        for record in records():
+            fh.write(json.dumps(record, default=str) + '\n')
+
+
+def export(path):
+    """`to_prometheus` into ``*.prom`` (replaced atomically), else `write_log`."""
+    if not str(path).endswith('.prom'):
+        write_log(path)
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as fh:
+        fh.write(to_prometheus())
+    os.replace(tmp_path, path)
+
+
+_setting = os.environ.get(ENV_VAR, '').strip().lower()
+if _setting and _setting not in ('0', 'false', 'no', 'off'):
+    enable(memory=_setting == 'memory')
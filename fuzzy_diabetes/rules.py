@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Membership-function names and the fuzzy rule base, as plain data.
+
+The rule base is kept as `RuleSpec` tuples so it can be serialised with a
+fitted model, scored by `BatchRiskScorer` without skfuzzy, and turned back
+into ``ctrl.Rule`` objects for the dashboard with `build_ctrl_rules`.
+"""
+
+import numpy as np
+
+from .inference import RuleSpec
+
+# --- Term names per antecedent, in ascending order of FCM center ---
+MF_NAMES = {
+    'glucose': ['very_low_gl', 'low_gl', 'normal_gl', 'high_gl'],
+    'bmi': ['underweight_bmi', 'normal_bmi', 'overweight_bmi', 'obese_bmi'],
+    'age': ['young_age', 'middle_aged_age', 'senior_age', 'elderly_age'],
+    'blood_pressure': ['very_low_bp', 'low_bp', 'normal_bp', 'elevated_bp', 'high_bp'],
+    'pregnancies': ['zero_preg', 'low_preg', 'medium_preg', 'high_preg', 'very_high_preg'],
+    'diabetes_pedigree_function': ['very_low_dpf', 'low_dpf', 'medium_dpf', 'high_dpf'],
+    'skin_thickness': ['very_thin_skin', 'thin_skin', 'normal_skin', 'thick_skin',
+                       'very_thick_skin'],
+    'insulin': ['very_low_insulin', 'low_insulin', 'normal_insulin', 'elevated_ins',
+                'very_high_ins'],
+}
+
+
+def term_names(label, n_clusters):
+    """Names for ``n_clusters`` terms, padding with ``fcm_cluster_<i>``."""
+    names = MF_NAMES.get(label, [])
+    return [names[i] if i < len(names) else f'fcm_cluster_{i}' for i in range(n_clusters)]
+
+
+# --- Output variable (Consequent) ---
+# Risk levels remain manually defined triangles [a, b, c] over 0-100 %.
+RISK_UNIVERSE = (0, 100, 1)
+RISK_TERMS = {
+    'low_risk': (0, 25, 50),
+    'medium_risk': (25, 50, 75),
+    'high_risk': (50, 75, 100),
+}
+
+
+def risk_universe():
+    start, stop, step = RISK_UNIVERSE
+    return np.arange(start, stop + step, step)
+
+
+def trimf(x, abc):
+    """Triangular membership, identical to ``skfuzzy.trimf``."""
+    a, b, c = np.r_[abc]
+    x = np.asarray(x, dtype=np.float64)
+    y = np.zeros(len(x))
+    if a != b:
+        idx = np.nonzero(np.logical_and(a < x, x < b))[0]
+        y[idx] = (x[idx] - a) / float(b - a)
+    if b != c:
+        idx = np.nonzero(np.logical_and(b < x, x < c))[0]
+        y[idx] = (c - x[idx]) / float(c - b)
+    y[np.nonzero(x == b)] = 1
+    return y
+
+
+def _t(variable, term):
+    return ('term', variable, term)
+
+
+def _and(*exprs):
+    expr = exprs[0]
+    for other in exprs[1:]:
+        expr = ('and', expr, other)
+    return expr
+
+
+def _or(*exprs):
+    expr = exprs[0]
+    for other in exprs[1:]:
+        expr = ('or', expr, other)
+    return expr
+
+
+# --- Fuzzy Rules ---
+# The antecedent names must match the names assigned to the FCM-derived
+# membership functions (see MF_NAMES).
+RISK_RULES = [
+    # Rules for High Risk: strong indicators and critical combinations
+    RuleSpec('High Glucose -> High Risk',
+             _t('glucose', 'high_gl'), 'high_risk', 1.0),
+    RuleSpec('Obese BMI -> High Risk',
+             _t('bmi', 'obese_bmi'), 'high_risk', 1.0),
+    RuleSpec('Very High Insulin -> High Risk',
+             _t('insulin', 'very_high_ins'), 'high_risk', 1.0),
+    RuleSpec('High DPF & (High Glucose OR Elevated Insulin) -> High Risk',
+             _and(_t('diabetes_pedigree_function', 'high_dpf'),
+                  _or(_t('glucose', 'high_gl'), _t('insulin', 'elevated_ins'))),
+             'high_risk', 1.0),
+    RuleSpec('Elderly Age & (High Glucose OR Obese BMI) -> High Risk',
+             _and(_t('age', 'elderly_age'),
+                  _or(_t('glucose', 'high_gl'), _t('bmi', 'obese_bmi'))),
+             'high_risk', 1.0),
+    RuleSpec('Very High Pregnancies & High Glucose -> High Risk',
+             _and(_t('pregnancies', 'very_high_preg'), _t('glucose', 'high_gl')),
+             'high_risk', 1.0),
+
+    # Rules for Medium Risk: borderline or moderate risk
+    RuleSpec('Normal Glucose & Elevated Insulin -> Medium Risk',
+             _and(_t('glucose', 'normal_gl'), _t('insulin', 'elevated_ins')),
+             'medium_risk', 1.0),
+    RuleSpec('Overweight BMI & Middle/Senior Age -> Medium Risk',
+             _and(_t('bmi', 'overweight_bmi'),
+                  _or(_t('age', 'middle_aged_age'), _t('age', 'senior_age'))),
+             'medium_risk', 1.0),
+    RuleSpec('Elevated BP & Normal Glucose -> Medium Risk',
+             _and(_t('blood_pressure', 'elevated_bp'), _t('glucose', 'normal_gl')),
+             'medium_risk', 1.0),
+    RuleSpec('Medium DPF & Middle/Senior Age -> Medium Risk',
+             _and(_t('diabetes_pedigree_function', 'medium_dpf'),
+                  _or(_t('age', 'middle_aged_age'), _t('age', 'senior_age'))),
+             'medium_risk', 1.0),
+    RuleSpec('High Pregnancies & Overweight BMI -> Medium Risk',
+             _and(_t('pregnancies', 'high_preg'), _t('bmi', 'overweight_bmi')),
+             'medium_risk', 1.0),
+    RuleSpec('Normal Glucose & Obese BMI -> Medium Risk',
+             _and(_t('glucose', 'normal_gl'), _t('bmi', 'obese_bmi')),
+             'medium_risk', 1.0),
+
+    # Rules for Low Risk: combinations indicating low risk
+    RuleSpec('Normal Glucose & Normal BMI & Young Age -> Low Risk',
+             _and(_t('glucose', 'normal_gl'), _t('bmi', 'normal_bmi'), _t('age', 'young_age')),
+             'low_risk', 1.0),
+    RuleSpec('Low Glucose -> Low Risk',
+             _t('glucose', 'low_gl'), 'low_risk', 1.0),
+    RuleSpec('Normal BMI & Normal BP -> Low Risk',
+             _and(_t('bmi', 'normal_bmi'), _t('blood_pressure', 'normal_bp')),
+             'low_risk', 1.0),
+    RuleSpec('Very Low DPF & Young/Middle Age -> Low Risk',
+             _and(_t('diabetes_pedigree_function', 'very_low_dpf'),
+                  _or(_t('age', 'young_age'), _t('age', 'middle_aged_age'))),
+             'low_risk', 1.0),
+    RuleSpec('Zero Pregnancies & Normal Glucose & Normal BMI -> Low Risk',
+             _and(_t('pregnancies', 'zero_preg'), _t('glucose', 'normal_gl'),
+                  _t('bmi', 'normal_bmi')),
+             'low_risk', 1.0),
+    RuleSpec('Normal Insulin & Normal Skin -> Low Risk',
+             _and(_t('insulin', 'normal_insulin'), _t('skin_thickness', 'normal_skin')),
+             'low_risk', 1.0),
+]
+
+
+def _ctrl_expr(expr, variables):
+    kind = expr[0]
+    if kind == 'term':
+        return variables[expr[1]][expr[2]]
+    if kind == 'not':
+        return ~_ctrl_expr(expr[1], variables)
+    left = _ctrl_expr(expr[1], variables)
+    right = _ctrl_expr(expr[2], variables)
+    return left & right if kind == 'and' else left | right
+
+
+def build_ctrl_rules(specs, variables):
+    """Turn `RuleSpec` tuples into ``ctrl.Rule`` objects.
+
+    ``variables`` maps every antecedent/consequent label to its skfuzzy
+    ``Antecedent``/``Consequent`` object with terms already assigned.
+    """
+    from skfuzzy import control as ctrl
+
+    rules = []
+    for spec in specs:
+        antecedent = _ctrl_expr(spec.antecedent, variables)
+        consequent = None
+        for var in variables.values():
+            if isinstance(var, ctrl.Consequent) and spec.consequent in var.terms:
+                consequent = var[spec.consequent]
+        if consequent is None:
+            raise KeyError(f"No consequent defines term '{spec.consequent}'")
+        if spec.weight != 1.0:
+            consequent = consequent % spec.weight
+        rules.append(ctrl.Rule(antecedent, consequent, label=spec.label))
+    return rules
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Column layout shared by the fuzzy diabetes risk pipeline."""
+
+# --- Antecedent label -> column name in the Pima diabetes CSV ---
+# The order here is the canonical input order for every array-based API.
+INPUT_COLUMNS = {
+    'glucose': 'Glucose',
+    'bmi': 'BMI',
+    'age': 'Age',
+    'blood_pressure': 'BloodPressure',
+    'pregnancies': 'Pregnancies',
+    'diabetes_pedigree_function': 'DiabetesPedigreeFunction',
+    'skin_thickness': 'SkinThickness',
+    'insulin': 'Insulin',
+}
+
+OUTPUT_LABEL = 'diabetes_risk'
+TARGET_COLUMN = 'Outcome'
+
+# --- Snapshot storage types (see fuzzy_diabetes.datasource) ---
+# Counts and mg/dL / mmHg / mu U/ml readings are integral in the Pima CSV.
+COLUMN_DTYPES = {
+    'Pregnancies': 'int16',
+    'Glucose': 'int16',
+    'BloodPressure': 'int16',
+    'SkinThickness': 'int16',
+    'Insulin': 'int16',
+    'BMI': 'float64',
+    'DiabetesPedigreeFunction': 'float64',
+    'Age': 'int16',
+    TARGET_COLUMN: 'int8',
+}
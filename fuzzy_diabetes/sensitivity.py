@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""What-if risk surfaces and partial dependence from one batched evaluation.
+
+`risk_surface` answers "how does this patient's ``diabetes_risk`` change as
+glucose (and BMI) move?" for one or two swept antecedents:
+
+* the risk of the base patient on a grid over each swept universe (a curve
+  for one feature, a ``points x points`` surface for two),
+* the partial-dependence curve of every swept feature: the mean risk over
+  a sample of ``frame`` rows with that feature set to each grid value.
+
+All rows that are not cached yet (grid copies of the base patient and
+sample rows times grid values) go through a single
+`BatchRiskScorer.predict` call instead of one
+``ControlSystemSimulation.compute()`` per point.  Surfaces and curves are
+kept in a process-wide LRU cache keyed by the model key (which changes with
+every refit or tuning run), so moving the base patient only re-evaluates
+its own grid and redrawing an unchanged chart costs a cache lookup and
+one row for the base patient's own risk.
+
+`REFERENCE_BANDS` holds the clinical bands quoted in the dashboard's rule
+notes (ADA glucose, WHO BMI) for shading the charts.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .inference import BatchRiskScorer
+from .schema import INPUT_COLUMNS
+
+DEFAULT_POINTS = 101      # grid points per axis for one swept feature
+DEFAULT_POINTS_2D = 41    # ... and per axis for two
+PD_ROWS = 2000            # frame rows sampled for partial dependence
+SURFACE_CACHE_SIZE = 256  # cached surfaces and curves, over all models
+
+# (lower bound, upper bound, name); None is open-ended.
+REFERENCE_BANDS = {
+    'glucose': ((None, 100, 'normal'), (100, 126, 'prediabetic'), (126, None, 'diabetic')),
+    'bmi': ((None, 18.5, 'underweight'), (18.5, 25, 'normal'), (25, 30, 'overweight'),
+            (30, None, 'obese')),
+    'age': ((None, 30, 'young'), (55, None, 'elderly')),
+    'diabetes_pedigree_function': ((0.8, None, 'high genetic risk'),),
+}
+
+Surface = namedtuple('Surface', 'features grids risk base_risk partial_dependence')
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _cached(key):
+    with _CACHE_LOCK:
+        value = _CACHE.get(key)
+        if value is not None:
+            _CACHE.move_to_end(key)
+        return value
+
+
+def _store(key, value):
+    with _CACHE_LOCK:
+        _CACHE[key] = value
+        while len(_CACHE) > SURFACE_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+def _scorer(model, options):
+    key = (model['key'], 'scorer', options)
+    scorer = _cached(key)
+    if scorer is None:
+        scorer = BatchRiskScorer.from_model(model, **dict(options))
+        _store(key, scorer)
+    return scorer
+
+
+def _sample(frame, labels, rows, seed):
+    """``rows`` sampled rows of ``frame`` (all of them if fewer), per label."""
+    cols = {label: np.asarray(frame[INPUT_COLUMNS[label]], dtype=np.float64)
+            for label in labels}
+    n = len(next(iter(cols.values())))
+    if n > rows:
+        pick = np.sort(np.random.default_rng(seed).choice(n, rows, replace=False))
+        cols = {label: values[pick] for label, values in cols.items()}
+    return cols
+
+
+def risk_surface(model, base, features, points=None, frame=None, pd_rows=PD_ROWS, seed=0,
+                 **scorer_options):
+    """Risk of ``base`` over a grid of one or two ``features``, plus partial dependence.
+
+    Parameters
+    ----------
+    model : dict
+        Fitted model (see `fuzzy_diabetes.model`); its key versions the cache.
+    base : mapping
+        The base patient: antecedent label (or Pima column name) -> value,
+        already imputed.  Swept features may be left out.
+    features : str or sequence of str
+        One or two antecedent labels to sweep over their universes.
+    points : int, optional
+        Grid points per axis (`DEFAULT_POINTS`, or `DEFAULT_POINTS_2D` for
+        two features).
+    frame : DataFrame or mapping, optional
+        Imputed Pima-format rows for the partial-dependence curves; None
+        skips them.
+    pd_rows : int, optional
+        Rows of ``frame`` sampled (with ``seed``) for partial dependence.
+    **scorer_options
+        Passed to `BatchRiskScorer`.
+
+    Returns
+    -------
+    Surface
+        ``grids`` (one array per feature), ``risk`` (shape ``(points,)`` or
+        ``(points, points)``, indexed ``[first feature, second feature]``),
+        ``base_risk`` (the base patient's own risk) and
+        ``partial_dependence`` (label -> mean risk per grid value; empty
+        without ``frame``).  Points where no rule fires are NaN.
+    """
+    features = (features,) if isinstance(features, str) else tuple(features)
+    if not 1 <= len(features) <= 2 or len(set(features)) != len(features):
+        raise ValueError("Sweep one or two distinct features")
+    options = tuple(sorted(scorer_options.items()))
+    scorer = _scorer(model, options)
+    unknown = [label for label in features if label not in scorer.labels]
+    if unknown:
+        raise KeyError(f"Unknown features {unknown}")
+    if points is None:
+        points = DEFAULT_POINTS if len(features) == 1 else DEFAULT_POINTS_2D
+    columns = {col: label for label, col in INPUT_COLUMNS.items()}
+    patient = {columns.get(name, name): float(value) for name, value in base.items()}
+    missing = [label for label in scorer.labels
+               if label not in patient and label not in features]
+    if missing:
+        raise KeyError(f"Base patient lacks {missing}")
+
+    variables = {v.label: v for v in scorer.variables}
+    grids = [np.linspace(variables[label].lo, variables[label].hi, points)
+             for label in features]
+    patient_key = tuple(patient.get(label, np.nan) if label not in features else None
+                        for label in scorer.labels)
+    version = (model['key'], options, points)
+    surface_key = version + ('surface', features, patient_key)
+    pd_keys = {}
+    if frame is not None:
+        sample = _sample(frame, scorer.labels, pd_rows, seed)
+        digest = hashlib.sha256(b''.join(values.tobytes()
+                                         for values in sample.values())).hexdigest()
+        pd_keys = {label: version + ('pd', label, digest) for label in features}
+
+    # Everything not cached yet goes into one batch.
+    batch = {label: [] for label in scorer.labels}
+    parts = []
+    if all(label in patient for label in scorer.labels):
+        # The base patient's own risk is never cached: one row is cheap.
+        for label in scorer.labels:
+            batch[label].append(np.array([patient[label]]))
+        parts.append(('base', 1))
+    surface = _cached(surface_key)
+    if surface is None:
+        mesh = np.meshgrid(*grids, indexing='ij')
+        size = mesh[0].size
+        for label in scorer.labels:
+            if label in features:
+                batch[label].append(mesh[features.index(label)].ravel())
+            else:
+                batch[label].append(np.full(size, patient[label]))
+        parts.append(('surface', size))
+    curves = {}
+    for label, key in pd_keys.items():
+        curves[label] = _cached(key)
+        if curves[label] is None:
+            n = len(sample[label])
+            for other in scorer.labels:
+                batch[other].append(np.repeat(grids[features.index(label)], n) if other == label
+                                    else np.tile(sample[other], points))
+            parts.append((label, n * points))
+
+    base_risk = np.nan
+    if parts:
+        risk = scorer.predict({label: np.concatenate(values) for label, values in batch.items()})
+        offset = 0
+        for name, size in parts:
+            block = risk[offset:offset + size]
+            offset += size
+            if name == 'base':
+                base_risk = float(block[0])
+            elif name == 'surface':
+                surface = block.reshape((points,) * len(features))
+                _store(surface_key, surface)
+            else:
+                # Mean over the sample rows that score, per grid value.
+                block = block.reshape(points, -1)
+                scored = ~np.isnan(block)
+                count = scored.sum(axis=1)
+                total = np.where(scored, block, 0.0).sum(axis=1)
+                curves[name] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+                _store(pd_keys[name], curves[name])
+    return Surface(features, grids, surface, base_risk, curves)
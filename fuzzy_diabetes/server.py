@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""Standalone HTTP scoring service for a fitted fuzzy diabetes risk model.
+
+The model (an ``.npz`` from ``python -m fuzzy_diabetes.model``) is loaded
+once at startup; nothing here imports Streamlit, matplotlib or seaborn.
+
+Endpoints (JSON in, JSON out):
+
+* ``POST /score`` -- one patient object, e.g. ``{"glucose": 148, "bmi": 33.6,
+  ...}`` (antecedent labels or Pima column names); concurrent requests are
+  micro-batched into one vectorised `BatchRiskScorer.predict` call, so it
+  returns what ``/score/batch`` and `BatchRiskScorer.predict` return for the
+  same row (to floating-point rounding).  With ``--cache-mb`` (off by
+  default) rows seen before are answered from a `PredictionCache`, which
+  scores inputs rounded to each universe step; ``/stats`` then reports that
+  tolerance per input,
+* ``POST /score/batch`` -- ``{"patients": [...]}``, scored in one call,
+* ``GET /health`` and ``GET /stats`` (request counts, p50/p99 latency per
+  endpoint, micro-batch sizes, prediction-cache hits, evictions and input
+  tolerance, per-column counts of missing, invalid and out-of-universe inputs).
+
+Zeros and missing values in the zero-as-missing columns are imputed with the
+model's medians, as in the dashboard.  `ScoringService.handle` is the whole
+request path minus the socket, so `ScoringClient` exercises it in process:
+
+    client = ScoringClient(ScoringService(load_model('model.npz')))
+    status, body = client.post('/score', {'glucose': 148, ...})
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .inference import BatchRiskScorer
+from .model import load_model
+from .prediction_cache import DEFAULT_MAX_BYTES, PredictionCache
+from .preprocess import apply_imputation
+from .schema import INPUT_COLUMNS, OUTPUT_LABEL
+from .validation import OUT_OF_RANGE_POLICIES, InputReport
+
+# Largest micro-batch and how long the first request in it may wait; with no
+# wait a batch is whatever queued up while the previous one was scored.
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT = 0.0
+# Recent latencies kept per endpoint for the percentiles.
+LATENCY_WINDOW = 10_000
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(ValueError):
+    """Client error, reported as HTTP 400."""
+
+
+class LatencyStats(object):
+    """Thread-safe ring buffer of recent latencies with percentile summaries."""
+
+    def __init__(self, capacity=LATENCY_WINDOW):
+        self._values = np.zeros(capacity)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._values[self.count % len(self._values)] = seconds
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            recent = self._values[:min(self.count, len(self._values))].copy()
+            count = self.count
+        if not len(recent):
+            return {'count': count}
+        p50, p99 = np.percentile(recent, [50, 99]) * 1e3
+        return {'count': count, 'p50_ms': float(p50), 'p99_ms': float(p99),
+                'mean_ms': float(recent.mean() * 1e3)}
+
+
+class MicroBatcher(object):
+    """Coalesce concurrent single-row requests into batched calls.
+
+    ``score(rows)`` receives an ``(n, n_variables)`` array.  A background
+    thread takes the first queued row, gathers whatever else arrives within
+    ``max_wait`` seconds (up to ``max_batch`` rows) and scores them together.
+    """
+
+    def __init__(self, score, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT):
+        self.score = score
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait)
+        self.batches = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def summary(self):
+        with self._lock:
+            batches, rows = self.batches, self.rows
+        return {'batches': batches, 'rows': rows,
+                'mean_size': rows / batches if batches else 0.0}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else \
+                        self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                pending.append(item)
+            # Counted before the futures resolve, so a caller that has its
+            # result also sees its batch in `summary`.
+            with self._lock:
+                self.batches += 1
+                self.rows += len(pending)
+            try:
+                scores = self.score(np.array([row for row, _ in pending]))
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+            else:
+                for (_, future), score in zip(pending, scores):
+                    future.set_result(score)
+
+
+class ScoringService(object):
+    """Request handling for a loaded model, independent of the transport.
+
+    Parameters
+    ----------
+    model : dict
+        Fitted model (see `fuzzy_diabetes.model`).
+    max_batch, max_wait : optional
+        `MicroBatcher` settings for ``/score``.
+    scorer_options : dict, optional
+        Extra `BatchRiskScorer` arguments (e.g. ``defuzzify='analytic'``).
+    cache_bytes : int, optional
+        Size bound of a `PredictionCache` for both endpoints.  The default, 0,
+        scores every row exactly; a cache scores rows rounded to the
+        universe steps.
+    """
+
+    def __init__(self, model, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT,
+                 scorer_options=None, cache_bytes=0):
+        self.model = model
+        self.scorer = BatchRiskScorer.from_model(model, **(scorer_options or {}))
+        self.cache = PredictionCache(cache_bytes) if cache_bytes else None
+        self.labels = self.scorer.labels
+        # Accept antecedent labels and Pima column names alike.
+        self._keys = {}
+        for i, label in enumerate(self.labels):
+            self._keys[label] = i
+            self._keys[INPUT_COLUMNS.get(label, label)] = i
+        self._imputed = {label for label in self.labels
+                         if INPUT_COLUMNS.get(label, label) in model['medians']}
+        self.inputs = InputReport(self.labels)
+        self.batcher = MicroBatcher(self.score_rows, max_batch, max_wait)
+        self.latency = {path: LatencyStats() for path in ('/score', '/score/batch')}
+        self._routes = {
+            ('GET', '/health'): self._health,
+            ('GET', '/stats'): self._stats,
+            ('POST', '/score'): self._score_one,
+            ('POST', '/score/batch'): self._score_batch,
+        }
+
+    def close(self):
+        self.batcher.close()
+
+    # --- Scoring ---
+    def parse_patient(self, patient):
+        """One patient object -> input row in ``self.labels`` order (NaN if absent)."""
+        if not isinstance(patient, dict):
+            raise BadRequest("Each patient must be a JSON object.")
+        row = np.full(len(self.labels), np.nan)
+        for key, value in patient.items():
+            i = self._keys.get(key)
+            if i is None or value is None:
+                continue
+            try:
+                row[i] = float(value)
+            except (TypeError, ValueError):
+                raise BadRequest(f"'{key}' must be a number, got {value!r}") from None
+        missing = [label for label, value in zip(self.labels, row)
+                   if np.isnan(value) and label not in self._imputed]
+        if missing:
+            raise BadRequest(f"Missing required inputs: {', '.join(missing)}")
+        return row
+
+    def score_rows(self, rows):
+        """Impute and score an ``(n, n_variables)`` array of raw inputs."""
+        columns = {INPUT_COLUMNS.get(label, label): rows[:, i]
+                   for i, label in enumerate(self.labels)}
+        apply_imputation(columns, self.model['medians'])
+        rows = np.column_stack(list(columns.values()))
+        if self.cache is None:
+            return self.scorer.predict(rows, self.inputs)
+        return self.cache.predict(self.scorer, self.model['key'], rows, self.inputs)
+
+    # --- Endpoints ---
+    def _health(self, payload):
+        return 200, {'status': 'ok', 'model': self.model['key']}
+
+    def _stats(self, payload):
+        return 200, {
+            'model': self.model['key'],
+            'latency': {path: stats.summary() for path, stats in self.latency.items()},
+            'micro_batches': self.batcher.summary(),
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'inputs': self.inputs.as_dict(),
+        }
+
+    def _score_one(self, payload):
+        risk = self.batcher.submit(self.parse_patient(payload)).result()
+        return 200, {OUTPUT_LABEL: _json_float(risk)}
+
+    def _score_batch(self, payload):
+        patients = payload.get('patients') if isinstance(payload, dict) else payload
+        if not isinstance(patients, list):
+            raise BadRequest("Expected {\"patients\": [...]}.")
+        if not patients:
+            return 200, {OUTPUT_LABEL: []}
+        rows = []
+        for i, patient in enumerate(patients):
+            try:
+                rows.append(self.parse_patient(patient))
+            except BadRequest as exc:
+                raise BadRequest(f"patients[{i}]: {exc}") from None
+        risks = self.score_rows(np.array(rows))
+        return 200, {OUTPUT_LABEL: [_json_float(r) for r in risks]}
+
+    def handle(self, method, path, body=b''):
+        """Serve one request; returns ``(status, JSON-serialisable body)``."""
+        start = time.perf_counter()
+        path = path.split('?', 1)[0].rstrip('/') or '/'
+        route = self._routes.get((method, path))
+        if route is None:
+            return 404, {'error': f"No route for {method} {path}"}
+        try:
+            payload = json.loads(body) if body else None
+            status, result = route(payload)
+        except json.JSONDecodeError as exc:
+            status, result = 400, {'error': f"Invalid JSON: {exc}"}
+        except BadRequest as exc:
+            status, result = 400, {'error': str(exc)}
+        except Exception as exc:
+            # Includes scoring errors raised in the micro-batcher thread and
+            # re-raised here by the future; that thread keeps running.
+            logger.exception("%s %s failed", method, path)
+            status, result = 500, {'error': f"Internal error: {type(exc).__name__}"}
+        if path in self.latency:
+            self.latency[path].record(time.perf_counter() - start)
+        return status, result
+
+
+def _json_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+class ScoringClient(object):
+    """In-process client: the HTTP request path without a socket."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, path):
+        return self.service.handle('GET', path)
+
+    def post(self, path, payload):
+        return self.service.handle('POST', path, json.dumps(payload).encode())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; don't let Nagle hold the body.
+    disable_nagle_algorithm = True
+    service = None
+
+    def _respond(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        status, result = self.service.handle(method, self.path, self.rfile.read(length))
+        body = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host='127.0.0.1', port=8000):
+    """Threaded HTTP server for ``service`` (call ``serve_forever()`` on it)."""
+    handler = type('ScoringHandler', (_Handler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve fuzzy diabetes risk scores over HTTP.")
+    parser.add_argument('model', help="Fitted model .npz (python -m fuzzy_diabetes.model)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT * 1e3,
+                        help="How long a request may wait to be micro-batched")
+    parser.add_argument('--defuzzify', default='sampled',
+                        choices=['sampled', 'analytic', 'table'])
+    parser.add_argument('--out-of-range', default='clamp', choices=OUT_OF_RANGE_POLICIES,
+                        help="Inputs outside a universe: clamp, extend it, or reject the row")
+    parser.add_argument('--cache-mb', type=float, default=0.0,
+                        help="Cache predictions of inputs rounded to the universe steps, "
+                             f"bounded in MiB (e.g. {DEFAULT_MAX_BYTES / 2 ** 20:g}); "
+                             "off by default")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    service = ScoringService(load_model(args.model), args.max_batch, args.max_wait_ms / 1e3,
+                             {'defuzzify': args.defuzzify, 'out_of_range': args.out_of_range},
+                             int(args.cache_mb * 2 ** 20))
+    server = make_server(service, args.host, args.port)
+    print(f"Serving model {service.model['key'][:16]} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Whole-array input validation and the out-of-universe policy.
+
+Universes are fitted as ``min * 0.9 .. max * 1.1`` of the training data, so
+live values can fall outside them.  `validate_columns` checks every input
+column once per batch, before any inference work:
+
+* NaN counts as ``missing`` (imputation normally removes it first),
+* +/-inf counts as ``invalid`` and is turned into NaN, so the row scores NaN,
+* values below/above the universe are counted and handled by the policy:
+
+  ``'clamp'``
+      evaluate them at the nearest universe bound, as
+      ``ControlSystemSimulation(clip_to_bounds=True)`` does (the default);
+  ``'extend'``
+      evaluate the Gaussian terms at the value itself, which is what
+      widening the universe to cover it would give;
+  ``'reject'``
+      score the row NaN and count it as ``rejected``.
+
+Nothing raises on data values, so one bad row never fails a batch.
+`InputReport` accumulates the counts across batches.
+"""
+
+import threading
+
+import numpy as np
+
+OUT_OF_RANGE_POLICIES = ('clamp', 'extend', 'reject')
+COUNTERS = ('missing', 'invalid', 'below', 'above')
+
+
+class InputReport(object):
+    """Per-column counts of missing, invalid and out-of-universe values."""
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.rows = 0
+        self.rejected = 0
+        self.counts = np.zeros((len(self.labels), len(COUNTERS)), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def add(self, rows, counts, rejected=0):
+        with self._lock:
+            self.rows += int(rows)
+            self.rejected += int(rejected)
+            self.counts += counts
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'rows': self.rows,
+                'rejected': self.rejected,
+                'columns': {label: dict(zip(COUNTERS, map(int, row)))
+                            for label, row in zip(self.labels, self.counts)},
+            }
+
+
+def validate_columns(cols, variables, policy='clamp', report=None):
+    """Apply the out-of-universe ``policy`` to input columns.
+
+    Parameters
+    ----------
+    cols : list of 1d arrays
+        One column per variable, in ``variables`` order.
+    variables : list of InputVariable
+        Universe bounds (``lo``/``hi``) per column.
+    policy : {'clamp', 'extend', 'reject'}, optional
+    report : InputReport, optional
+        Receives this batch's counts.
+
+    Returns
+    -------
+    cols : list of 1d arrays
+        Inputs to score; a column is copied only when it held infinities.
+    rejected : 1d bool array or None
+        Rows to score NaN (``'reject'`` only; None when nothing is rejected).
+    """
+    if policy not in OUT_OF_RANGE_POLICIES:
+        raise ValueError(f"Unknown out-of-range policy '{policy}'")
+    n = len(cols[0]) if cols else 0
+    counts = np.zeros((len(cols), len(COUNTERS)), dtype=np.int64)
+    rejected = None
+    out = []
+    for i, (v, x) in enumerate(zip(variables, cols)):
+        missing = np.isnan(x)
+        invalid = np.isinf(x)
+        below = x < v.lo
+        above = x > v.hi
+        counts[i] = [np.count_nonzero(missing), np.count_nonzero(invalid),
+                     np.count_nonzero(below & ~invalid), np.count_nonzero(above & ~invalid)]
+        if counts[i, 1]:
+            x = np.where(invalid, np.nan, x)
+        if policy == 'reject' and (counts[i, 2] or counts[i, 3]):
+            outside = below | above
+            if counts[i, 1]:
+                outside &= ~invalid
+            rejected = outside if rejected is None else rejected | outside
+        out.append(x)
+    if report is not None:
+        report.add(n, counts, 0 if rejected is None else np.count_nonzero(rejected))
+    return out, rejected
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.bench import synthetic_pima
+from fuzzy_diabetes.model import fit_model
+from fuzzy_diabetes.preprocess import apply_imputation
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+
+
+@pytest.fixture(scope='session')
+def frame():
+    return synthetic_pima(2000, seed=0)
+
+
+@pytest.fixture(scope='session')
+def model(frame):
+    return fit_model(frame, seed=0, n_clusters_range=(), n_jobs=1)
+
+
+@pytest.fixture(scope='session')
+def inputs(frame, model):
+    """Imputed antecedent inputs of ``frame``, keyed by label."""
+    columns = apply_imputation({col: np.asarray(frame[col], dtype=np.float64)
+                                for col in INPUT_COLUMNS.values()}, model['medians'])
+    return {label: columns[col] for label, col in INPUT_COLUMNS.items()}
@@ -0,0 +1,51 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.categories import categorize, risk_breaks
+from fuzzy_diabetes.model import learn_thresholds
+
+
+def _brute_force_sse(values, k):
+    """Smallest total within-class SSE over every split of sorted ``values``."""
+    best = np.inf
+    for cuts in combinations(range(1, len(values)), k - 1):
+        parts = np.split(values, cuts)
+        best = min(best, sum(((p - p.mean()) ** 2).sum() for p in parts))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_breaks_are_optimal(seed):
+    rng = np.random.default_rng(seed)
+    scores = np.round(rng.gamma(2.0, 15.0, 14), 1)
+    breaks = risk_breaks(scores, k=3)
+    assert breaks.sse == pytest.approx(_brute_force_sse(np.sort(scores), 3))
+    assert breaks.counts.sum() == len(scores)
+    np.testing.assert_array_equal(np.bincount(categorize(scores, breaks.thresholds)),
+                                  breaks.counts)
+
+
+def test_histogram_mode_close_to_exact():
+    scores = np.random.default_rng(0).normal(40.0, 12.0, 50_000)
+    exact = risk_breaks(scores, bins=None)
+    binned = risk_breaks(scores, bins=4096)
+    cell = (scores.max() - scores.min()) / 4096
+    np.testing.assert_allclose(binned.thresholds, exact.thresholds, atol=2 * cell)
+
+
+def test_nan_scores_are_ignored():
+    scores = np.array([10.0, np.nan, 11.0, 50.0, 52.0, 90.0, np.nan])
+    breaks = risk_breaks(scores)
+    assert breaks.counts.sum() == 5
+    assert categorize(scores, breaks.thresholds)[1] == -1
+
+
+def test_too_few_distinct_scores(model):
+    with pytest.raises(ValueError):
+        risk_breaks(np.array([30.0, 30.0, 60.0]))
+    # A fit on such data keeps its F1 threshold and leaves the breaks out.
+    columns = {v['column']: np.full(6, v['centers'][0]) for v in model['variables'].values()}
+    thresholds = learn_thresholds(model, columns, np.array([0, 1, 0, 1, 0, 1.0]))
+    assert 'f1_optimal' in thresholds and 'low_medium' not in thresholds
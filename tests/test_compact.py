@@ -0,0 +1,26 @@
+import numpy as np
+
+from fuzzy_diabetes.compact import CompactModel
+from fuzzy_diabetes.inference import BatchRiskScorer
+
+# Score change from storing the parameters in float32, in risk points.
+FLOAT32_TOLERANCE = 0.01
+
+
+def test_float64_scores_match_model(model, inputs):
+    expected = BatchRiskScorer.from_model(model).predict(inputs)
+    risk = CompactModel.from_model(model, dtype=np.float64).scorer().predict(inputs)
+    np.testing.assert_allclose(risk, expected, rtol=0, atol=1e-9)
+
+
+def test_float32_scores_within_tolerance(model, inputs):
+    expected = CompactModel.from_model(model, dtype=np.float64).scorer().predict(inputs)
+    risk = CompactModel.from_model(model).scorer().predict(inputs)
+    np.testing.assert_allclose(risk, expected, atol=FLOAT32_TOLERANCE)
+
+
+def test_model_dict_round_trip(model, inputs):
+    compact = CompactModel.from_model(model, dtype=np.float64)
+    expected = BatchRiskScorer.from_model(model).predict(inputs)
+    risk = BatchRiskScorer.from_model(compact.to_model()).predict(inputs)
+    np.testing.assert_allclose(risk, expected, rtol=0, atol=1e-9)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from fuzzy_diabetes.compiler import compile_rules
+from fuzzy_diabetes.inference import BatchRiskScorer, RuleSpec
+
+
+def _naive(expr, memberships, term_index):
+    kind = expr[0]
+    if kind == 'term':
+        vi, ti = term_index[(expr[1], expr[2])]
+        return memberships[vi][:, ti]
+    if kind == 'not':
+        return 1.0 - _naive(expr[1], memberships, term_index)
+    func = np.fmin if kind == 'and' else np.fmax
+    values = [_naive(child, memberships, term_index) for child in expr[1:]]
+    return func.reduce(values)
+
+
+def _check(rules, memberships, term_index, output_names):
+    plan = compile_rules(rules, output_names)
+    strengths = plan.fire(memberships, term_index)
+    expected = np.array([_naive(rule.antecedent, memberships, term_index) for rule in rules])
+    np.testing.assert_array_equal(strengths, expected)
+    cuts = plan.activate(strengths)
+    for oi, name in enumerate(output_names):
+        fired = [expected[r] * rule.weight for r, rule in enumerate(rules)
+                 if rule.consequent == name]
+        np.testing.assert_array_equal(cuts[oi], np.max(fired, axis=0) if fired else 0.0)
+    return plan
+
+
+def test_plan_matches_naive_evaluation(model, inputs):
+    scorer = BatchRiskScorer.from_model(model)
+    memberships = scorer.fuzzify(scorer.columns(inputs))
+    term_index = {(v.label, name): (vi, ti) for vi, v in enumerate(scorer.variables)
+                  for ti, name in enumerate(v.terms)}
+    plan = _check(scorer.rules, memberships, term_index, scorer.output_names)
+    stats = plan.stats()
+    assert stats['term_fetches'] <= stats['naive_term_fetches']
+    assert stats['operations'] <= stats['naive_operations']
+
+
+def test_shared_and_negated_subexpressions():
+    rng = np.random.default_rng(0)
+    memberships = [rng.random((50, 3)), rng.random((50, 2))]
+    term_index = {('a', name): (0, i) for i, name in enumerate('xyz')}
+    term_index.update({('b', name): (1, i) for i, name in enumerate('pq')})
+    x, y, z = (('term', 'a', name) for name in 'xyz')
+    p, q = (('term', 'b', name) for name in 'pq')
+    rules = [
+        RuleSpec('r0', ('and', x, ('and', p, y)), 'high', 1.0),
+        RuleSpec('r1', ('and', y, x, q), 'high', 0.5),
+        RuleSpec('r2', ('or', ('not', ('and', x, y)), z), 'low', 1.0),
+        RuleSpec('r3', ('and', ('or', z, p), ('or', p, z), x), 'low', 0.25),
+        RuleSpec('r4', ('not', p), 'low', 1.0),
+    ]
+    plan = _check(rules, memberships, term_index, ['low', 'high', 'unused'])
+    # x & y is shared by three rules and each term is fetched once.
+    assert plan.stats()['term_fetches'] == len(term_index)
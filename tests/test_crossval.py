@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.crossval import cross_validate, stratified_folds
+from fuzzy_diabetes.evaluation import ScoreCurve
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.model import fit_model
+from fuzzy_diabetes.preprocess import ZERO_AS_MISSING, apply_imputation, imputation_medians
+from fuzzy_diabetes.schema import INPUT_COLUMNS, TARGET_COLUMN
+
+SPLITS = 3
+
+
+@pytest.fixture(scope='module')
+def report(frame):
+    return cross_validate(frame, n_splits=SPLITS, n_jobs=1, seed=0)
+
+
+def test_folds_are_stratified(frame):
+    y = np.asarray(frame[TARGET_COLUMN])
+    folds = stratified_folds(y, SPLITS, n_repeats=2, seed=0)
+    assert folds.shape == (2, len(y))
+    for repeat in folds:
+        for c in (0, 1):
+            sizes = np.bincount(repeat[y == c], minlength=SPLITS)
+            assert sizes.max() - sizes.min() <= 1
+
+
+def test_fold_matches_pipeline(frame, report):
+    # Fold 0 redone by hand: fit on the training rows, threshold them, score the rest.
+    test = stratified_folds(frame[TARGET_COLUMN], SPLITS, seed=0)[0] == 0
+    train = {col: np.asarray(frame[col], dtype=np.float64)[~test] for col in frame}
+    held_out = {col: np.asarray(frame[col], dtype=np.float64)[test] for col in frame}
+    medians = imputation_medians(train, ZERO_AS_MISSING)
+    model = fit_model(train, n_clusters_range=(), seed=0, n_jobs=1, medians=medians)
+    scorer = BatchRiskScorer.from_model(model)
+
+    def curve(part):
+        apply_imputation(part, medians)
+        scores = scorer.predict({label: part[col] for label, col in INPUT_COLUMNS.items()})
+        return ScoreCurve(part[TARGET_COLUMN], scores)
+
+    threshold = curve(train).f1_optimal()[0]
+    expected = curve(held_out).metrics(threshold)
+    fold = report['folds'][0]
+    # The dashboard's decision rule: the exact threshold, not a rounded one.
+    assert fold['threshold'] == threshold
+    for name, value in expected.items():
+        assert fold[name] == pytest.approx(value)
+
+
+def test_parallel_matches_serial(frame, report):
+    parallel = cross_validate(frame, n_splits=SPLITS, n_jobs=2, seed=0)
+    for serial_fold, parallel_fold in zip(report['folds'], parallel['folds']):
+        for name in ('accuracy', 'f1', 'auc', 'threshold'):
+            assert parallel_fold[name] == serial_fold[name]
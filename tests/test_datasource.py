@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from fuzzy_diabetes import datasource
+from fuzzy_diabetes.datasource import (DatasetError, load_columns, read_snapshot_meta,
+                                       snapshot_dir)
+from fuzzy_diabetes.schema import COLUMN_DTYPES
+
+pd = pytest.importorskip('pandas')
+
+
+def _write_csv(frame, path, rows):
+    pd.DataFrame({col: np.asarray(frame[col])[rows] for col in COLUMN_DTYPES}).to_csv(
+        path, index=False)
+
+
+@pytest.fixture
+def csv(frame, tmp_path):
+    path = tmp_path / 'pima.csv'
+    _write_csv(frame, path, slice(0, 100))
+    return path
+
+
+def test_snapshot_matches_csv_and_survives_source(csv, tmp_path):
+    cache = tmp_path / 'cache'
+    columns, meta = load_columns(csv, cache)
+    expected = pd.read_csv(csv)
+    for col in COLUMN_DTYPES:
+        np.testing.assert_array_equal(columns[col], expected[col])
+        assert not columns[col].flags.writeable
+    os.remove(csv)
+    columns, again = load_columns(csv, cache)
+    assert again == meta
+    assert len(columns['Glucose']) == 100
+
+
+def test_new_content_replaces_snapshot(csv, frame, tmp_path):
+    cache = tmp_path / 'cache'
+    old_columns, old = load_columns(csv, cache)
+    old_dir = snapshot_dir(csv, cache)
+    _write_csv(frame, csv, slice(100, 250))
+    os.utime(csv, ns=(1, 1))
+    columns, meta = load_columns(csv, cache)
+    assert meta['content_sha256'] != old['content_sha256']
+    assert len(columns['Glucose']) == 150
+    assert snapshot_dir(csv, cache) != old_dir and not os.path.exists(old_dir)
+    # Arrays mapped from the superseded snapshot stay readable.
+    assert len(np.asarray(old_columns['Glucose'])) == 100
+    current = {snapshot_dir(csv, cache), datasource.snapshot_pointer(csv, cache)}
+    assert {os.path.join(cache, entry) for entry in os.listdir(cache)} == current
+
+
+def test_failed_swap_keeps_last_snapshot(csv, frame, tmp_path, monkeypatch):
+    cache = tmp_path / 'cache'
+    _, old = load_columns(csv, cache)
+    _write_csv(frame, csv, slice(100, 250))
+    os.utime(csv, ns=(1, 1))
+
+    def crash(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(datasource.os, 'replace', crash)
+    with pytest.raises(OSError):
+        load_columns(csv, cache)
+    monkeypatch.undo()
+    assert read_snapshot_meta(csv, cache) == old
+    glucose = os.path.join(snapshot_dir(csv, cache), old['files']['Glucose'])
+    assert len(np.load(glucose)) == 100
+    assert not [entry for entry in os.listdir(cache) if entry.startswith('.')]
+
+
+def test_invalid_dataset(tmp_path):
+    path = tmp_path / 'bad.csv'
+    pd.DataFrame({'Glucose': [1, 2]}).to_csv(path, index=False)
+    with pytest.raises(DatasetError):
+        load_columns(path, tmp_path / 'cache')
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.bench import synthetic_pima
+from fuzzy_diabetes.drift import DriftMonitor, FeatureSketch, ks, psi
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+
+
+@pytest.fixture(scope='module')
+def live():
+    return synthetic_pima(3000, seed=1)
+
+
+def test_sketch_matches_direct_summaries(model, live):
+    variable = model['variables']['glucose']
+    x = np.r_[live['Glucose'], np.nan, -5.0, 1e4]
+    sketch = FeatureSketch(variable, zero_as_missing=True)
+    sketch.update(x)
+    present = x[~np.isnan(x) & (x != 0)]
+    assert sketch.missing == len(x) - len(present)
+    assert (sketch.below, sketch.above) == (np.sum(present < sketch.lo),
+                                            np.sum(present > sketch.hi))
+    inside = present[(present >= sketch.lo) & (present <= sketch.hi)]
+    cells = np.floor((inside - sketch.lo) * (sketch.bins / (sketch.hi - sketch.lo)))
+    counts = np.bincount(np.minimum(cells, sketch.bins - 1).astype(int), minlength=sketch.bins)
+    np.testing.assert_array_equal(sketch.counts, counts)
+    clipped = np.clip(present, sketch.lo, sketch.hi)
+    mass = np.exp(-0.5 * ((clipped[:, None] - sketch.centers) / sketch.sigmas) ** 2).sum(axis=0)
+    np.testing.assert_allclose(sketch.term_mass, mass)
+
+
+def test_merged_sketches_equal_one_pass(model, live):
+    variable = model['variables']['bmi']
+    whole, first, second = (FeatureSketch(variable, zero_as_missing=True) for _ in range(3))
+    whole.update(live['BMI'])
+    first.update(live['BMI'][:1234])
+    second.update(live['BMI'][1234:])
+    first.merge(second)
+    np.testing.assert_array_equal(first.distribution(), whole.distribution())
+    assert first.missing == whole.missing
+    np.testing.assert_allclose(first.term_mass, whole.term_mass)
+
+
+def test_ks_is_a_lower_bound_of_the_exact_statistic(model, frame, live):
+    stats = pytest.importorskip('scipy.stats')
+    variable = model['variables']['glucose']
+    reference, current = FeatureSketch(variable), FeatureSketch(variable)
+    reference.update(frame['Glucose'])
+    current.update(live['Glucose'] + 7)
+    exact = stats.ks_2samp(frame['Glucose'], live['Glucose'] + 7).statistic
+    value = ks(reference.distribution(), current.distribution())
+    assert value <= exact + 1e-12
+    assert value == pytest.approx(exact, abs=0.02)
+
+
+def test_psi_of_identical_and_shifted_counts():
+    counts = np.arange(1, 101, dtype=np.float64)
+    assert psi(counts, 3 * counts) == pytest.approx(0.0)
+    assert psi(counts, counts[::-1]) > 0.25
+    assert np.isnan(psi(counts, np.zeros(100)))
+
+
+def test_same_distribution_is_not_flagged(model, frame, live):
+    monitor = DriftMonitor(model, frame, window_rows=len(live['Glucose']))
+    (report,) = monitor.update(live)
+    assert report['rows'] == len(live['Glucose'])
+    assert report['flagged'] == {}
+
+
+def test_shifted_column_is_flagged(model, frame, live):
+    shifted = dict(live, Glucose=live['Glucose'] + 40)
+    report = DriftMonitor(model, frame, window_rows=len(live['Glucose'])).update(shifted)[0]
+    assert {'psi_alert', 'ks', 'term_mass'} <= set(report['flagged']['glucose'])
+    assert set(report['flagged']) == {'glucose'}
+
+
+def test_windows_and_cumulative_report(model, frame, live):
+    monitor = DriftMonitor(model, frame, window_rows=1000, history=2)
+    closed = []
+    for start in range(0, 2500, 700):
+        closed += monitor.update({col: values[start:min(start + 700, 2500)]
+                                  for col, values in live.items()})
+    assert [report['rows'] for report in closed] == [1000, 1000]
+    assert len(monitor.reports) == 2 and monitor.rows_seen == 2500
+    assert monitor.cumulative_report()['rows'] == 2500
+    monitor.update({col: values[2500:] for col, values in live.items()})
+    assert len(monitor.reports) == 2
+    assert set(monitor.report()['features']) == set(INPUT_COLUMNS)
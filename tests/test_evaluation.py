@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from sklearn import metrics as skm
+
+from fuzzy_diabetes.evaluation import ScoreCurve, classification_report
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.schema import TARGET_COLUMN
+
+
+@pytest.fixture(scope='module', params=['exact', 'tied'])
+def scored(request, frame, model, inputs):
+    scores = BatchRiskScorer.from_model(model).predict(inputs)
+    if request.param == 'tied':
+        scores = np.round(scores)
+    return np.asarray(frame[TARGET_COLUMN]), scores
+
+
+def test_curves_match_sklearn(scored):
+    y, scores = scored
+    curve = ScoreCurve(y, scores)
+    fpr, tpr, thresholds = skm.roc_curve(y, scores, drop_intermediate=False)
+    for got, expected in zip(curve.roc_curve(), (fpr, tpr, thresholds)):
+        np.testing.assert_allclose(got, expected)
+    precision, recall, thresholds = skm.precision_recall_curve(y, scores)
+    got = curve.precision_recall_curve()
+    # sklearn drops the thresholds below the one reaching full recall.
+    skip = len(got[2]) - len(thresholds)
+    np.testing.assert_allclose(got[0][skip:], precision)
+    np.testing.assert_allclose(got[1][skip:], recall)
+    np.testing.assert_allclose(got[2][skip:], thresholds)
+    assert curve.auc() == pytest.approx(skm.roc_auc_score(y, scores))
+
+
+def test_threshold_metrics_match_sklearn(scored):
+    y, scores = scored
+    curve = ScoreCurve(y, scores)
+    threshold, best = curve.f1_optimal()
+    candidates = np.unique(scores)
+    predicted = scores >= candidates[:, None]
+    tp = (predicted & (y == 1)).sum(axis=1)
+    f1s = 2 * tp / (predicted.sum(axis=1) + (y == 1).sum())
+    assert best == pytest.approx(f1s.max())
+    assert threshold == candidates[np.argmax(f1s)]
+    assert best == pytest.approx(skm.f1_score(y, scores >= threshold))
+    for t in (threshold, np.median(scores), scores.max() + 1):
+        predicted = (scores >= t).astype(int)
+        cm = skm.confusion_matrix(y, predicted, labels=[0, 1])
+        np.testing.assert_array_equal(curve.confusion_matrix(t), cm)
+        assert curve.metrics(t) == pytest.approx({
+            'accuracy': skm.accuracy_score(y, predicted),
+            'precision': skm.precision_score(y, predicted, zero_division=0),
+            'recall': skm.recall_score(y, predicted),
+            'f1': skm.f1_score(y, predicted, zero_division=0),
+        })
+        assert classification_report(cm) == skm.classification_report(
+            y, predicted, target_names=['0', '1'], zero_division=0)
+
+
+def test_bootstrap_intervals_cover_the_estimate(scored):
+    y, scores = scored
+    curve = ScoreCurve(y, scores)
+    threshold = curve.f1_optimal()[0]
+    intervals = curve.bootstrap(threshold, n_boot=300, seed=0)
+    estimates = dict(curve.metrics(threshold), auc=curve.auc(),
+                     f1_optimal=curve.f1_optimal()[1])
+    for name, (low, high) in intervals.items():
+        assert low <= estimates[name] <= high
+    assert curve.bootstrap(threshold, n_boot=300, seed=0) == intervals
+
+
+def test_rejects_nan_scores():
+    with pytest.raises(ValueError):
+        ScoreCurve([0, 1], [0.5, np.nan])
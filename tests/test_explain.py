@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.inference import BatchRiskScorer, _top_rules
+
+# float32 strengths, with up to 8 low mantissa bits used to rank ties.
+RANK_TOLERANCE = 2.0 ** -15
+
+
+@pytest.fixture(scope='module')
+def scorer(model):
+    return BatchRiskScorer.from_model(model)
+
+
+def test_explain_matches_predict(scorer, inputs):
+    explanation = scorer.explain(inputs, top_k=4)
+    np.testing.assert_array_equal(explanation.risk, scorer.predict(inputs))
+    strengths = scorer.fire(scorer.fuzzify(scorer.columns(inputs)))
+    np.testing.assert_allclose(explanation.strengths, strengths, rtol=1e-6, atol=1e-7)
+    assert explanation.rule_labels == [rule.label for rule in scorer.rules]
+
+
+def test_top_rules_are_the_strongest(scorer, inputs):
+    explanation = scorer.explain(inputs, top_k=4)
+    weighted = explanation.strengths * scorer.plan.weights.astype(np.float32)
+    ranked = np.sort(weighted, axis=1)[:, ::-1][:, :4]
+    top = explanation.top_rules
+    picked = np.where(top >= 0, np.take_along_axis(weighted, np.maximum(top, 0), axis=1), 0)
+    np.testing.assert_allclose(picked, np.where(ranked > 0, ranked, 0),
+                               rtol=RANK_TOLERANCE, atol=0)
+    # -1 only pads rows with fewer than k firing rules.
+    np.testing.assert_array_equal(top < 0, ranked <= 0)
+    row = int(np.argmax(top[:, -1] >= 0))
+    assert [label for label, _ in explanation.contributions(row)] == \
+        [explanation.rule_labels[r] for r in top[row]]
+
+
+def test_missing_rows_have_no_explanation(scorer, inputs):
+    rows = {label: x[:4].copy() for label, x in inputs.items()}
+    rows['bmi'][2] = np.nan
+    explanation = scorer.explain(rows)
+    assert np.isnan(explanation.risk[2]) and np.isnan(explanation.strengths[2]).all()
+    assert (explanation.top_rules[2] == -1).all()
+    assert explanation.contributions(2) == []
+    assert not np.isnan(explanation.strengths[[0, 1, 3]]).any()
+
+
+@pytest.mark.parametrize('n_rules', [5, 300])
+def test_top_rules_helper_matches_argsort(n_rules):
+    rng = np.random.default_rng(0)
+    weighted = rng.random((100, n_rules)).astype(np.float32)
+    weighted[weighted < 0.5] = 0
+    top = _top_rules(weighted, 3)
+    expected = np.argsort(-weighted, axis=1, kind='stable')[:, :3]
+    values = np.take_along_axis(weighted, expected, axis=1)
+    np.testing.assert_array_equal(top, np.where(values > 0, expected, -1))
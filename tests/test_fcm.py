@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.fcm import best_fpc, cmeans_1d, run_fpc_sweep
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+
+N_CLUSTERS_RANGE = range(2, 5)
+# Below skfuzzy's stopping rule so both runs converge to the same point.
+ERROR = 1e-10
+
+
+def test_parallel_sweep_matches_serial(frame):
+    columns = {label: np.asarray(frame[col][:500], dtype=np.float64)
+               for label, col in INPUT_COLUMNS.items()}
+    serial = run_fpc_sweep(columns, N_CLUSTERS_RANGE, restarts=2, n_jobs=1, seed=0)
+    parallel = run_fpc_sweep(columns, N_CLUSTERS_RANGE, restarts=2, n_jobs=2, seed=0)
+    assert len(serial) == len(columns) * len(N_CLUSTERS_RANGE) * 2
+    for field in ('feature', 'n_clusters', 'restart', 'fpc', 'iterations'):
+        np.testing.assert_array_equal(parallel[field], serial[field])
+    for label in columns:
+        fpcs = best_fpc(serial, label, N_CLUSTERS_RANGE)
+        assert np.isfinite(fpcs).all() and ((fpcs > 0) & (fpcs <= 1)).all()
+
+
+@pytest.mark.parametrize('c', [2, 3, 5])
+def test_cmeans_1d_matches_skfuzzy(frame, c):
+    fuzz = pytest.importorskip('skfuzzy')
+    data = np.asarray(frame['Glucose'][:500], dtype=np.float64)
+    centers, u, values, fpc, _ = cmeans_1d(data, c, error=ERROR, binned=False)
+    # Start skfuzzy from the memberships of the same quantile seeding.
+    _, u0, _, _, _ = cmeans_1d(data, c, maxiter=0, binned=False)
+    expected, _, _, _, _, _, expected_fpc = fuzz.cluster.cmeans(
+        data[None, :], c, m=2, error=ERROR, maxiter=1000, init=u0)
+    order = np.argsort(expected.ravel())
+    np.testing.assert_allclose(centers, expected.ravel()[order], rtol=1e-8)
+    assert fpc == pytest.approx(expected_fpc, rel=1e-8)
+
+
+def test_binned_cmeans_matches_raw(frame):
+    data = np.asarray(frame['Age'], dtype=np.float64)
+    centers, _, _, fpc, _ = cmeans_1d(data, 3, error=ERROR, binned=False)
+    binned, _, values, binned_fpc, _ = cmeans_1d(data, 3, error=ERROR, binned=True)
+    assert len(values) < len(data)
+    np.testing.assert_allclose(binned, centers, rtol=1e-9)
+    assert binned_fpc == pytest.approx(fpc, rel=1e-9)
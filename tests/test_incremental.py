@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.bench import synthetic_pima
+from fuzzy_diabetes.incremental import IncrementalModel
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.model import fit_model
+from fuzzy_diabetes.preprocess import apply_imputation
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+
+
+@pytest.fixture(scope='module')
+def base():
+    frame = synthetic_pima(5000, seed=0)
+    return frame, fit_model(frame, seed=0, n_clusters_range=(), n_jobs=1)
+
+
+def _fresh_scores(inc):
+    columns = apply_imputation({col: inc._rows[col].copy() for col in INPUT_COLUMNS.values()},
+                               inc.model['medians'])
+    scorer = BatchRiskScorer.from_model(inc.model, **inc.scorer_options)
+    return scorer.predict({label: columns[col] for label, col in INPUT_COLUMNS.items()})
+
+
+def test_stable_stream_skips_rescore(base):
+    frame, model = base
+    inc = IncrementalModel(model, frame)
+    for seed in range(1, 6):
+        report = inc.update(synthetic_pima(5000, seed=seed))
+        assert not report['full_rescore']
+        # At most the few new rows clipped to a universe that grew.
+        assert report['rescored'] < 50
+    np.testing.assert_allclose(inc.scores, _fresh_scores(inc), atol=1e-9)
+
+
+def test_drift_triggers_rescore(base):
+    frame, model = base
+    inc = IncrementalModel(model, frame)
+    batch = synthetic_pima(5000, seed=1)
+    batch['Glucose'] = np.where(batch['Glucose'] > 0, batch['Glucose'] + 25, 0)
+    report = inc.update(batch)
+    assert report['full_rescore']
+    assert report['rescored'] == inc.n_rows
+    np.testing.assert_allclose(inc.scores, _fresh_scores(inc), atol=1e-9)
+
+
+def test_caller_model_is_not_modified(base):
+    frame, model = base
+    medians = dict(model['medians'])
+    variables = dict(model['variables'])
+    inc = IncrementalModel(model, frame)
+    batch = synthetic_pima(5000, seed=1)
+    batch['Glucose'] = np.where(batch['Glucose'] > 0, batch['Glucose'] + 25, 0)
+    inc.update(batch)
+    assert model['medians'] == medians
+    assert all(model['variables'][label] is v for label, v in variables.items())
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.inference import SKFUZZY_TOLERANCE, BatchRiskScorer
+from fuzzy_diabetes.rules import build_ctrl_rules, trimf
+
+# Closed-form vs sampled centroid on the step-1 risk universe, in risk points.
+CENTROID_TOLERANCE = 0.1
+# Rows simulated one by one with skfuzzy.
+SKFUZZY_ROWS = 200
+
+
+def _control_system(model):
+    ctrl = pytest.importorskip('skfuzzy.control')
+    from skfuzzy import gaussmf
+
+    variables = {}
+    for label, v in model['variables'].items():
+        antecedent = ctrl.Antecedent(v['universe'], label)
+        for name, center, sigma in zip(v['terms'], v['centers'], v['sigmas']):
+            antecedent[name] = gaussmf(antecedent.universe, center, sigma)
+        variables[label] = antecedent
+    output = model['output']
+    consequent = ctrl.Consequent(output['universe'], output['label'])
+    for name, abc in output['terms'].items():
+        consequent[name] = trimf(consequent.universe, abc)
+    variables[output['label']] = consequent
+    return ctrl.ControlSystemSimulation(ctrl.ControlSystem(
+        build_ctrl_rules(model['rules'], variables)))
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')  # skfuzzy's np.maximum call
+def test_batch_matches_control_system(model, inputs):
+    simulation = _control_system(model)
+    expected = np.empty(SKFUZZY_ROWS)
+    for i in range(SKFUZZY_ROWS):
+        for label in model['variables']:
+            simulation.input[label] = inputs[label][i]
+        simulation.compute()
+        expected[i] = simulation.output[model['output']['label']]
+    head = {label: x[:SKFUZZY_ROWS] for label, x in inputs.items()}
+    risk = BatchRiskScorer.from_model(model).predict(head)
+    np.testing.assert_allclose(risk, expected, atol=SKFUZZY_TOLERANCE)
+
+
+@pytest.mark.parametrize('mode', ['analytic', 'table'])
+def test_closed_form_centroid_matches_sampled(model, inputs, mode):
+    sampled = BatchRiskScorer.from_model(model).predict(inputs)
+    risk = BatchRiskScorer.from_model(model, defuzzify=mode).predict(inputs)
+    assert not np.isnan(sampled).any()
+    np.testing.assert_allclose(risk, sampled, atol=CENTROID_TOLERANCE)
+
+
+def test_chunking_does_not_change_scores(model, inputs):
+    whole = BatchRiskScorer.from_model(model).predict(inputs)
+    chunked = BatchRiskScorer.from_model(model, chunk_size=97).predict(inputs)
+    np.testing.assert_allclose(chunked, whole, rtol=0, atol=1e-9)
+
+
+def test_missing_input_scores_nan(model, inputs):
+    row = {label: x[:3].copy() for label, x in inputs.items()}
+    row['glucose'][1] = np.nan
+    risk = BatchRiskScorer.from_model(model).predict(row)
+    assert np.isnan(risk[1]) and not np.isnan(risk[[0, 2]]).any()
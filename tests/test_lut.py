@@ -0,0 +1,30 @@
+import numpy as np
+
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.lut import MAX_POINTS, MembershipLUT
+
+# Score change from interpolated memberships at the default max_error, in risk points.
+LUT_TOLERANCE = 0.01
+
+
+def test_measured_error_within_bound(model):
+    lut = BatchRiskScorer.from_model(model, fuzzify='lut').lut
+    bound = lut.error_bound()
+    for label, error in lut.measured_error().items():
+        assert error <= bound[label]
+        assert error <= lut.max_error
+
+
+def test_lut_scores_match_exact(model, inputs):
+    exact = BatchRiskScorer.from_model(model).predict(inputs)
+    risk = BatchRiskScorer.from_model(model, fuzzify='lut').predict(inputs)
+    np.testing.assert_allclose(risk, exact, atol=LUT_TOLERANCE)
+
+
+def test_subdivision_is_bounded(model):
+    variables = BatchRiskScorer.from_model(model).variables
+    lut = MembershipLUT(variables, max_error=1e-12)
+    for table in lut.tables:
+        assert table.shape[1] + 1 <= MAX_POINTS
+    # The bound reports the precision actually reached.
+    assert max(lut.error_bound().values()) > 1e-12
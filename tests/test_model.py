@@ -0,0 +1,32 @@
+import numpy as np
+
+from fuzzy_diabetes.categories import risk_breaks
+from fuzzy_diabetes.evaluation import ScoreCurve
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.model import fit_model, load_model, save_model
+from fuzzy_diabetes.schema import TARGET_COLUMN
+
+
+def test_learned_thresholds_match_scores(frame, model, inputs):
+    scores = BatchRiskScorer.from_model(model).predict(inputs)
+    y = np.asarray(frame[TARGET_COLUMN])
+    thresholds = model['thresholds']
+    assert thresholds['f1_optimal'] == ScoreCurve(y, scores).f1_optimal()[0]
+    low_medium, medium_high = risk_breaks(scores).thresholds
+    assert (thresholds['low_medium'], thresholds['medium_high']) == (low_medium, medium_high)
+
+
+def test_unlabelled_frame_has_no_thresholds(frame):
+    unlabelled = {col: values for col, values in frame.items() if col != TARGET_COLUMN}
+    model = fit_model(unlabelled, seed=0, n_clusters_range=(), n_jobs=1)
+    assert model['thresholds'] == {}
+
+
+def test_save_load_round_trip(model, inputs, tmp_path):
+    path = tmp_path / 'model.npz'
+    save_model(model, path)
+    loaded = load_model(path)
+    assert loaded['key'] == model['key']
+    assert loaded['thresholds'] == model['thresholds']
+    np.testing.assert_array_equal(BatchRiskScorer.from_model(loaded).predict(inputs),
+                                  BatchRiskScorer.from_model(model).predict(inputs))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.prediction_cache import PredictionCache
+from fuzzy_diabetes.validation import InputReport
+
+
+def _rows(inputs, scorer, n=200):
+    return np.column_stack([inputs[label][:n] for label in scorer.labels])
+
+
+def test_scores_rounded_inputs_within_tolerance(model, inputs):
+    scorer = BatchRiskScorer.from_model(model)
+    cache = PredictionCache()
+    x = _rows(inputs, scorer) + 0.013
+    risk = cache.predict(scorer, model['key'], x)
+    steps = np.array([v.step for v in scorer.variables])
+    np.testing.assert_array_equal(risk, scorer.predict(np.round(x / steps) * steps))
+    tolerance = cache.stats()['tolerance']
+    assert tolerance == {v.label: pytest.approx(v.step / 2) for v in scorer.variables}
+    # The second pass is answered from the cache, with the same scores.
+    np.testing.assert_array_equal(cache.predict(scorer, model['key'], x), risk)
+    stats = cache.stats()
+    assert stats['hits'] >= len(x) and stats['misses'] <= len(x)
+
+
+def test_on_grid_inputs_score_exactly(model, inputs):
+    scorer = BatchRiskScorer.from_model(model)
+    steps = np.array([v.step for v in scorer.variables])
+    x = np.round(_rows(inputs, scorer) / steps) * steps
+    risk = PredictionCache().predict(scorer, model['key'], x)
+    np.testing.assert_allclose(risk, scorer.predict(x), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('policy', ['clamp', 'extend', 'reject'])
+def test_validation_matches_predict(model, inputs, policy):
+    scorer = BatchRiskScorer.from_model(model, out_of_range=policy)
+    x = _rows(inputs, scorer, 20)
+    for i, v in enumerate(scorer.variables):
+        # Just inside the upper bound: rounding to the step can go past it.
+        x[i, i] = v.hi - v.step / 4
+        x[10 + i, i] = v.hi + 10 * v.step
+    x[19, 0] = np.nan
+    expected_report, report = InputReport(scorer.labels), InputReport(scorer.labels)
+    expected = scorer.predict(x, expected_report)
+    risk = PredictionCache().predict(scorer, model['key'], x, report)
+    assert report.as_dict() == expected_report.as_dict()
+    np.testing.assert_array_equal(np.isnan(risk), np.isnan(expected))
+
+
+def test_new_version_invalidates(model, inputs):
+    scorer = BatchRiskScorer.from_model(model)
+    cache = PredictionCache()
+    x = _rows(inputs, scorer, 10)
+    cache.predict(scorer, 'v1', x)
+    cache.predict(scorer, 'v2', x)
+    stats = cache.stats()
+    assert stats['invalidations'] == 1 and stats['hits'] == 0
+
+
+def test_size_bound(model, inputs):
+    scorer = BatchRiskScorer.from_model(model)
+    cache = PredictionCache(max_bytes=4096)
+    cache.predict(scorer, model['key'], _rows(inputs, scorer, 500))
+    stats = cache.stats()
+    assert stats['bytes'] <= 4096 and stats['evictions'] > 0
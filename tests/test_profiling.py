@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from fuzzy_diabetes import profiling
+from fuzzy_diabetes.model import fit_model
+
+
+@pytest.fixture
+def profile():
+    was_enabled = profiling.enabled()
+    profiling.clear()
+    profiling.enable()
+    yield profiling
+    profiling.stage(None)
+    profiling.disable()
+    profiling.clear()
+    if was_enabled:
+        profiling.enable()
+
+
+def _by_name():
+    return {record['name']: record for record in profiling.records()}
+
+
+def test_disabled_is_a_no_op():
+    if profiling.enabled():
+        pytest.skip('profiling enabled from the environment')
+    with profiling.span('ignored') as span:
+        profiling.add('rows', 3)
+        profiling.stage('also_ignored')
+    assert span is profiling.span('other')
+    assert not any(r['name'] in ('ignored', 'also_ignored') for r in profiling.records())
+
+
+def test_nested_spans_and_counters(profile):
+    with profile.span('outer', model='m1'):
+        profile.add('rows', 2)
+        with profile.span('inner'):
+            profile.add('rows', 5)
+            time.sleep(0.01)
+        profile.add('rows')
+    records = _by_name()
+    assert records['inner']['parent'] == 'outer' and records['outer']['parent'] is None
+    assert records['inner']['counters'] == {'rows': 5}
+    assert records['outer']['counters'] == {'rows': 3}
+    assert records['outer']['labels'] == {'model': 'm1'}
+    assert records['outer']['wall_s'] >= records['inner']['wall_s'] >= 0.01
+    assert records['inner']['peak_bytes'] is None
+
+
+def test_stage_closes_the_previous_stage(profile):
+    profile.stage('load')
+    profile.stage('score')
+    with profile.span('predict'):
+        pass
+    profile.stage(None)
+    assert [r['name'] for r in profile.records()] == ['load', 'predict', 'score']
+    assert _by_name()['predict']['parent'] == 'score'
+
+
+def test_spans_nest_per_thread(profile):
+    def work():
+        with profile.span('worker'):
+            profile.add('rows', 1)
+
+    with profile.span('main'):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    records = _by_name()
+    assert records['worker']['parent'] is None
+    assert records['main']['counters'] == {}
+
+
+def test_memory_peak(profile):
+    profile.enable(memory=True)
+    with profile.span('outer'):
+        with profile.span('allocate'):
+            block = np.ones(2_000_000)
+        del block
+    records = _by_name()
+    assert records['allocate']['peak_bytes'] >= 16_000_000
+    assert records['outer']['peak_bytes'] >= records['allocate']['peak_bytes']
+
+
+def test_pipeline_stages_are_recorded(profile, frame):
+    fit_model(frame, seed=0, n_clusters_range=range(2, 4), n_jobs=1)
+    summary = {row['span']: row for row in profile.summary()}
+    assert {'fpc_sweep', 'thresholds'} <= set(summary)
+    assert summary['fpc_sweep']['counters']['cmeans_calls'] > 0
+
+
+def test_exports(profile, tmp_path):
+    with profile.span('score "batch"'):
+        profile.add('rows', 4)
+    prom = tmp_path / 'spans.prom'
+    profile.export(prom)
+    text = prom.read_text()
+    assert 'fuzzy_diabetes_span_calls_total{span="score \\"batch\\""} 1' in text
+    assert 'fuzzy_diabetes_span_counter_total{span="score \\"batch\\"",counter="rows"} 4' in text
+    log = tmp_path / 'spans.jsonl'
+    profile.export(log)
+    profile.export(log)
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert len(lines) == 2 and lines[0]['counters'] == {'rows': 4}
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes import sensitivity
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.preprocess import apply_imputation
+from fuzzy_diabetes.schema import INPUT_COLUMNS
+from fuzzy_diabetes.sensitivity import risk_surface
+
+PD_ROWS = 50
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    sensitivity.clear_cache()
+    yield
+    sensitivity.clear_cache()
+
+
+@pytest.fixture(scope='module')
+def scorer(model):
+    return BatchRiskScorer.from_model(model)
+
+
+@pytest.fixture(scope='module')
+def base(inputs):
+    return {label: float(x[7]) for label, x in inputs.items()}
+
+
+@pytest.fixture(scope='module')
+def imputed(frame, model):
+    return apply_imputation({col: np.asarray(frame[col], dtype=np.float64)
+                             for col in INPUT_COLUMNS.values()}, model['medians'])
+
+
+def _predict(scorer, base, **swept):
+    n = len(next(iter(swept.values())))
+    return scorer.predict({label: swept.get(label, np.full(n, base[label]))
+                           for label in scorer.labels})
+
+
+def test_curve_matches_direct_scoring(model, scorer, base):
+    surface = risk_surface(model, base, 'glucose', points=21)
+    (grid,) = surface.grids
+    assert grid[0] == scorer.variables[scorer.labels.index('glucose')].lo
+    np.testing.assert_allclose(surface.risk, _predict(scorer, base, glucose=grid),
+                               rtol=0, atol=1e-9)
+    assert surface.base_risk == pytest.approx(
+        _predict(scorer, base, glucose=[base['glucose']])[0], abs=1e-9)
+    assert surface.partial_dependence == {}
+
+
+def test_surface_matches_direct_scoring(model, scorer, base):
+    surface = risk_surface(model, base, ('glucose', 'bmi'), points=9)
+    glucose, bmi = np.meshgrid(*surface.grids, indexing='ij')
+    expected = _predict(scorer, base, glucose=glucose.ravel(), bmi=bmi.ravel())
+    np.testing.assert_allclose(surface.risk, expected.reshape(9, 9), rtol=0, atol=1e-9)
+
+
+def test_partial_dependence_matches_direct_scoring(model, scorer, base, imputed):
+    surface = risk_surface(model, base, 'bmi', points=11, frame=imputed, pd_rows=PD_ROWS,
+                           seed=3)
+    pick = np.sort(np.random.default_rng(3).choice(len(imputed['BMI']), PD_ROWS,
+                                                   replace=False))
+    sample = {label: imputed[col][pick] for label, col in INPUT_COLUMNS.items()}
+    expected = [np.nanmean(scorer.predict(dict(sample, bmi=np.full(PD_ROWS, value))))
+                for value in surface.grids[0]]
+    np.testing.assert_allclose(surface.partial_dependence['bmi'], expected, rtol=0, atol=1e-9)
+
+
+def test_cached_surface_only_scores_the_base_patient(model, base, imputed, monkeypatch):
+    first = risk_surface(model, base, ('glucose', 'age'), frame=imputed, pd_rows=PD_ROWS)
+    scorer = sensitivity._scorer(model, ())
+    rows = []
+    predict = scorer.predict
+    monkeypatch.setattr(scorer, 'predict',
+                        lambda inputs: rows.append(len(inputs['glucose'])) or predict(inputs))
+    # Pima column names are accepted for the base patient.
+    moved = {INPUT_COLUMNS[label]: value for label, value in base.items()}
+    second = risk_surface(model, moved, ('glucose', 'age'), frame=imputed, pd_rows=PD_ROWS)
+    assert rows == [1]
+    np.testing.assert_array_equal(second.risk, first.risk)
+    assert second.base_risk == first.base_risk
+
+
+def test_bad_arguments(model, base):
+    with pytest.raises(ValueError):
+        risk_surface(model, base, ('glucose', 'bmi', 'age'))
+    with pytest.raises(ValueError):
+        risk_surface(model, base, ('glucose', 'glucose'))
+    with pytest.raises(KeyError):
+        risk_surface(model, base, 'height')
+    with pytest.raises(KeyError):
+        risk_surface(model, {'glucose': 120.0}, 'bmi')
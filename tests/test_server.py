@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.prediction_cache import DEFAULT_MAX_BYTES
+from fuzzy_diabetes.preprocess import apply_imputation
+from fuzzy_diabetes.schema import INPUT_COLUMNS, OUTPUT_LABEL
+from fuzzy_diabetes.server import MicroBatcher, ScoringClient, ScoringService
+
+# Patients sent through the HTTP request path.
+N_PATIENTS = 50
+
+
+@pytest.fixture
+def service(model):
+    service = ScoringService(model)
+    yield service
+    service.close()
+
+
+@pytest.fixture(scope='module')
+def patients(frame):
+    # Raw rows (zeros included) under the Pima column names, off the universe grids.
+    return [{col: float(frame[col][i]) + 0.37 * (frame[col][i] > 0)
+             for col in INPUT_COLUMNS.values()} for i in range(N_PATIENTS)]
+
+
+@pytest.fixture(scope='module')
+def expected(model, patients):
+    columns = apply_imputation({col: np.array([p[col] for p in patients])
+                                for col in INPUT_COLUMNS.values()}, model['medians'])
+    return BatchRiskScorer.from_model(model).predict(
+        {label: columns[col] for label, col in INPUT_COLUMNS.items()})
+
+
+def test_score_matches_batch_scoring(service, patients, expected):
+    client = ScoringClient(service)
+    risks = []
+    for patient in patients:
+        status, body = client.post('/score', patient)
+        assert status == 200
+        risks.append(body[OUTPUT_LABEL])
+    np.testing.assert_allclose(risks, expected, rtol=0, atol=1e-9)
+
+    status, body = client.post('/score/batch', {'patients': patients})
+    assert status == 200
+    np.testing.assert_allclose(body[OUTPUT_LABEL], expected, rtol=0, atol=1e-9)
+
+
+def test_cache_is_opt_in(service, model, patients):
+    status, body = ScoringClient(service).get('/stats')
+    assert status == 200 and body['cache'] is None
+
+    cached = ScoringService(model, cache_bytes=DEFAULT_MAX_BYTES)
+    try:
+        client = ScoringClient(cached)
+        for _ in range(2):
+            status, body = client.post('/score/batch', {'patients': patients})
+            assert status == 200
+        stats = client.get('/stats')[1]['cache']
+    finally:
+        cached.close()
+    # A cached service scores the rows rounded to the universe steps.
+    scorer = cached.scorer
+    columns = apply_imputation({col: np.array([p[col] for p in patients])
+                                for col in INPUT_COLUMNS.values()}, model['medians'])
+    x = np.column_stack([columns[INPUT_COLUMNS[label]] for label in scorer.labels])
+    steps = np.array([v.step for v in scorer.variables])
+    np.testing.assert_allclose(body[OUTPUT_LABEL], scorer.predict(np.round(x / steps) * steps),
+                               rtol=0, atol=1e-9)
+    assert stats['hits'] >= len(patients)
+
+
+def test_scoring_error_returns_json_500(service, patients, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('scoring failed')
+
+    client = ScoringClient(service)
+    monkeypatch.setattr(service.scorer, 'predict', fail)
+    assert client.post('/score', patients[0])[0] == 500
+    assert client.post('/score/batch', {'patients': patients})[0] == 500
+    monkeypatch.undo()
+    # The micro-batcher survives the failure.
+    assert client.post('/score', patients[0])[0] == 200
+
+
+def test_bad_request(service):
+    status, body = ScoringClient(service).post('/score', {'glucose': 'high'})
+    assert status == 400 and 'error' in body
+
+
+def test_micro_batcher_counts_every_row():
+    batcher = MicroBatcher(lambda rows: rows.sum(axis=1), max_batch=8, max_wait=0.001)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: batcher.submit(np.array([i, 1.0])).result(),
+                                    range(200)))
+        summary = batcher.summary()
+    finally:
+        batcher.close()
+    assert results == [i + 1.0 for i in range(200)]
+    assert summary['rows'] == 200
+    assert 1 <= summary['batches'] <= 200
+    assert summary['mean_size'] == pytest.approx(200 / summary['batches'])
@@ -0,0 +1,32 @@
+import pytest
+
+from fuzzy_diabetes.preprocess import ZERO_AS_MISSING
+from fuzzy_diabetes.stream import streaming_medians
+
+pd = pytest.importorskip('pandas')
+
+RELATIVE_ACCURACY = 0.005
+
+
+@pytest.fixture(scope='module')
+def csv(frame, tmp_path_factory):
+    path = tmp_path_factory.mktemp('stream') / 'pima.csv'
+    pd.DataFrame(frame).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module')
+def pandas_medians(csv):
+    data = pd.read_csv(csv)
+    return {col: float(data[col].replace(0, float('nan')).median()) for col in ZERO_AS_MISSING}
+
+
+def test_exact_medians_match_pandas(csv, pandas_medians):
+    medians = streaming_medians(csv, exact=True, chunksize=300)
+    assert medians == pandas_medians
+
+
+def test_sketch_medians_within_relative_accuracy(csv, pandas_medians):
+    medians = streaming_medians(csv, chunksize=300, relative_accuracy=RELATIVE_ACCURACY)
+    for col, expected in pandas_medians.items():
+        assert medians[col] == pytest.approx(expected, rel=RELATIVE_ACCURACY)
@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+import pytest
+from sklearn.metrics import f1_score, roc_auc_score
+
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.schema import TARGET_COLUMN
+from fuzzy_diabetes.tuning import TuningSpace, f1_auc, tune
+
+
+def test_identity_genome_reproduces_the_model(model, inputs):
+    space = TuningSpace(model)
+    tuned = space.apply(space.identity())
+    expected = BatchRiskScorer.from_model(model).predict(inputs)
+    np.testing.assert_allclose(BatchRiskScorer.from_model(tuned).predict(inputs), expected)
+    assert tuned['thresholds']['tuned'] == model['thresholds']['f1_optimal']
+
+
+def test_applied_centers_stay_ascending(model):
+    space = TuningSpace(model)
+    genome = np.random.default_rng(0).uniform(space.low, space.up)
+    for variable in space.apply(genome)['variables'].values():
+        assert np.all(np.diff(variable['centers']) >= 0)
+
+
+def test_f1_auc_matches_sklearn(frame, model, inputs):
+    scores = BatchRiskScorer.from_model(model).predict(inputs)
+    y = np.asarray(frame[TARGET_COLUMN])
+    threshold = model['thresholds']['f1_optimal']
+    f1, auc = f1_auc(scores, y, threshold)
+    assert f1 == pytest.approx(f1_score(y, scores >= threshold))
+    assert auc == pytest.approx(roc_auc_score(y, scores))
+
+
+def test_tune_is_seeded_and_leaves_global_random_alone(frame, model):
+    random.seed(1234)
+    state = random.getstate()
+    runs = [tune(model, frame, population=8, max_evaluations=24, n_jobs=1, seed=0)
+            for _ in range(2)]
+    assert random.getstate() == state
+    (first, first_report), (second, second_report) = runs
+    assert first['key'] == second['key']
+    assert first_report['fitness'] == second_report['fitness']
+    assert first_report['generations'] >= 1
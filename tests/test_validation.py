@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from fuzzy_diabetes.inference import BatchRiskScorer
+from fuzzy_diabetes.validation import InputReport, validate_columns
+
+
+@pytest.fixture(scope='module')
+def rows(model, inputs):
+    """Eight rows: in range, NaN, +inf, -inf, just below and far above the universe."""
+    scorer = BatchRiskScorer.from_model(model)
+    x = np.column_stack([inputs[label][:8] for label in scorer.labels])
+    lo = np.array([v.lo for v in scorer.variables])
+    hi = np.array([v.hi for v in scorer.variables])
+    x[1, 0] = np.nan
+    x[2, 1] = np.inf
+    x[3, 1] = -np.inf
+    x[4, 2] = lo[2] - 1
+    x[5, 3] = hi[3] + 50
+    x[6, :] = hi + 1
+    return x, lo, hi
+
+
+def test_report_counts(model, rows):
+    x, lo, hi = rows
+    scorer = BatchRiskScorer.from_model(model)
+    report = InputReport(scorer.labels)
+    validate_columns(scorer.columns(x), scorer.variables, 'clamp', report)
+    validate_columns(scorer.columns(x[:2]), scorer.variables, 'clamp', report)
+    counts = report.as_dict()
+    assert counts['rows'] == 10 and counts['rejected'] == 0
+    columns = counts['columns']
+    first, second, third = scorer.labels[:3]
+    assert columns[first] == {'missing': 2, 'invalid': 0, 'below': 0, 'above': 1}
+    assert columns[second] == {'missing': 0, 'invalid': 2, 'below': 0, 'above': 1}
+    assert columns[third] == {'missing': 0, 'invalid': 0, 'below': 1, 'above': 1}
+
+
+def test_clamp_scores_the_clipped_rows(model, rows):
+    x, lo, hi = rows
+    scorer = BatchRiskScorer.from_model(model, out_of_range='clamp')
+    risk = scorer.predict(x)
+    assert np.isnan(risk[[1, 2, 3]]).all()
+    keep = [0, 4, 5, 6, 7]
+    np.testing.assert_array_equal(risk[keep], scorer.predict(np.clip(x[keep], lo, hi)))
+
+
+def test_extend_evaluates_terms_at_the_value(model, rows):
+    x, lo, hi = rows
+    scorer = BatchRiskScorer.from_model(model, out_of_range='extend')
+    memberships = scorer.fuzzify(scorer.columns(x[[5]]))
+    v = scorer.variables[3]
+    expected = np.exp(-0.5 * ((x[5, 3] - v.centers) / v.sigmas) ** 2)
+    np.testing.assert_allclose(memberships[3][0], expected)
+    clamp = BatchRiskScorer.from_model(model).predict(x)
+    risk = scorer.predict(x)
+    np.testing.assert_array_equal(risk[[0, 7]], clamp[[0, 7]])
+    assert not np.isnan(risk[[4, 5, 6]]).any()
+
+
+def test_reject_scores_outside_rows_nan(model, rows):
+    x, _, _ = rows
+    scorer = BatchRiskScorer.from_model(model, out_of_range='reject')
+    report = InputReport(scorer.labels)
+    risk = scorer.predict(x, report)
+    np.testing.assert_array_equal(np.isnan(risk), [False] + [True] * 6 + [False])
+    # Infinite values are invalid, not out of range, so rows 2 and 3 are not rejected.
+    assert report.as_dict()['rejected'] == 3
+    clamp = BatchRiskScorer.from_model(model).predict(x)
+    np.testing.assert_array_equal(risk[[0, 7]], clamp[[0, 7]])
+
+
+def test_unknown_policy(model):
+    with pytest.raises(ValueError):
+        BatchRiskScorer.from_model(model, out_of_range='wrap')